@@ -4,24 +4,76 @@ API REST para previsão do potencial de crescimento de empresas.
 Esta API substitui a aplicação Streamlit original e expõe o modelo
 `Random_Forest_model.joblib` como serviço de previsão, com suporte a:
 - Previsão individual (um registro por vez, via JSON)
-- Previsão em batch (lista de registros via JSON)
+- Previsão em batch (lista de registros via JSON, Arrow IPC, NumPy `.npy` ou CSV)
 """
 
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+from functools import partial
 from pathlib import Path
+import json
+import math
 import os
 import tempfile
+import threading
 import time
-from typing import List, Literal, Optional
+from typing import Dict, List, Literal, Optional, Tuple
 
 import joblib
 import numpy as np
 import pandas as pd
 import requests
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, model_validator
+from requests.adapters import HTTPAdapter
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from urllib3.util.retry import Retry
+
+from batch_formats import (
+    ARROW_STREAM_TYPES,
+    CSV_TYPES,
+    NDJSON_TYPES,
+    SUPPORTED_TYPES,
+    BatchDecodeError,
+    UnsupportedFormatError,
+    decode_batch,
+    decode_csv,
+    encode_arrow_stream,
+    encode_columnar_json,
+    iter_line_chunks,
+    media_type,
+)
+from compact_model import COMPACT_SUFFIX, CompactForestModel, is_compact_artifact, load_compact_model
+from data_cache import read_table
+from forest_engine import FLOAT32_OVERFLOW, CompiledForest, verify_against_sklearn
+from forest_explainer import ForestExplainer, build_explainer
+from macro_store import FIRM_FEATURES, MacroFeatureStore, UnknownCountryError
+from metrics import (
+    BATCH_ROWS_BUCKETS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    REQUEST_BUCKETS,
+    ROWS_PER_SECOND_BUCKETS,
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsMiddleware,
+    MetricsRegistry,
+    StageTimer,
+)
+from jobs import JobManager, JobNotFoundError
+from microbatch import MicroBatchDispatcher
+from model_registry import ModelRegistry, ModelReloadError, ModelSnapshot, file_signature
+from parallel_inference import ChunkedScorer, limit_native_threads, worker_core_budget
+from prediction_cache import PredictionCache, row_keys
+from rankings import RankingIndex
+from scenarios import MacroShock, ScenarioError, run_scenario
+from sensitivity import SensitivityError, axis_values, sweep, validate_axes
 
 
 # ---------------------------------------------------------
@@ -36,17 +88,144 @@ GITHUB_BASE_URL = f"https://raw.githubusercontent.com/{GITHUB_USERNAME}/{GITHUB_
 DATA_URL = f"{GITHUB_BASE_URL}/dados/data.csv"
 MODEL_URL = f"{GITHUB_BASE_URL}/modelos/Random_Forest_model.joblib"
 
+# Modelo servido ao iniciar; outros arquivos `.joblib` de `MODEL_DIR` podem
+# ser ativados depois via `/admin/reload`
+MODEL_DIR = Path(os.environ.get("MODEL_DIR", "modelos"))
+MODEL_PATH = Path(os.environ.get("MODEL_PATH", str(MODEL_DIR / "Random_Forest_model.joblib")))
+
+# Intervalo (s) de verificação do arquivo do modelo ativo; se ele mudar em
+# disco, a nova versão é carregada e trocada sem reiniciar (0 desativa)
+MODEL_WATCH_INTERVAL_SECONDS = float(os.environ.get("MODEL_WATCH_INTERVAL_SECONDS", "10"))
+# Número de versões anteriores mantidas em memória para rollback
+MODEL_HISTORY_SIZE = int(os.environ.get("MODEL_HISTORY_SIZE", "1"))
+# Token exigido (cabeçalho `X-Admin-Token`) nos endpoints `/admin/*`, se definido
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "").strip() or None
+
+# Motor de inferência: "compiled" (floresta achatada em arrays NumPy, ver
+# `forest_engine.py`) ou "sklearn" (chamadas diretas a predict/predict_proba)
+INFERENCE_ENGINE = os.environ.get("INFERENCE_ENGINE", "compiled").strip().lower()
+
+# Modo de carga do modelo: "pickle" (joblib do scikit-learn) ou "mmap"
+# (floresta compilada em `MODEL_MMAP_PATH`, aberta com mmap e compartilhada
+# entre os workers)
+MODEL_LOAD_MODE = os.environ.get("MODEL_LOAD_MODE", "pickle").strip().lower()
+MODEL_MMAP_PATH = os.environ.get("MODEL_MMAP_PATH", str(Path("modelos") / "Random_Forest_model.forest.joblib"))
+
+# Carrega os artefatos (modelo, dados, tabela macro) de forma síncrona na
+# importação, em vez de em segundo plano. Útil com servidores que fazem
+# fork após importar o app (ex.: `gunicorn --preload`), para que os workers
+# compartilhem os artefatos já carregados.
+PRELOAD_ARTIFACTS = os.environ.get("PRELOAD_ARTIFACTS", "0").strip().lower() in ("1", "true", "yes")
+
+# Micro-batching de `/predict` (opcional): agrupa requisições concorrentes
+# em uma única avaliação da floresta
+MICROBATCH_ENABLED = os.environ.get("MICROBATCH_ENABLED", "0").strip().lower() in ("1", "true", "yes")
+MICROBATCH_MAX_BATCH_SIZE = int(os.environ.get("MICROBATCH_MAX_BATCH_SIZE", "64"))
+MICROBATCH_MAX_WAIT_US = int(os.environ.get("MICROBATCH_MAX_WAIT_US", "500"))
+
+# Cache de previsões por vetor de features (LRU + TTL)
+PREDICTION_CACHE_ENABLED = os.environ.get("PREDICTION_CACHE_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", "100000"))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get("PREDICTION_CACHE_TTL_SECONDS", "3600"))
+
+# Tabela macro por país (opcional): CSV com `country` + as 9 colunas macro.
+# Sem ela, a tabela é construída a partir de `dados/data.csv`.
+MACRO_TABLE_PATH = os.environ.get("MACRO_TABLE_PATH", "").strip() or None
+
+# Número de linhas avaliadas por vez em `/predict-stream`
+STREAM_CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", "1024"))
+
+# Jobs assíncronos de pontuação (`/jobs`): matriz de entrada e resultados
+# (SQLite) em `JOBS_DIR`, avaliados por um pool de processos separado com
+# prioridade de CPU reduzida (`JOBS_NICE`)
+JOBS_ENABLED = os.environ.get("JOBS_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+JOBS_DIR = Path(os.environ.get("JOBS_DIR", "jobs"))
+JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", str(max(1, (os.cpu_count() or 1) - 1))))
+JOBS_CHUNK_ROWS = int(os.environ.get("JOBS_CHUNK_ROWS", "20000"))
+JOBS_NICE = int(os.environ.get("JOBS_NICE", "10"))
+# Prazo de posse de um job pelo processo que o avalia, renovado a cada um
+# terço dele: com vários workers da API no mesmo `JOBS_DIR`, só os jobs cujo
+# dono parou de renovar (processo morto) são retomados por outro
+JOBS_LEASE_SECONDS = float(os.environ.get("JOBS_LEASE_SECONDS", "30"))
+
+# Paralelismo dentro de uma requisição: batches com ao menos
+# `INFERENCE_PARALLEL_MIN_ROWS` linhas são divididos em blocos de
+# `INFERENCE_CHUNK_ROWS` e avaliados em até `INFERENCE_THREADS` threads por
+# processo (padrão: CPUs disponíveis / `WEB_CONCURRENCY`; 1 desativa)
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", str(worker_core_budget())))
+INFERENCE_PARALLEL_MIN_ROWS = int(os.environ.get("INFERENCE_PARALLEL_MIN_ROWS", "16384"))
+INFERENCE_CHUNK_ROWS = int(os.environ.get("INFERENCE_CHUNK_ROWS", "8192"))
+
+# Número máximo de pontos de uma grade de `/sensitivity`
+SENSITIVITY_MAX_POINTS = int(os.environ.get("SENSITIVITY_MAX_POINTS", "200000"))
+
+# Cache colunar tipado (Parquet) dos CSVs de dados, em `<pasta>/.cache/`
+DATA_CACHE_ENABLED = os.environ.get("DATA_CACHE_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+
+# Métricas Prometheus em `/metrics` (latência por etapa, linhas, requisições em andamento)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+
+# Ordem das features esperada pelo modelo
+FEATURE_ORDER = [
+    "dividend_yield_ttm",
+    "earnings_ttm",
+    "marketcap",
+    "pe_ratio_ttm",
+    "revenue_ttm",
+    "price",
+    "gdp_per_capita_usd",
+    "gdp_growth_percent",
+    "inflation_percent",
+    "interest_rate_percent",
+    "unemployment_rate_percent",
+    "exchange_rate_to_usd",
+    "inflation",
+    "interest_rate",
+    "unemployment",
+]
+
+
+_HTTP_SESSION: Optional[requests.Session] = None
+
+
+def _http_session() -> requests.Session:
+    """
+    Sessão HTTP compartilhada (keep-alive e pool de conexões), com retentativas
+    para falhas transitórias de conexão.
+    """
+    global _HTTP_SESSION
+
+    if _HTTP_SESSION is None:
+        session = requests.Session()
+        retries = Retry(total=3, connect=3, read=2, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(
+            {
+                "User-Agent": "Business-Growth-Potential-API/1.0",
+                "Accept": "application/vnd.github.v3.raw",
+            }
+        )
+        _HTTP_SESSION = session
+    return _HTTP_SESSION
+
 
 def download_file_from_github(url: str, filename: str, ttl_seconds: int = 7200) -> Optional[str]:
     """
     Faz download de um arquivo do GitHub para um diretório temporário e
     retorna o caminho local. Usa cache simples baseado em mtime.
+
+    Após o TTL, o arquivo em cache é revalidado com `If-None-Match` /
+    `If-Modified-Since` (metadados guardados em `<arquivo>.meta.json`): se
+    não mudou, o servidor responde 304 e nada é transferido novamente.
     """
     try:
         temp_dir = Path(tempfile.gettempdir()) / "potencial_empresarial"
         temp_dir.mkdir(exist_ok=True)
 
         file_path = temp_dir / filename
+        meta_path = temp_dir / f"{filename}.meta.json"
 
         # Cache baseado em mtime
         if file_path.exists():
@@ -55,26 +234,51 @@ def download_file_from_github(url: str, filename: str, ttl_seconds: int = 7200)
                 print(f"[download_file_from_github] Using cached file: {filename}")
                 return str(file_path)
 
-        print(f"[download_file_from_github] Downloading {filename} from GitHub...")
-        headers = {
-            "User-Agent": "Business-Growth-Potential-API/1.0",
-            "Accept": "application/vnd.github.v3.raw",
-        }
-        response = requests.get(url, timeout=60, headers=headers)
-        if response.status_code in (403, 429):
-            # Problema de rate limiting ou permissão — tenta usar arquivo antigo
-            if file_path.exists():
-                print(
-                    f"[download_file_from_github] GitHub returned {response.status_code}, "
-                    f"using cached file for {filename}"
-                )
-                return str(file_path)
-            return None
+        headers = {}
+        if file_path.exists() and meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
 
-        response.raise_for_status()
+        if headers:
+            print(f"[download_file_from_github] Revalidating cached {filename} with GitHub...")
+        else:
+            print(f"[download_file_from_github] Downloading {filename} from GitHub...")
+        with _http_session().get(url, timeout=(10, 60), headers=headers, stream=True) as response:
+            if response.status_code == 304 and file_path.exists():
+                # Não mudou: renova o TTL sem baixar de novo
+                os.utime(file_path)
+                print(f"[download_file_from_github] Not modified, reusing cached file: {filename}")
+                return str(file_path)
 
-        with open(file_path, "wb") as f:
-            f.write(response.content)
+            if response.status_code in (403, 429):
+                # Problema de rate limiting ou permissão — tenta usar arquivo antigo
+                if file_path.exists():
+                    print(
+                        f"[download_file_from_github] GitHub returned {response.status_code}, "
+                        f"using cached file for {filename}"
+                    )
+                    return str(file_path)
+                return None
+
+            response.raise_for_status()
+
+            # Escrita atômica: nunca deixa um arquivo parcial no cache
+            tmp_path = temp_dir / f".{filename}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1 << 16):
+                    f.write(chunk)
+            os.replace(tmp_path, file_path)
+            meta_path.write_text(
+                json.dumps(
+                    {
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                    }
+                )
+            )
 
         print(f"[download_file_from_github] Successfully downloaded {filename}")
         return str(file_path)
@@ -86,17 +290,37 @@ def download_file_from_github(url: str, filename: str, ttl_seconds: int = 7200)
         return None
 
 
-def load_model() -> Optional[object]:
+def load_model(path: Optional[Path] = None) -> Optional[object]:
     """
     Carrega o modelo Random Forest treinado.
-    Prioriza o arquivo local `modelos/Random_Forest_model.joblib`.
+    Prioriza o arquivo local `path` (padrão: `MODEL_PATH`).
     Se não existir, tenta baixar do GitHub.
+
+    Arquivos `.npz` são lidos no formato compacto (scaler + árvores, ver
+    `compact_model.py`). Com `MODEL_LOAD_MODE=mmap`, retorna a floresta
+    compilada mapeada em memória (ver `load_model_mmap`).
+    """
+    local_path = Path(path) if path is not None else MODEL_PATH
+    if is_compact_artifact(local_path):
+        return load_compact_artifact(local_path)
+    if MODEL_LOAD_MODE == "mmap":
+        return load_model_mmap(path)
+    return load_pickled_model(path)
+
+
+def load_pickled_model(path: Optional[Path] = None) -> Optional[object]:
+    """
+    Carrega o modelo scikit-learn serializado com joblib (local ou, para o
+    modelo padrão, do GitHub).
     """
     try:
-        local_path = Path("modelos") / "Random_Forest_model.joblib"
+        local_path = Path(path) if path is not None else MODEL_PATH
         if local_path.exists():
             print(f"[load_model] Loading model from local path: {local_path}")
             return joblib.load(local_path)
+        if local_path != MODEL_PATH:
+            print(f"[load_model] Model file not found: {local_path}")
+            return None
 
         # Fallback: baixar do GitHub
         model_path = download_file_from_github(MODEL_URL, "Random_Forest_model.joblib")
@@ -111,6 +335,64 @@ def load_model() -> Optional[object]:
         return None
 
 
+def load_compact_artifact(path: Path) -> Optional[CompactForestModel]:
+    """
+    Carrega o artefato compacto exportado pelo pipeline de treino. Não há
+    fallback para o GitHub: o arquivo precisa existir localmente.
+    """
+    try:
+        print(f"[load_model] Loading compact model from local path: {path}")
+        return load_compact_model(path)
+    except Exception as e:
+        print(f"[load_model] Error loading compact model: {e}")
+        return None
+
+
+def mmap_artifact_path(source: Path) -> Path:
+    """
+    Caminho do artefato compilado de um modelo: `MODEL_MMAP_PATH` para o
+    modelo padrão, `<nome>.forest.joblib` ao lado do arquivo para os demais.
+    """
+    if Path(source) == MODEL_PATH:
+        return Path(MODEL_MMAP_PATH)
+    return Path(source).with_name(f"{Path(source).stem}.forest.joblib")
+
+
+def load_model_mmap(path: Optional[Path] = None) -> Optional[object]:
+    """
+    Carrega a floresta compilada de `MODEL_MMAP_PATH` com `mmap_mode="r"`.
+
+    Os arrays ficam mapeados do arquivo, então todos os workers que abrem o
+    mesmo artefato compartilham uma única cópia física (page cache), e
+    nenhum objeto scikit-learn é desserializado. Se o artefato não existir
+    (ou for mais antigo que o joblib local), ele é gerado a partir do modelo
+    scikit-learn, verificado contra o `dados/data.csv` e gravado atomicamente.
+    """
+    source = Path(path) if path is not None else MODEL_PATH
+    try:
+        artifact = mmap_artifact_path(source)
+        stale = artifact.exists() and source.exists() and source.stat().st_mtime > artifact.stat().st_mtime
+        if not artifact.exists() or stale:
+            print(f"[load_model_mmap] Building memory-mappable artifact: {artifact}")
+            model = load_pickled_model(source)
+            if model is None:
+                return None
+            engine = CompiledForest.from_sklearn(model)
+            engine.version = engine.fingerprint()
+            example_df = load_example_data()
+            if example_df is not None and not verify_against_sklearn(engine, model, example_df[FEATURE_ORDER]):
+                print("[load_model_mmap] Compiled forest diverges from sklearn, using pickled model")
+                return model
+            artifact.parent.mkdir(parents=True, exist_ok=True)
+            engine.save(artifact)
+
+        print(f"[load_model_mmap] Memory-mapping model from {artifact}")
+        return CompiledForest.load(artifact, mmap_mode="r")
+    except Exception as e:
+        print(f"[load_model_mmap] Error loading memory-mapped model, falling back to pickle: {e}")
+        return load_pickled_model(source)
+
+
 def load_example_data() -> Optional[pd.DataFrame]:
     """
     Carrega o dataset de exemplo para fins de documentação / sanity check.
@@ -120,12 +402,12 @@ def load_example_data() -> Optional[pd.DataFrame]:
         local_path = Path("dados") / "data.csv"
         if local_path.exists():
             print(f"[load_example_data] Loading data from local path: {local_path}")
-            return pd.read_csv(local_path)
+            return read_table(local_path, enabled=DATA_CACHE_ENABLED)
 
         data_path = download_file_from_github(DATA_URL, "data.csv")
         if data_path:
             print(f"[load_example_data] Loading data from GitHub cache: {data_path}")
-            return pd.read_csv(data_path)
+            return read_table(data_path, enabled=DATA_CACHE_ENABLED)
 
         print("[load_example_data] Could not load data from local or GitHub")
         return None
@@ -134,10 +416,202 @@ def load_example_data() -> Optional[pd.DataFrame]:
         return None
 
 
+def build_inference_engine(model: Optional[object], example_df: Optional[pd.DataFrame]) -> Optional[CompiledForest]:
+    """
+    Compila o modelo carregado para o motor de arrays (`CompiledForest`),
+    quando `INFERENCE_ENGINE=compiled`.
+
+    Se o dataset de exemplo estiver disponível, confere que o motor compilado
+    reproduz bit a bit as previsões do scikit-learn; em caso de divergência
+    (ou modelo não suportado), retorna None e a API usa o scikit-learn.
+    """
+    if isinstance(model, (CompiledForest, CompactForestModel)):
+        # Modelo já carregado no formato compilado (MODEL_LOAD_MODE=mmap ou
+        # artefato compacto)
+        return model
+
+    if model is None or INFERENCE_ENGINE != "compiled":
+        return None
+
+    try:
+        engine = CompiledForest.from_sklearn(model)
+    except Exception as e:
+        print(f"[build_inference_engine] Model not supported by compiled engine, using sklearn: {e}")
+        return None
+
+    if example_df is not None:
+        X_check = example_df[FEATURE_ORDER]
+        if not verify_against_sklearn(engine, model, X_check):
+            print("[build_inference_engine] Compiled engine diverges from sklearn, using sklearn")
+            return None
+        print(f"[build_inference_engine] Compiled engine verified on {len(X_check)} rows")
+
+    print(
+        f"[build_inference_engine] Compiled {engine.n_trees} trees "
+        f"({engine.n_nodes} nodes, max depth {engine.max_depth})"
+    )
+    return engine
+
+
+def load_macro_store(example_df: Optional[pd.DataFrame]) -> Optional[MacroFeatureStore]:
+    """
+    Carrega a tabela de features macro por país, de `MACRO_TABLE_PATH` se
+    configurado, ou do dataset de exemplo.
+    """
+    try:
+        if MACRO_TABLE_PATH:
+            print(f"[load_macro_store] Loading macro table from {MACRO_TABLE_PATH}")
+            store = MacroFeatureStore.from_csv(MACRO_TABLE_PATH)
+        elif example_df is not None:
+            store = MacroFeatureStore.from_dataframe(example_df, source="dados/data.csv")
+        else:
+            print("[load_macro_store] No macro table available")
+            return None
+        print(f"[load_macro_store] Macro features indexed for {len(store)} countries")
+        return store
+    except Exception as e:
+        print(f"[load_macro_store] Error loading macro table: {e}")
+        return None
+
+
+def compute_model_version(model: Optional[object]) -> Optional[str]:
+    """
+    Versão do modelo: hash estável do conteúdo da floresta, o mesmo para o
+    joblib do scikit-learn e para o artefato compilado/mapeado em memória.
+    """
+    if model is None:
+        return None
+    if isinstance(model, CompactForestModel):
+        return model.version
+    if isinstance(model, CompiledForest):
+        return model.version or model.fingerprint()
+    try:
+        return CompiledForest.from_sklearn(model).fingerprint()
+    except Exception:
+        # Modelos não suportados pelo motor compilado
+        return joblib.hash(model)[:12]
+
+
+# Linhas do dataset de exemplo avaliadas ao aquecer uma versão nova
+WARMUP_ROWS = 256
+
+
+def build_model_snapshot(source: Path, example_df: Optional[pd.DataFrame] = None) -> ModelSnapshot:
+    """
+    Carrega, compila, valida e aquece uma versão do modelo, fora do caminho
+    das requisições. Levanta `ModelReloadError` se ela não puder ser servida.
+    """
+    start = time.perf_counter()
+    if example_df is None:
+        example_df = EXAMPLE_DF
+    # Assinatura lida antes da carga: se o arquivo mudar durante a carga, o
+    # monitor verá uma assinatura nova e recarregará
+    signature = file_signature(source)
+
+    model = load_model(source)
+    if model is None:
+        raise ModelReloadError(f"Não foi possível carregar o modelo de {source}.")
+    if getattr(model, "n_features_in_", len(FEATURE_ORDER)) != len(FEATURE_ORDER):
+        raise ModelReloadError(
+            f"Modelo de {source} espera {model.n_features_in_} features, a API envia {len(FEATURE_ORDER)}."
+        )
+    feature_names = getattr(model, "feature_names_in_", None)
+    if feature_names is not None and list(feature_names) != FEATURE_ORDER:
+        raise ModelReloadError(
+            f"Modelo de {source} foi treinado com outra ordem de features: {list(feature_names)}."
+        )
+
+    if getattr(model, "n_jobs", None) not in (None, 1):
+        # O paralelismo é o do `SCORER`: o `n_jobs` serializado com o modelo
+        # abriria threads além do orçamento do worker
+        print(f"[build_model_snapshot] Overriding pickled n_jobs={model.n_jobs} with 1")
+        model.n_jobs = 1
+
+    engine = build_inference_engine(model, example_df)
+
+    if example_df is not None:
+        X_warm = example_df[FEATURE_ORDER].to_numpy(dtype=np.float64)[:WARMUP_ROWS]
+    else:
+        X_warm = np.zeros((1, len(FEATURE_ORDER)))
+
+    # Contribuições por feature (`/explain`): tabela por folha calculada aqui,
+    # uma vez por versão
+    explainer = build_explainer(model, engine)
+    if explainer is not None and not explainer.check_additivity(X_warm):
+        print("[build_model_snapshot] Feature contributions do not add up to the probabilities, disabling /explain")
+        explainer = None
+
+    snapshot = ModelSnapshot(model, engine, compute_model_version(model), str(source), signature, explainer)
+
+    # Aquecimento: a primeira avaliação já toca todas as páginas dos arrays
+    # (inclusive as mapeadas em memória) e valida a saída do modelo
+    try:
+        preds, probas = _score_matrix(X_warm, snapshot)
+        _score_matrix(X_warm[:1], snapshot)
+    except Exception as e:
+        raise ModelReloadError(f"Modelo de {source} falhou no aquecimento: {e}")
+    if probas.shape != (len(X_warm), len(POTENTIAL_LABELS)):
+        raise ModelReloadError(f"Modelo de {source} retornou probabilidades com shape {probas.shape}.")
+
+    snapshot.rankings = build_rankings(snapshot, example_df)
+
+    print(
+        f"[build_model_snapshot] Model {snapshot.version} from {source} ready "
+        f"({snapshot.inference_engine}) in {time.perf_counter() - start:.2f}s"
+    )
+    return snapshot
+
+
+def build_rankings(snapshot: ModelSnapshot, example_df: Optional[pd.DataFrame]) -> Optional[RankingIndex]:
+    """
+    Pontua o universo de referência (dataset de exemplo) com a versão do
+    modelo e monta os índices ordenados de `/rankings`.
+    """
+    if example_df is None:
+        return None
+    try:
+        start = time.perf_counter()
+        X = example_df[FEATURE_ORDER].to_numpy(dtype=np.float64)
+        _, probas = _score_matrix(X, snapshot)
+        index = RankingIndex.from_frame(
+            example_df, probas, list(POTENTIAL_LABELS.values()), snapshot.version, feature_order=FEATURE_ORDER
+        )
+    except Exception as e:
+        print(f"[build_rankings] Ranking universe unavailable: {e}")
+        return None
+    print(
+        f"[build_rankings] Scored {len(index)} companies in {len(index.countries)} countries "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return index
+
+
 # ---------------------------------------------------------
 # Definição da API (FastAPI)
 # ---------------------------------------------------------
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # A API começa a responder imediatamente; os artefatos carregam em
+    # segundo plano e `/health` informa quando estiverem prontos.
+    # Bibliotecas nativas (BLAS/OpenMP) dentro do mesmo orçamento de núcleos
+    limit_native_threads(SCORER.threads)
+    start_background_loading()
+    # Uma thread por worker: threads não sobrevivem ao fork do `--preload`
+    REGISTRY.start_watching(MODEL_WATCH_INTERVAL_SECONDS)
+
+    global JOBS
+    if JOBS_ENABLED:
+        # Criado aqui (e não na importação): os workers dos jobs também
+        # importam este módulo
+        JOBS = JobManager(JOBS_DIR, JOBS_WORKERS, JOBS_CHUNK_ROWS, JOBS_NICE, JOBS_LEASE_SECONDS)
+        JOBS.start()
+    yield
+    if JOBS is not None:
+        JOBS.shutdown()
+    SCORER.shutdown()
+
+
 app = FastAPI(
     title="Business Growth Potential API",
     description=(
@@ -145,6 +619,7 @@ app = FastAPI(
         "nos países do continente americano, utilizando Random Forest."
     ),
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # ---------------------------------------------------------
@@ -166,15 +641,177 @@ app.add_middleware(
 )
 
 
-# Modelo carregado em memória na inicialização
-MODEL = load_model()
-EXAMPLE_DF = load_example_data()
+def _json_safe(value: object) -> object:
+    """NaN e ±inf como texto: o JSON de entrada os aceita, o de saída não."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(item) for item in value]
+    return value
+
+
+@app.exception_handler(RequestValidationError)
+async def request_validation_error(request: Request, exc: RequestValidationError) -> JSONResponse:
+    # Mesmo corpo do handler padrão do FastAPI, que falharia ao ecoar um
+    # `input` com NaN ou ±inf (ex.: a recusa de valores infinitos)
+    return JSONResponse(status_code=422, content={"detail": _json_safe(jsonable_encoder(exc.errors()))})
+
+
+# ---------------------------------------------------------
+# Métricas
+# ---------------------------------------------------------
+
+METRICS = MetricsRegistry()
+STAGE_SECONDS = METRICS.register(
+    Histogram(
+        "prediction_stage_seconds",
+        "Time spent in each stage of the prediction path.",
+        ("endpoint", "model_version", "stage"),
+    )
+)
+BATCH_ROWS = METRICS.register(
+    Histogram(
+        "prediction_batch_rows",
+        "Rows scored per request (per chunk for /predict-stream, per batch for microbatch).",
+        ("endpoint", "model_version"),
+        BATCH_ROWS_BUCKETS,
+    )
+)
+ROWS_PER_SECOND = METRICS.register(
+    Histogram(
+        "prediction_rows_per_second",
+        "Row throughput of each request, from decoding to building the response.",
+        ("endpoint", "model_version"),
+        ROWS_PER_SECOND_BUCKETS,
+    )
+)
+ROWS_TOTAL = METRICS.register(
+    Counter("prediction_rows_total", "Rows scored.", ("endpoint", "model_version"))
+)
+REQUEST_SECONDS = METRICS.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Total request latency, including validation and response serialization.",
+        ("endpoint", "model_version", "status"),
+        REQUEST_BUCKETS,
+    )
+)
+IN_FLIGHT = METRICS.register(
+    Gauge("http_requests_in_flight", "Requests currently being processed.", ("endpoint",))
+)
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, router=app.router, duration=REQUEST_SECONDS, in_flight=IN_FLIGHT)
+
+
+def _stage_timer(endpoint: str, snapshot: ModelSnapshot) -> StageTimer:
+    return StageTimer(STAGE_SECONDS if METRICS_ENABLED else None, endpoint, snapshot.version)
+
+
+def _record_rows(timer: StageTimer, n_rows: int, seconds: Optional[float] = None) -> None:
+    """Registra linhas avaliadas (e a vazão, se `seconds` for informado)."""
+    if not METRICS_ENABLED:
+        return
+    labels = (timer.endpoint, timer.model_version)
+    BATCH_ROWS.observe(labels, n_rows)
+    ROWS_TOTAL.inc(labels, n_rows)
+    if seconds:
+        ROWS_PER_SECOND.observe(labels, n_rows / seconds)
+
+
+# Artefatos carregados em memória (em segundo plano, ver `load_artifacts`)
+EXAMPLE_DF = None
+MACRO_STORE = None
+# Versões do modelo: cada requisição usa o snapshot ativo no momento em que
+# começa (modelo, motor compilado e versão, usada nas chaves do cache)
+REGISTRY = ModelRegistry(build_model_snapshot, history_size=MODEL_HISTORY_SIZE)
+CACHE = (
+    PredictionCache(PREDICTION_CACHE_MAX_ENTRIES, PREDICTION_CACHE_TTL_SECONDS)
+    if PREDICTION_CACHE_ENABLED
+    else None
+)
+
+# Pool de threads para os batches grandes (compartilhado pelas requisições)
+SCORER = ChunkedScorer(INFERENCE_THREADS, INFERENCE_PARALLEL_MIN_ROWS, INFERENCE_CHUNK_ROWS)
+
+# Jobs assíncronos de pontuação (criado no `lifespan`, se habilitado)
+JOBS: Optional[JobManager] = None
+
+# Estado de prontidão dos artefatos: "loading", "ready" ou "failed"
+ARTIFACTS_STATE = "loading"
+ARTIFACTS_ERROR: Optional[str] = None
+_LOADER_THREAD: Optional[threading.Thread] = None
+_LOADER_LOCK = threading.Lock()
+
+
+def load_artifacts() -> None:
+    """
+    Carrega dataset de exemplo, tabela macro e a primeira versão do modelo.
+    O modelo é publicado por último (no registro), então qualquer requisição
+    que o veja carregado encontra o resto pronto.
+    """
+    global EXAMPLE_DF, MACRO_STORE, ARTIFACTS_STATE, ARTIFACTS_ERROR
+
+    start = time.perf_counter()
+    try:
+        example_df = load_example_data()
+        macro_store = load_macro_store(example_df)
+        EXAMPLE_DF = example_df
+        MACRO_STORE = macro_store
+        REGISTRY.load(MODEL_PATH)
+    except ModelReloadError as e:
+        ARTIFACTS_ERROR = str(e)
+        ARTIFACTS_STATE = "failed"
+    except Exception as e:
+        print(f"[load_artifacts] Error loading artifacts: {e}")
+        ARTIFACTS_ERROR = str(e)
+        ARTIFACTS_STATE = "failed"
+    else:
+        ARTIFACTS_STATE = "ready"
+    print(f"[load_artifacts] Artifacts {ARTIFACTS_STATE} in {time.perf_counter() - start:.2f}s")
+
+
+def start_background_loading() -> Optional[threading.Thread]:
+    """
+    Dispara `load_artifacts` em uma thread de fundo (uma única vez por processo).
+    """
+    global _LOADER_THREAD
+
+    with _LOADER_LOCK:
+        if ARTIFACTS_STATE != "loading" or _LOADER_THREAD is not None:
+            return _LOADER_THREAD
+        _LOADER_THREAD = threading.Thread(target=load_artifacts, name="artifact-loader", daemon=True)
+        _LOADER_THREAD.start()
+        return _LOADER_THREAD
 
 
 PotentialLabel = Literal["Low", "Medium", "High"]
 
+# Formato da resposta dos endpoints em batch: uma lista de objetos por linha
+# (padrão) ou um array por campo (`columnar`)
+ResponseLayout = Literal["rows", "columnar"]
+
+
+class _ScorableFeatures(BaseModel):
+    """
+    Recusa (422) os valores que o modelo não avalia: ±inf e os que estouram
+    float32. NaN é aceito e avaliado como valor ausente, como no scikit-learn.
+    """
+
+    @model_validator(mode="after")
+    def _reject_infinite(self):
+        infinite = [
+            name for name, value in self
+            if isinstance(value, float) and abs(value) >= FLOAT32_OVERFLOW
+        ]
+        if infinite:
+            raise ValueError(f"Valores infinitos (ou grandes demais para float32) não são aceitos: {infinite}")
+        return self
+
 
-class Features(BaseModel):
+class Features(_ScorableFeatures):
     """
     Mesma ordem e significado de features usados na interface Streamlit
     (`show_manual_prediction`), compatível com o modelo treinado.
@@ -197,6 +834,21 @@ class Features(BaseModel):
     unemployment: float = Field(..., description="Absolute unemployment value (usually negative)")
 
 
+class CompanyFeatures(_ScorableFeatures):
+    """
+    Apenas as features da empresa e o país: as nove features macro são
+    preenchidas no servidor a partir da tabela por país (ver `/macro`).
+    """
+
+    country: str = Field(..., description="País da empresa (como em `dados/data.csv`)")
+    dividend_yield_ttm: float = Field(..., description="Dividend Yield (%)")
+    earnings_ttm: float = Field(..., description="Earnings TTM (USD)")
+    marketcap: float = Field(..., description="Market Cap (USD)")
+    pe_ratio_ttm: float = Field(..., description="P/E Ratio (TTM)")
+    revenue_ttm: float = Field(..., description="Revenue TTM (USD)")
+    price: float = Field(..., description="Stock price (USD)")
+
+
 class PredictionResult(BaseModel):
     predicted_class: int = Field(..., description="Classe prevista: 0=Low, 1=Medium, 2=High")
     predicted_potential: PotentialLabel = Field(..., description="Rótulo textual da classe prevista")
@@ -210,25 +862,240 @@ class BatchRequest(BaseModel):
     instances: List[Features]
 
 
+class CompanyBatchRequest(BaseModel):
+    instances: List[CompanyFeatures]
+
+
 class BatchPredictionResult(BaseModel):
     predictions: List[PredictionResult]
 
 
+class ExplanationResult(PredictionResult):
+    bias: Dict[str, float] = Field(
+        ..., description="Probabilidade de cada classe antes de qualquer divisão (média das raízes das árvores)"
+    )
+    contributions: Dict[str, Dict[str, float]] = Field(
+        ...,
+        description=(
+            "Contribuição de cada feature (na ordem de `/model-info`) para a probabilidade de cada classe; "
+            "bias + soma das contribuições = probabilidades"
+        ),
+    )
+
+
+class BatchExplanationResult(BaseModel):
+    feature_order: List[str]
+    explanations: List[ExplanationResult]
+
+
+class SensitivityAxis(BaseModel):
+    feature: str = Field(..., description="Feature varrida (nome como em `/model-info`)")
+    values: Optional[List[float]] = Field(None, description="Valores explícitos do eixo")
+    start: Optional[float] = Field(None, description="Primeiro valor (com `stop` e `num`)")
+    stop: Optional[float] = Field(None, description="Último valor (inclusive)")
+    num: int = Field(50, ge=2, description="Número de pontos entre `start` e `stop`")
+    log: bool = Field(False, description="Espaçamento geométrico (ex.: marketcap)")
+
+
+class SensitivityRequest(BaseModel):
+    base: Features
+    axes: List[SensitivityAxis] = Field(..., min_length=1, max_length=2, description="Uma ou duas features varridas")
+    link_mirrored: bool = Field(
+        True, description="Varrer uma taxa macro também atualiza a coluna espelhada (ex.: `interest_rate = -interest_rate_percent`)"
+    )
+
+
+class SensitivityAxisResult(BaseModel):
+    feature: str
+    values: List[float]
+
+
+class SensitivityResponse(BaseModel):
+    model_version: str
+    axes: List[SensitivityAxisResult]
+    shape: List[int] = Field(..., description="Pontos por eixo; as curvas são listas (1 eixo) ou matrizes [eixo 1][eixo 2]")
+    n_points: int
+    evaluated_points: int = Field(..., description="Linhas distintas avaliadas pela floresta")
+    labels: List[PotentialLabel]
+    base: PredictionResult
+    predicted_class: list
+    prob_low: list
+    prob_medium: list
+    prob_high: list
+
+
+class MacroShockSpec(BaseModel):
+    country: str = Field(..., description="País chocado (como em `dados/data.csv`)")
+    feature: str = Field(..., description="Feature macro (ex.: `interest_rate_percent`)")
+    delta: Optional[float] = Field(None, description="Valor somado à feature (ex.: 3 para +3 p.p.)")
+    value: Optional[float] = Field(None, description="Novo valor da feature")
+
+
+class ScenarioRequest(BaseModel):
+    shocks: List[MacroShockSpec] = Field(..., min_length=1)
+    link_mirrored: bool = Field(
+        True, description="Choques em uma taxa também atualizam a coluna espelhada (ex.: `interest_rate = -interest_rate_percent`)"
+    )
+    limit: int = Field(100, ge=0, le=10000, description="Empresas retornadas (maiores variações primeiro)")
+    changed_only: bool = Field(False, description="Retorna apenas empresas que mudaram de classe")
+
+
+class CountryMigration(BaseModel):
+    country: str
+    rows: int = Field(..., description="Empresas do país reavaliadas")
+    changed: int = Field(..., description="Empresas que mudaram de classe")
+    transitions: Dict[PotentialLabel, Dict[PotentialLabel, int]] = Field(
+        ..., description="Contagem por classe de base (chave externa) e classe no cenário"
+    )
+    mean_delta: Dict[PotentialLabel, float] = Field(..., description="Variação média das probabilidades")
+
+
+class CompanyDelta(BaseModel):
+    name: str
+    country: str
+    baseline_potential: PotentialLabel
+    scenario_potential: PotentialLabel
+    prob_low: float
+    prob_medium: float
+    prob_high: float
+    delta_low: float
+    delta_medium: float
+    delta_high: float
+
+
+class ScenarioResponse(BaseModel):
+    model_version: str
+    rescored_rows: int = Field(..., description="Linhas do universo reavaliadas (países chocados)")
+    reused_rows: int = Field(..., description="Linhas com a previsão de base reaproveitada")
+    countries: List[CountryMigration]
+    total_companies: int = Field(..., description="Empresas consideradas antes de `limit`")
+    companies: List[CompanyDelta]
+
+
 class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
+    ready: bool = False
+    state: str = "loading"
+    load_error: Optional[str] = None
+    model_version: Optional[str] = None
     n_example_rows: Optional[int] = None
+    microbatch: Optional[dict] = None
+    cache: Optional[dict] = None
+    parallelism: Optional[dict] = None
+
+
+class RankingItem(BaseModel):
+    rank: int = Field(..., description="Posição no grupo filtrado (1 = maior probabilidade)")
+    name: str
+    country: str
+    marketcap: float
+    revenue_ttm: float
+    predicted_potential: PotentialLabel
+    probability: float = Field(..., description="Probabilidade da classe consultada")
+    percentile: float = Field(..., description="% do grupo filtrado com probabilidade menor ou igual")
+    prob_low: float
+    prob_medium: float
+    prob_high: float
+
+
+class RankingResponse(BaseModel):
+    model_version: str
+    potential: PotentialLabel
+    country: Optional[str] = None
+    total: int = Field(..., description="Empresas no grupo filtrado")
+    items: List[RankingItem]
+
+
+class RankingPercentileResponse(BaseModel):
+    model_version: str
+    potential: PotentialLabel
+    country: Optional[str] = None
+    count: int = Field(..., description="Empresas no grupo filtrado")
+    prob: Optional[float] = None
+    percentile: Optional[float] = Field(None, description="% do grupo com probabilidade menor ou igual a `prob`")
+    q: Optional[float] = None
+    prob_at_q: Optional[float] = Field(None, description="Probabilidade no percentil `q` do grupo")
+
+
+class JobStatus(BaseModel):
+    id: str
+    status: Literal["queued", "running", "done", "failed", "cancelled"]
+    n_rows: int
+    rows_done: int
+    chunks_done: int
+    chunks_total: int
+    progress: float = Field(..., ge=0.0, le=1.0, description="Fração das linhas já avaliadas")
+    model_version: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    rows_per_second: Optional[float] = None
+    error: Optional[str] = None
+
+
+class JobResultsResponse(BaseModel):
+    id: str
+    model_version: str
+    offset: int
+    total: int = Field(..., description="Linhas do job")
+    predictions: List[PredictionResult]
+
+
+class MacroTableResponse(BaseModel):
+    source: str
+    countries: List[dict]
 
 
 class ModelInfoResponse(BaseModel):
     model_type: str
+    model_version: Optional[str] = None
+    model_source: Optional[str] = None
+    loaded_at: Optional[float] = None
+    previous_versions: List[str] = []
     params: dict
     feature_order: List[str]
+    inference_engine: str
+
+
+class ModelReloadRequest(BaseModel):
+    path: Optional[str] = Field(
+        None,
+        description="Arquivo `.joblib` dentro de `MODEL_DIR` (padrão: recarrega o arquivo da versão ativa)",
+    )
+
+
+class ModelRegistryResponse(BaseModel):
+    changed: Optional[bool] = None
+    active: Optional[dict] = None
+    previous: List[dict] = []
+    available: List[str] = []
+    swaps: int = 0
+    failed_reloads: int = 0
+    last_error: Optional[str] = None
+    watching: bool = False
 
 
 POTENTIAL_LABELS = {0: "Low", 1: "Medium", 2: "High"}
 
 
+def _require_model() -> ModelSnapshot:
+    """
+    Retorna o snapshot ativo do modelo; se não houver, responde 503
+    (com `Retry-After` enquanto os artefatos ainda estão carregando).
+    """
+    snapshot = REGISTRY.active
+    if snapshot is not None:
+        return snapshot
+    if ARTIFACTS_STATE == "loading":
+        raise HTTPException(
+            status_code=503,
+            detail="Modelo ainda carregando, tente novamente em instantes.",
+            headers={"Retry-After": "5"},
+        )
+    raise HTTPException(status_code=503, detail="Modelo não carregado.")
+
+
 def _features_to_array(features: Features) -> np.ndarray:
     """
     Converte o modelo pydantic `Features` para o vetor numpy na ordem
@@ -257,6 +1124,124 @@ def _features_to_array(features: Features) -> np.ndarray:
     )
 
 
+def _companies_to_array(instances: List[CompanyFeatures]) -> np.ndarray:
+    """
+    Monta a matriz completa de features para registros `CompanyFeatures`,
+    preenchendo as colunas macro com a tabela por país.
+    """
+    if MACRO_STORE is None:
+        raise HTTPException(status_code=503, detail="Tabela macro por país não carregada.")
+
+    firm = np.array([[getattr(inst, name) for name in FIRM_FEATURES] for inst in instances], dtype=np.float64)
+    try:
+        return MACRO_STORE.assemble(firm, [inst.country for inst in instances], FEATURE_ORDER)
+    except UnknownCountryError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _version_header(response: Response, snapshot: ModelSnapshot) -> None:
+    response.headers["X-Model-Version"] = snapshot.version
+
+
+_NO_TIMER = StageTimer(None, "", "")
+
+
+def _score_matrix(
+    X: np.ndarray, snapshot: ModelSnapshot, timer: StageTimer = _NO_TIMER
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Retorna `(classes, probabilidades)` para a matriz de features `X`,
+    usando o motor compilado quando disponível.
+    """
+    if snapshot.engine is not None:
+        # Classe e probabilidades saem da mesma passada pela floresta
+        with timer.stage("score"):
+            return SCORER.map_rows(snapshot.engine.predict_with_proba, X)
+
+    model = snapshot.model
+    with timer.stage("predict"):
+        preds = SCORER.map_rows(model.predict, X)
+    if hasattr(model, "predict_proba"):
+        with timer.stage("predict_proba"):
+            probas = SCORER.map_rows(model.predict_proba, X)
+    else:
+        # Se o modelo não suportar probabilidades, cria distribuição dummy
+        probas = np.zeros((len(preds), 3), dtype=float)
+        for i, c in enumerate(preds):
+            probas[i, int(c)] = 1.0
+    return preds, probas
+
+
+def _predict_matrix(
+    X: np.ndarray, snapshot: ModelSnapshot, timer: StageTimer = _NO_TIMER
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Como `_score_matrix`, mas passando pelo cache de previsões: linhas
+    repetidas dentro do batch são avaliadas uma única vez e apenas as que
+    não estão no cache chegam ao modelo.
+    """
+    if CACHE is None:
+        return _score_matrix(X, snapshot, timer)
+
+    with timer.stage("cache_lookup"):
+        keys = row_keys(X, snapshot.version)
+        # Deduplicação dentro do batch: índice único de cada linha e a linha da
+        # primeira ocorrência de cada chave
+        first_index = {}
+        first_rows = []
+        inverse = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            j = first_index.get(key)
+            if j is None:
+                j = first_index[key] = len(first_rows)
+                first_rows.append(i)
+            inverse[i] = j
+        unique_keys = list(first_index)
+        unique_rows = np.asarray(first_rows, dtype=np.intp)
+
+        cached = CACHE.get_many(unique_keys)
+        miss = [j for j, entry in enumerate(cached) if entry is None]
+
+    if miss:
+        miss_preds, miss_probas = _score_matrix(np.asarray(X)[unique_rows[miss]], snapshot, timer)
+        with timer.stage("cache_store"):
+            CACHE.put_many([unique_keys[j] for j in miss], miss_preds, miss_probas)
+        n_classes = miss_probas.shape[1]
+    else:
+        n_classes = cached[0][1].shape[0]
+
+    preds = np.empty(len(unique_keys), dtype=np.int64)
+    probas = np.empty((len(unique_keys), n_classes), dtype=np.float64)
+    for j, entry in enumerate(cached):
+        if entry is not None:
+            preds[j], probas[j] = entry
+    if miss:
+        preds[miss] = miss_preds
+        probas[miss] = miss_probas
+
+    return preds[inverse], probas[inverse]
+
+
+def _predict_microbatch(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, str]:
+    """
+    Avalia um micro-batch com a versão do modelo ativa no momento do flush
+    e a retorna junto, para o `X-Model-Version` de cada resposta.
+    """
+    snapshot = _require_model()
+    timer = _stage_timer("microbatch", snapshot)
+    _record_rows(timer, X.shape[0])
+    preds, probas = _predict_matrix(X, snapshot, timer)
+    return preds, probas, snapshot.version
+
+
+# Despachante de micro-batches (None quando desabilitado)
+DISPATCHER = (
+    MicroBatchDispatcher(_predict_microbatch, MICROBATCH_MAX_BATCH_SIZE, MICROBATCH_MAX_WAIT_US)
+    if MICROBATCH_ENABLED
+    else None
+)
+
+
 def _proba_to_result(pred_class: int, proba: np.ndarray) -> PredictionResult:
     return PredictionResult(
         predicted_class=int(pred_class),
@@ -268,105 +1253,868 @@ def _proba_to_result(pred_class: int, proba: np.ndarray) -> PredictionResult:
     )
 
 
+def _require_explainer(snapshot: ModelSnapshot) -> ForestExplainer:
+    if snapshot.explainer is None:
+        raise HTTPException(
+            status_code=501,
+            detail="Contribuições por feature indisponíveis para o modelo ativo (ex.: artefato compacto `.npz`).",
+        )
+    return snapshot.explainer
+
+
+def _explanation_results(
+    explainer: ForestExplainer, preds: np.ndarray, probas: np.ndarray, contributions: np.ndarray
+) -> List[ExplanationResult]:
+    labels = [POTENTIAL_LABELS[int(c)] for c in explainer.forest.classes_]
+    bias = dict(zip(labels, explainer.bias.tolist()))
+    results = []
+    for pred, proba, row in zip(preds, probas, contributions.tolist()):
+        result = _proba_to_result(int(pred), proba)
+        results.append(
+            ExplanationResult(
+                **result.model_dump(),
+                bias=bias,
+                contributions={name: dict(zip(labels, values)) for name, values in zip(FEATURE_ORDER, row)},
+            )
+        )
+    return results
+
+
+def _accepts_arrow(accept: str) -> bool:
+    return any(media_type(part) in ARROW_STREAM_TYPES for part in (accept or "").split(","))
+
+
+def _columnar_response(
+    preds: np.ndarray, probas: np.ndarray, model_version: str, accept: str, **fields: object
+) -> Response:
+    """
+    Resposta colunar: classes e probabilidades saem direto dos arrays do
+    modelo, sem um objeto por linha nem validação pelo `response_model`.
+    Arrow IPC se o cliente aceitar (`Accept`), JSON caso contrário; `fields`
+    são campos escalares extras (no JSON ou nos metadados do schema Arrow).
+    """
+    columns = {
+        "predicted_class": np.asarray(preds, dtype=np.int64),
+        "prob_low": probas[:, 0],
+        "prob_medium": probas[:, 1],
+        "prob_high": probas[:, 2],
+    }
+    labels = [POTENTIAL_LABELS[c] for c in sorted(POTENTIAL_LABELS)]
+    headers = {"X-Model-Version": model_version}
+    if _accepts_arrow(accept):
+        metadata = {"model_version": model_version, "labels": json.dumps(labels), **{k: str(v) for k, v in fields.items()}}
+        return Response(encode_arrow_stream(columns, metadata), media_type=ARROW_STREAM_TYPES[0], headers=headers)
+    payload = {"model_version": model_version, **fields, "n_rows": len(preds), "labels": labels, **columns}
+    return Response(encode_columnar_json(payload), media_type="application/json", headers=headers)
+
+
 @app.get("/health", response_model=HealthResponse, tags=["system"])
 def health_check() -> HealthResponse:
     """
     Verificação simples de saúde da API.
+
+    Responde assim que o processo sobe; `state` indica se os artefatos ainda
+    estão carregando (`loading`), prontos (`ready`) ou falharam (`failed`).
     """
     n_rows = int(EXAMPLE_DF.shape[0]) if EXAMPLE_DF is not None else None
-    return HealthResponse(status="ok", model_loaded=MODEL is not None, n_example_rows=n_rows)
+    snapshot = REGISTRY.active
+    return HealthResponse(
+        status="ok",
+        model_loaded=snapshot is not None,
+        ready=ARTIFACTS_STATE == "ready",
+        state=ARTIFACTS_STATE,
+        load_error=ARTIFACTS_ERROR,
+        model_version=snapshot.version if snapshot is not None else None,
+        n_example_rows=n_rows,
+        microbatch=DISPATCHER.stats() if DISPATCHER is not None else None,
+        cache=CACHE.stats() if CACHE is not None else None,
+        parallelism=SCORER.to_dict(),
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["system"])
+def metrics() -> PlainTextResponse:
+    """
+    Métricas no formato de texto do Prometheus: latência por etapa do caminho
+    de previsão (`prediction_stage_seconds`), linhas por requisição e vazão,
+    latência total e requisições em andamento por endpoint.
+    """
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas desativadas (METRICS_ENABLED=0).")
+    return PlainTextResponse(METRICS.render(), media_type=METRICS_CONTENT_TYPE)
 
 
 @app.get("/model-info", response_model=ModelInfoResponse, tags=["model"])
-def model_info() -> ModelInfoResponse:
-    """
-    Retorna informações básicas sobre o modelo e a ordem das features.
-    """
-    if MODEL is None:
-        raise HTTPException(status_code=503, detail="Modelo não carregado.")
-
-    feature_order = [
-        "dividend_yield_ttm",
-        "earnings_ttm",
-        "marketcap",
-        "pe_ratio_ttm",
-        "revenue_ttm",
-        "price",
-        "gdp_per_capita_usd",
-        "gdp_growth_percent",
-        "inflation_percent",
-        "interest_rate_percent",
-        "unemployment_rate_percent",
-        "exchange_rate_to_usd",
-        "inflation",
-        "interest_rate",
-        "unemployment",
-    ]
-
-    params = MODEL.get_params() if hasattr(MODEL, "get_params") else {}
+def model_info(response: Response) -> ModelInfoResponse:
+    """
+    Retorna informações básicas sobre o modelo ativo (versão, arquivo de
+    origem, versões anteriores disponíveis para rollback) e a ordem das features.
+    """
+    snapshot = _require_model()
+    _version_header(response, snapshot)
+
+    model = snapshot.model
+    params = model.get_params() if hasattr(model, "get_params") else {}
 
     return ModelInfoResponse(
-        model_type=MODEL.__class__.__name__,
+        model_type=getattr(model, "model_type", model.__class__.__name__),
+        model_version=snapshot.version,
+        model_source=snapshot.source,
+        loaded_at=snapshot.loaded_at,
+        previous_versions=[previous.version for previous in REGISTRY.history],
         params=params,
-        feature_order=feature_order,
+        feature_order=FEATURE_ORDER,
+        inference_engine=snapshot.inference_engine,
     )
 
 
 @app.post("/predict", response_model=PredictionResult, tags=["prediction"])
-def predict(features: Features) -> PredictionResult:
+async def predict(features: Features, response: Response) -> PredictionResult:
     """
     Previsão individual (um registro por vez).
+
+    Com `MICROBATCH_ENABLED=1`, requisições concorrentes são agrupadas pelo
+    despachante de micro-batches antes de chegar ao modelo (que usa a versão
+    ativa no momento do flush do batch, informada em `X-Model-Version`).
     """
-    if MODEL is None:
-        raise HTTPException(status_code=503, detail="Modelo não carregado.")
+    snapshot = _require_model()
+    _version_header(response, snapshot)
+    timer = _stage_timer("/predict", snapshot)
 
     try:
-        X = _features_to_array(features)
-        pred = MODEL.predict(X)[0]
-        if hasattr(MODEL, "predict_proba"):
-            proba = MODEL.predict_proba(X)[0]
+        start = time.perf_counter()
+        with timer.stage("to_array"):
+            X = _features_to_array(features)
+        if DISPATCHER is not None:
+            with timer.stage("microbatch_wait"):
+                pred, proba, version = await DISPATCHER.submit(X[0])
+            # Versão que de fato avaliou a linha (a do flush, não a da chegada)
+            response.headers["X-Model-Version"] = version
         else:
-            # Se o modelo não suportar probabilidades, cria distribuição dummy
-            proba = np.zeros(3, dtype=float)
-            proba[int(pred)] = 1.0
-
-        return _proba_to_result(int(pred), proba)
+            preds, probas = await run_in_threadpool(_predict_matrix, X, snapshot, timer)
+            pred, proba = preds[0], probas[0]
+        with timer.stage("build_response"):
+            result = _proba_to_result(int(pred), proba)
+        _record_rows(timer, 1, time.perf_counter() - start)
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao realizar previsão: {e}")
 
 
-@app.post("/predict-batch", response_model=BatchPredictionResult, tags=["prediction"])
-def predict_batch(request: BatchRequest) -> BatchPredictionResult:
+def _decode_batch_body(content_type: str, body: bytes, timer: StageTimer = _NO_TIMER) -> np.ndarray:
+    """
+    Converte o corpo de `/predict-batch` na matriz de features, conforme o
+    Content-Type. JSON continua passando pela validação de `BatchRequest`.
+    """
+    if media_type(content_type) in ("", "application/json"):
+        with timer.stage("validate"):
+            request = BatchRequest.model_validate_json(body)
+        if not request.instances:
+            return np.empty((0, len(FEATURE_ORDER)))
+        with timer.stage("to_array"):
+            X_list = [_features_to_array(instance)[0] for instance in request.instances]
+            return np.vstack(X_list)
+
+    with timer.stage("decode"):
+        return decode_batch(content_type, body, FEATURE_ORDER)
+
+
+_BATCH_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "application/json": {
+            "schema": BatchRequest.model_json_schema(ref_template="#/components/schemas/{model}"),
+        },
+        **{
+            kind: {"schema": {"type": "string", "format": "binary"}}
+            for kind in SUPPORTED_TYPES
+        },
+    },
+}
+
+
+@app.post(
+    "/predict-batch",
+    response_model=BatchPredictionResult,
+    tags=["prediction"],
+    openapi_extra={"requestBody": _BATCH_REQUEST_BODY},
+)
+async def predict_batch(request: Request, response: Response, layout: ResponseLayout = "rows") -> BatchPredictionResult:
     """
     Previsão em batch.
 
     Envie uma lista de instâncias no campo `instances`, cada uma com as mesmas
-    features usadas no endpoint `/predict`.
+    features usadas no endpoint `/predict` (`application/json`), ou a matriz
+    de features em formato binário/colunar, escolhido pelo Content-Type:
+
+    - `application/vnd.apache.arrow.file` / `application/x-feather` / `application/vnd.apache.arrow.stream`
+    - `application/x-npy` (float32 ou float64, shape (n, 15), na ordem de `/model-info`)
+    - `text/csv` (layout de `template_empresas.csv`)
+
+    Com `layout=columnar`, a resposta traz um array por campo
+    (`predicted_class`, `prob_low`, `prob_medium`, `prob_high`) em vez de um
+    objeto por linha; com `Accept: application/vnd.apache.arrow.stream`, as
+    mesmas colunas vêm em Arrow IPC.
     """
-    if MODEL is None:
-        raise HTTPException(status_code=503, detail="Modelo não carregado.")
+    snapshot = _require_model()
+    _version_header(response, snapshot)
+    timer = _stage_timer("/predict-batch", snapshot)
+
+    content_type = request.headers.get("content-type", "application/json")
+    with timer.stage("read_body"):
+        body = await request.body()
+    start = time.perf_counter()
+    try:
+        X = await run_in_threadpool(_decode_batch_body, content_type, body, timer)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except BatchDecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if X.shape[0] == 0:
+        raise HTTPException(status_code=400, detail="Lista de instâncias vazia.")
 
-    if not request.instances:
+    columnar = layout == "columnar" or _accepts_arrow(request.headers.get("accept", ""))
+    try:
+        preds, probas = await run_in_threadpool(_predict_matrix, X, snapshot, timer)
+        with timer.stage("build_response"):
+            if columnar:
+                result = _columnar_response(preds, probas, snapshot.version, request.headers.get("accept", ""))
+            else:
+                results = [_proba_to_result(int(c), probas[i]) for i, c in enumerate(preds)]
+                result = BatchPredictionResult(predictions=results)
+        _record_rows(timer, len(preds), time.perf_counter() - start)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao realizar previsões em batch: {e}")
+
+
+@app.post("/explain", response_model=ExplanationResult, tags=["prediction"])
+async def explain(features: Features, response: Response) -> ExplanationResult:
+    """
+    Previsão individual com a contribuição de cada feature para a
+    probabilidade de cada classe (decomposição exata pelos caminhos nas
+    árvores: `bias` + soma das contribuições = probabilidades).
+    """
+    snapshot = _require_model()
+    explainer = _require_explainer(snapshot)
+    _version_header(response, snapshot)
+    timer = _stage_timer("/explain", snapshot)
+
+    try:
+        start = time.perf_counter()
+        with timer.stage("to_array"):
+            X = _features_to_array(features)
+        with timer.stage("explain"):
+            preds, probas, contributions = await run_in_threadpool(explainer.explain, X)
+        with timer.stage("build_response"):
+            result = _explanation_results(explainer, preds, probas, contributions)[0]
+        _record_rows(timer, 1, time.perf_counter() - start)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular contribuições: {e}")
+
+
+@app.post(
+    "/explain-batch",
+    response_model=BatchExplanationResult,
+    tags=["prediction"],
+    openapi_extra={"requestBody": _BATCH_REQUEST_BODY},
+)
+async def explain_batch(request: Request, response: Response) -> BatchExplanationResult:
+    """
+    Contribuições por feature em batch, com o mesmo corpo (e os mesmos
+    Content-Types) de `/predict-batch`. O batch inteiro desce as árvores uma
+    única vez.
+    """
+    snapshot = _require_model()
+    explainer = _require_explainer(snapshot)
+    _version_header(response, snapshot)
+    timer = _stage_timer("/explain-batch", snapshot)
+
+    content_type = request.headers.get("content-type", "application/json")
+    with timer.stage("read_body"):
+        body = await request.body()
+    start = time.perf_counter()
+    try:
+        X = await run_in_threadpool(_decode_batch_body, content_type, body, timer)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except BatchDecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if X.shape[0] == 0:
         raise HTTPException(status_code=400, detail="Lista de instâncias vazia.")
 
     try:
-        X_list = [_features_to_array(instance)[0] for instance in request.instances]
-        X = np.vstack(X_list)
+        with timer.stage("explain"):
+            preds, probas, contributions = await run_in_threadpool(SCORER.map_rows, explainer.explain, X)
+        with timer.stage("build_response"):
+            results = _explanation_results(explainer, preds, probas, contributions)
+            result = BatchExplanationResult(feature_order=FEATURE_ORDER, explanations=results)
+        _record_rows(timer, len(preds), time.perf_counter() - start)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao calcular contribuições em batch: {e}")
+
+
+def _require_jobs() -> JobManager:
+    if JOBS is None:
+        raise HTTPException(status_code=503, detail="Jobs desativados (JOBS_ENABLED=0).")
+    return JOBS
+
+
+def _job_status(job: dict) -> JobStatus:
+    elapsed = None
+    if job["started_at"] is not None:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+    return JobStatus(
+        id=job["id"],
+        status=job["status"],
+        n_rows=job["n_rows"],
+        rows_done=job["rows_done"],
+        chunks_done=job["chunks_done"],
+        chunks_total=job["chunks_total"],
+        progress=job["rows_done"] / job["n_rows"] if job["n_rows"] else 1.0,
+        model_version=job["model_version"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+        rows_per_second=job["rows_done"] / elapsed if elapsed else None,
+        error=job["error"],
+    )
+
+
+@app.post("/sensitivity", response_model=SensitivityResponse, tags=["prediction"])
+async def sensitivity(payload: SensitivityRequest) -> Response:
+    """
+    Análise what-if: probabilidades de uma empresa (`base`) enquanto uma ou
+    duas features percorrem uma grade de valores. A grade é montada no
+    servidor e avaliada em uma única chamada à floresta; com dois eixos, as
+    curvas voltam como matrizes (primeiro eixo nas linhas).
+    """
+    snapshot = _require_model()
+    timer = _stage_timer("/sensitivity", snapshot)
+
+    try:
+        axes = [
+            (axis.feature, axis_values(axis.values, axis.start, axis.stop, axis.num, axis.log))
+            for axis in payload.axes
+        ]
+        shape = validate_axes(axes, FEATURE_ORDER, payload.link_mirrored, SENSITIVITY_MAX_POINTS)
+    except SensitivityError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    try:
+        start = time.perf_counter()
+        base = _features_to_array(payload.base)
+        forest = snapshot.engine if isinstance(snapshot.engine, CompiledForest) else None
+        score = partial(_score_matrix, snapshot=snapshot, timer=timer)
+        base_preds, base_probas = await run_in_threadpool(score, base)
+        preds, probas, evaluated = await run_in_threadpool(
+            sweep, score, base[0], FEATURE_ORDER, axes, payload.link_mirrored, forest
+        )
+        with timer.stage("build_response"):
+            probas = probas.reshape(shape + (probas.shape[1],))
+            body = encode_columnar_json({
+                "model_version": snapshot.version,
+                "axes": [{"feature": feature, "values": values.tolist()} for feature, values in axes],
+                "shape": list(shape),
+                "n_points": int(np.prod(shape)),
+                "evaluated_points": evaluated,
+                "labels": [POTENTIAL_LABELS[c] for c in sorted(POTENTIAL_LABELS)],
+                "base": _proba_to_result(base_preds[0], base_probas[0]).model_dump(),
+                "predicted_class": np.asarray(preds, dtype=np.int64).reshape(shape),
+                "prob_low": probas[..., 0],
+                "prob_medium": probas[..., 1],
+                "prob_high": probas[..., 2],
+            })
+        _record_rows(timer, int(np.prod(shape)), time.perf_counter() - start)
+        return Response(body, media_type="application/json", headers={"X-Model-Version": snapshot.version})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na análise de sensibilidade: {e}")
+
+
+@app.post(
+    "/jobs",
+    response_model=JobStatus,
+    status_code=202,
+    tags=["jobs"],
+    openapi_extra={"requestBody": _BATCH_REQUEST_BODY},
+)
+async def create_job(request: Request, response: Response) -> JobStatus:
+    """
+    Pontuação assíncrona de um batch grande, com o mesmo corpo (e os mesmos
+    Content-Types) de `/predict-batch`.
+
+    Responde na hora com o id do job; os blocos são avaliados por um pool
+    de processos separado, sem ocupar o threadpool da API. Acompanhe por
+    `GET /jobs/{id}` e leia o resultado em `GET /jobs/{id}/results`. O job
+    usa a versão do modelo ativa no envio.
+    """
+    manager = _require_jobs()
+    snapshot = _require_model()
+    _version_header(response, snapshot)
+
+    content_type = request.headers.get("content-type", "application/json")
+    body = await request.body()
+    try:
+        X = await run_in_threadpool(_decode_batch_body, content_type, body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except BatchDecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if X.shape[0] == 0:
+        raise HTTPException(status_code=400, detail="Lista de instâncias vazia.")
+
+    job = await run_in_threadpool(
+        manager.submit, X, len(POTENTIAL_LABELS), snapshot.source, snapshot.version, snapshot.inference_engine
+    )
+    response.headers["Location"] = f"/jobs/{job['id']}"
+    return _job_status(job)
 
-        preds = MODEL.predict(X)
-        if hasattr(MODEL, "predict_proba"):
-            probas = MODEL.predict_proba(X)
+
+@app.get("/jobs/{job_id}", response_model=JobStatus, tags=["jobs"])
+def job_status(job_id: str) -> JobStatus:
+    """Estado e progresso do job."""
+    try:
+        return _job_status(_require_jobs().status(job_id))
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/jobs/{job_id}/results", response_model=JobResultsResponse, tags=["jobs"])
+def job_results(
+    job_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    layout: ResponseLayout = "rows",
+) -> JobResultsResponse:
+    """
+    Resultados de um job concluído, na ordem da entrada, paginados por
+    `offset` / `limit`. Aceita `layout=columnar` (e Arrow IPC via `Accept`)
+    como `/predict-batch`.
+    """
+    manager = _require_jobs()
+    try:
+        job = manager.status(job_id)
+        if job["status"] != "done":
+            raise HTTPException(status_code=409, detail=f"Job {job_id} não concluído (status: {job['status']}).")
+        preds, probas = manager.results(job_id, offset, limit)
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    accept = request.headers.get("accept", "")
+    if layout == "columnar" or _accepts_arrow(accept):
+        return _columnar_response(
+            preds, probas, job["model_version"], accept, id=job_id, offset=offset, total=job["n_rows"]
+        )
+    return JobResultsResponse(
+        id=job_id,
+        model_version=job["model_version"],
+        offset=offset,
+        total=job["n_rows"],
+        predictions=[_proba_to_result(int(c), probas[i]) for i, c in enumerate(preds)],
+    )
+
+
+@app.delete("/jobs/{job_id}", response_model=JobStatus, tags=["jobs"])
+def cancel_job(job_id: str) -> JobStatus:
+    """Cancela o job (se ainda em andamento) e remove seus resultados."""
+    try:
+        return _job_status(_require_jobs().cancel(job_id))
+    except JobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+_FEATURES_LIST = TypeAdapter(List[Features])
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    `StreamingResponse` que não escuta desconexões em paralelo: o próprio
+    gerador continua lendo o corpo da requisição enquanto a resposta é
+    enviada, e uma tarefa concorrente de `receive()` roubaria esses chunks.
+    Desconexões aparecem como `ClientDisconnect` na leitura do corpo.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _decode_stream_chunk(
+    kind: str, lines: List[bytes], csv_header: Optional[bytes], timer: StageTimer = _NO_TIMER
+) -> np.ndarray:
+    if kind in CSV_TYPES:
+        with timer.stage("decode"):
+            return decode_csv(csv_header + b"\n" + b"\n".join(lines), FEATURE_ORDER)
+
+    with timer.stage("validate"):
+        instances = _FEATURES_LIST.validate_json(b"[" + b",".join(lines) + b"]")
+    with timer.stage("to_array"):
+        return np.vstack([_features_to_array(instance)[0] for instance in instances])
+
+
+def _score_stream_chunk(X: np.ndarray, snapshot: ModelSnapshot, timer: StageTimer = _NO_TIMER) -> bytes:
+    start = time.perf_counter()
+    preds, probas = _predict_matrix(X, snapshot, timer)
+    with timer.stage("build_response"):
+        lines = [_proba_to_result(int(c), probas[i]).model_dump_json() for i, c in enumerate(preds)]
+        chunk = ("\n".join(lines) + "\n").encode()
+    _record_rows(timer, len(preds), time.perf_counter() - start)
+    return chunk
+
+
+@app.post(
+    "/predict-stream",
+    tags=["prediction"],
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {kind: {"schema": {"type": "string", "format": "binary"}} for kind in NDJSON_TYPES + CSV_TYPES},
+        }
+    },
+)
+async def predict_stream(request: Request) -> StreamingResponse:
+    """
+    Previsão em streaming para batches sem limite de tamanho.
+
+    Lê o corpo como NDJSON (um objeto `Features` por linha) ou CSV no layout
+    de `template_empresas.csv`, avalia em blocos de `STREAM_CHUNK_ROWS`
+    linhas e devolve um `PredictionResult` por linha em NDJSON, na mesma
+    ordem da entrada. A memória usada não depende do número de linhas.
+
+    Como o status 200 já foi enviado, um erro no meio do fluxo é reportado
+    como uma última linha `{"error": ..., "row": <índice da primeira linha do bloco>}`.
+    Todo o fluxo é avaliado com a versão do modelo ativa no início da requisição.
+    """
+    snapshot = _require_model()
+    timer = _stage_timer("/predict-stream", snapshot)
+
+    kind = media_type(request.headers.get("content-type", "application/x-ndjson"))
+    if kind not in NDJSON_TYPES + CSV_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Content-Type '{kind}' não suportado. Use um de: {', '.join(NDJSON_TYPES + CSV_TYPES)}.",
+        )
+
+    async def generate():
+        csv_header = None
+        row = 0
+        try:
+            async for lines in iter_line_chunks(request.stream(), STREAM_CHUNK_ROWS):
+                if kind in CSV_TYPES and csv_header is None:
+                    csv_header = lines.pop(0)
+                    if not lines:
+                        continue
+                X = await run_in_threadpool(_decode_stream_chunk, kind, lines, csv_header, timer)
+                yield await run_in_threadpool(_score_stream_chunk, X, snapshot, timer)
+                row += len(lines)
+        except ClientDisconnect:
+            return
+        except (ValidationError, BatchDecodeError) as e:
+            yield (json.dumps({"error": f"Entrada inválida: {e}", "row": row}) + "\n").encode()
+        except Exception as e:
+            yield (json.dumps({"error": f"Erro ao realizar previsões: {e}", "row": row}) + "\n").encode()
+
+    return _DuplexStreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"X-Model-Version": snapshot.version},
+    )
+
+
+@app.post("/predict-company", response_model=PredictionResult, tags=["prediction"])
+async def predict_company(company: CompanyFeatures, response: Response) -> PredictionResult:
+    """
+    Previsão individual enviando apenas `country` e as seis features da
+    empresa; as features macro vêm da tabela por país do servidor.
+    """
+    snapshot = _require_model()
+    _version_header(response, snapshot)
+    timer = _stage_timer("/predict-company", snapshot)
+
+    start = time.perf_counter()
+    with timer.stage("to_array"):
+        X = _companies_to_array([company])
+    try:
+        if DISPATCHER is not None:
+            with timer.stage("microbatch_wait"):
+                pred, proba, version = await DISPATCHER.submit(X[0])
+            # Versão que de fato avaliou a linha (a do flush, não a da chegada)
+            response.headers["X-Model-Version"] = version
         else:
-            probas = np.zeros((len(preds), 3), dtype=float)
-            for i, c in enumerate(preds):
-                probas[i, int(c)] = 1.0
+            preds, probas = await run_in_threadpool(_predict_matrix, X, snapshot, timer)
+            pred, proba = preds[0], probas[0]
+        with timer.stage("build_response"):
+            result = _proba_to_result(int(pred), proba)
+        _record_rows(timer, 1, time.perf_counter() - start)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao realizar previsão: {e}")
+
+
+@app.post("/predict-company-batch", response_model=BatchPredictionResult, tags=["prediction"])
+def predict_company_batch(request: CompanyBatchRequest, response: Response) -> BatchPredictionResult:
+    """
+    Previsão em batch no formato reduzido de `/predict-company`.
+    """
+    snapshot = _require_model()
+    _version_header(response, snapshot)
+    timer = _stage_timer("/predict-company-batch", snapshot)
 
-        results = [_proba_to_result(int(c), probas[i]) for i, c in enumerate(preds)]
-        return BatchPredictionResult(predictions=results)
+    if not request.instances:
+        raise HTTPException(status_code=400, detail="Lista de instâncias vazia.")
+
+    start = time.perf_counter()
+    with timer.stage("to_array"):
+        X = _companies_to_array(request.instances)
+    try:
+        preds, probas = _predict_matrix(X, snapshot, timer)
+        with timer.stage("build_response"):
+            results = [_proba_to_result(int(c), probas[i]) for i, c in enumerate(preds)]
+            result = BatchPredictionResult(predictions=results)
+        _record_rows(timer, len(preds), time.perf_counter() - start)
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao realizar previsões em batch: {e}")
 
 
+def _require_rankings(snapshot: ModelSnapshot) -> RankingIndex:
+    if snapshot.rankings is None:
+        raise HTTPException(status_code=503, detail="Universo de ranking indisponível (dataset de exemplo não carregado).")
+    return snapshot.rankings
+
+
+@app.get("/rankings", response_model=RankingResponse, tags=["rankings"])
+async def rankings(
+    response: Response,
+    potential: PotentialLabel = "High",
+    country: Optional[str] = None,
+    k: int = Query(10, ge=1, le=1000),
+    marketcap_min: Optional[float] = None,
+    marketcap_max: Optional[float] = None,
+    revenue_min: Optional[float] = None,
+    revenue_max: Optional[float] = None,
+    min_percentile: Optional[float] = Query(None, ge=0.0, le=100.0),
+) -> RankingResponse:
+    """
+    Top-K empresas do universo de referência (`dados/data.csv`) por
+    probabilidade da classe `potential`, opcionalmente filtradas por país e
+    por intervalos de `marketcap` / `revenue_ttm` (limites inclusivos).
+
+    O universo é pontuado uma vez por versão do modelo e mantido em índices
+    ordenados por país e por classe: a consulta não avalia o modelo.
+    """
+    snapshot = _require_model()
+    index = _require_rankings(snapshot)
+    _version_header(response, snapshot)
+    try:
+        total, items = index.top(
+            potential, k, country, (marketcap_min, marketcap_max), (revenue_min, revenue_max), min_percentile
+        )
+    except UnknownCountryError:
+        raise HTTPException(status_code=404, detail=f"País fora do universo de ranking: {country}")
+    return RankingResponse(
+        model_version=snapshot.version,
+        potential=potential,
+        country=country,
+        total=total,
+        items=[RankingItem(**item) for item in items],
+    )
+
+
+@app.get("/rankings/percentile", response_model=RankingPercentileResponse, tags=["rankings"])
+async def rankings_percentile(
+    response: Response,
+    potential: PotentialLabel = "High",
+    prob: Optional[float] = Query(None, ge=0.0, le=1.0),
+    q: Optional[float] = Query(None, ge=0.0, le=100.0),
+    country: Optional[str] = None,
+    marketcap_min: Optional[float] = None,
+    marketcap_max: Optional[float] = None,
+    revenue_min: Optional[float] = None,
+    revenue_max: Optional[float] = None,
+) -> RankingPercentileResponse:
+    """
+    Percentis no grupo filtrado (mesmos filtros de `/rankings`): o percentil
+    de uma probabilidade `prob` e/ou a probabilidade no percentil `q`.
+    """
+    if prob is None and q is None:
+        raise HTTPException(status_code=400, detail="Informe `prob` e/ou `q`.")
+    snapshot = _require_model()
+    index = _require_rankings(snapshot)
+    _version_header(response, snapshot)
+    try:
+        result = index.percentile(potential, prob, q, country, (marketcap_min, marketcap_max), (revenue_min, revenue_max))
+    except UnknownCountryError:
+        raise HTTPException(status_code=404, detail=f"País fora do universo de ranking: {country}")
+    return RankingPercentileResponse(model_version=snapshot.version, potential=potential, country=country, **result)
+
+
+@app.post("/scenarios", response_model=ScenarioResponse, tags=["rankings"])
+async def scenarios(payload: ScenarioRequest, response: Response) -> ScenarioResponse:
+    """
+    Cenário de choques macro por país sobre o universo de referência (ex.:
+    juros do Brasil +3 p.p.). Só as empresas dos países chocados são
+    reavaliadas (passando pelo cache de previsões); as demais mantêm a
+    previsão de base. Retorna a migração entre classes por país e as
+    empresas com maior variação de probabilidade.
+    """
+    snapshot = _require_model()
+    index = _require_rankings(snapshot)
+    _version_header(response, snapshot)
+    timer = _stage_timer("/scenarios", snapshot)
+
+    try:
+        shocks = [MacroShock(s.country, s.feature, s.delta, s.value) for s in payload.shocks]
+        start = time.perf_counter()
+        result = await run_in_threadpool(
+            run_scenario,
+            index,
+            FEATURE_ORDER,
+            shocks,
+            partial(_predict_matrix, snapshot=snapshot, timer=timer),
+            payload.link_mirrored,
+        )
+    except UnknownCountryError as e:
+        raise HTTPException(status_code=404, detail=f"País fora do universo de ranking: {e.countries}")
+    except ScenarioError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    with timer.stage("build_response"):
+        total, companies = result.companies(payload.limit, payload.changed_only)
+        body = ScenarioResponse(
+            model_version=snapshot.version,
+            rescored_rows=result.rescored_rows,
+            reused_rows=result.reused_rows,
+            countries=[CountryMigration(**item) for item in result.migrations()],
+            total_companies=total,
+            companies=[CompanyDelta(**item) for item in companies],
+        )
+    if result.rescored_rows:
+        _record_rows(timer, result.rescored_rows, time.perf_counter() - start)
+    return body
+
+
+@app.get("/macro", response_model=MacroTableResponse, tags=["model"])
+def macro_table() -> MacroTableResponse:
+    """
+    Retorna a tabela de features macro por país usada em `/predict-company`.
+    """
+    if MACRO_STORE is None:
+        raise HTTPException(status_code=503, detail="Tabela macro por país não carregada.")
+    return MacroTableResponse(source=MACRO_STORE.source, countries=MACRO_STORE.to_records())
+
+
+@app.post("/macro/refresh", response_model=MacroTableResponse, tags=["model"])
+def refresh_macro_table(x_admin_token: Optional[str] = Header(None)) -> MacroTableResponse:
+    """
+    Recarrega a tabela macro (de `MACRO_TABLE_PATH`, se configurado) sem
+    reiniciar a API. A troca é atômica; em caso de erro a tabela atual é mantida.
+    Exige `X-Admin-Token`, como os endpoints `/admin/*`.
+    """
+    global MACRO_STORE
+
+    _require_admin(x_admin_token)
+
+    store = load_macro_store(load_example_data() if not MACRO_TABLE_PATH else None)
+    if store is None:
+        raise HTTPException(status_code=500, detail="Erro ao recarregar a tabela macro.")
+    MACRO_STORE = store
+    return MacroTableResponse(source=store.source, countries=store.to_records())
+
+
+def _require_admin(token: Optional[str]) -> None:
+    if ADMIN_TOKEN is not None and token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Token administrativo inválido.")
+
+
+def _resolve_model_path(path: str) -> Path:
+    """
+    Resolve um arquivo de modelo informado em `/admin/reload`, aceitando
+    apenas arquivos `.joblib` ou `.npz` (formato compacto) existentes
+    dentro de `MODEL_DIR`.
+    """
+    candidate = Path(path)
+    if not candidate.is_absolute() and candidate.parent == Path("."):
+        candidate = MODEL_DIR / candidate
+    model_dir = MODEL_DIR.resolve()
+    if candidate.resolve().parent != model_dir or candidate.suffix not in (".joblib", COMPACT_SUFFIX):
+        raise HTTPException(status_code=400, detail=f"Informe um arquivo .joblib ou .npz dentro de {MODEL_DIR}.")
+    if not candidate.exists():
+        raise HTTPException(status_code=404, detail=f"Arquivo de modelo não encontrado: {candidate}")
+    return candidate
+
+
+def _registry_response(changed: Optional[bool] = None) -> ModelRegistryResponse:
+    available = sorted(
+        [str(path) for path in MODEL_DIR.glob("*.joblib") if not path.name.endswith(".forest.joblib")]
+        + [str(path) for path in MODEL_DIR.glob(f"*{COMPACT_SUFFIX}")]
+    )
+    return ModelRegistryResponse(changed=changed, available=available, **REGISTRY.stats())
+
+
+@app.get("/admin/models", response_model=ModelRegistryResponse, tags=["admin"])
+def list_models(x_admin_token: Optional[str] = Header(None)) -> ModelRegistryResponse:
+    """
+    Versão ativa, versões anteriores (rollback) e arquivos de modelo disponíveis.
+    """
+    _require_admin(x_admin_token)
+    return _registry_response()
+
+
+@app.post("/admin/reload", response_model=ModelRegistryResponse, tags=["admin"])
+def reload_model(
+    request: Optional[ModelReloadRequest] = None,
+    x_admin_token: Optional[str] = Header(None),
+) -> ModelRegistryResponse:
+    """
+    Carrega uma versão do modelo (por padrão, relê o arquivo da versão ativa),
+    valida e aquece fora do caminho das requisições e a troca atomicamente.
+    Em caso de erro a versão ativa é mantida. `changed=false` indica que o
+    conteúdo é idêntico ao da versão ativa.
+    """
+    _require_admin(x_admin_token)
+    _require_model()
+
+    source = _resolve_model_path(request.path) if request is not None and request.path else None
+    try:
+        if source is None:
+            _, changed = REGISTRY.reload()
+        else:
+            _, changed = REGISTRY.load(source)
+    except ModelReloadError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return _registry_response(changed)
+
+
+@app.post("/admin/rollback", response_model=ModelRegistryResponse, tags=["admin"])
+def rollback_model(x_admin_token: Optional[str] = Header(None)) -> ModelRegistryResponse:
+    """
+    Volta atomicamente para a versão anterior do modelo (mantida em memória).
+    """
+    _require_admin(x_admin_token)
+    _require_model()
+
+    try:
+        REGISTRY.rollback()
+    except ModelReloadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _registry_response(True)
+
+
 @app.get("/", tags=["system"])
 def root():
     """
@@ -379,6 +2127,14 @@ def root():
     }
 
 
+# Carga síncrona na importação (`PRELOAD_ARTIFACTS=1`): no fim do módulo,
+# depois de tudo que o aquecimento do modelo usa estar definido. Não na
+# reimportação do script principal pelos processos filhos (`__mp_main__`,
+# ex.: workers dos jobs com `python app.py`)
+if PRELOAD_ARTIFACTS and __name__ != "__mp_main__":
+    load_artifacts()
+
+
 if __name__ == "__main__":
     # Execução local (desenvolvimento):
     # uvicorn app:app --reload
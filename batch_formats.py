@@ -0,0 +1,244 @@
+"""
+Decodificação de formatos binários / colunares para previsão em batch.
+
+Cada decodificador recebe o corpo bruto da requisição e devolve diretamente
+a matriz de features `(n, n_features)` na ordem esperada pelo modelo, sem
+passar por objetos pydantic linha a linha:
+
+- Arrow IPC (arquivo/Feather v2 ou stream): `application/vnd.apache.arrow.file`,
+  `application/vnd.apache.arrow.stream`, `application/x-feather`
+- NumPy `.npy` (float32 ou float64, shape (n, 15)): `application/x-npy`
+- CSV no layout de `template_empresas.csv`: `text/csv`
+
+`iter_line_chunks` agrupa um corpo recebido em streaming (NDJSON ou CSV) em
+blocos de linhas de tamanho fixo, para avaliação com memória constante.
+
+Na saída, `encode_columnar_json` e `encode_arrow_stream` serializam
+respostas colunares (um array por campo) direto dos arrays NumPy, sem
+construir um objeto por linha.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from forest_engine import overflow_mask
+
+
+ARROW_FILE_TYPES = ("application/vnd.apache.arrow.file", "application/x-feather")
+ARROW_STREAM_TYPES = ("application/vnd.apache.arrow.stream",)
+NPY_TYPES = ("application/x-npy", "application/npy")
+CSV_TYPES = ("text/csv", "application/csv")
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+SUPPORTED_TYPES = ARROW_FILE_TYPES + ARROW_STREAM_TYPES + NPY_TYPES + CSV_TYPES
+
+
+class BatchDecodeError(ValueError):
+    """Corpo da requisição inválido para o formato declarado."""
+
+
+class UnsupportedFormatError(ValueError):
+    """Content-Type não suportado (ou dependência opcional ausente)."""
+
+
+def media_type(content_type: str) -> str:
+    """Extrai o tipo de mídia de um cabeçalho Content-Type (sem parâmetros)."""
+    return (content_type or "").split(";", 1)[0].strip().lower()
+
+
+def decode_batch(content_type: str, body: bytes, feature_order: Sequence[str]) -> np.ndarray:
+    """
+    Decodifica o corpo conforme o Content-Type e retorna a matriz de features.
+    """
+    kind = media_type(content_type)
+    if kind in ARROW_FILE_TYPES:
+        return decode_arrow(body, feature_order, stream=False)
+    if kind in ARROW_STREAM_TYPES:
+        return decode_arrow(body, feature_order, stream=True)
+    if kind in NPY_TYPES:
+        return decode_npy(body, len(feature_order))
+    if kind in CSV_TYPES:
+        return decode_csv(body, feature_order)
+    raise UnsupportedFormatError(
+        f"Content-Type '{kind}' não suportado. Use application/json ou um de: {', '.join(SUPPORTED_TYPES)}."
+    )
+
+
+def _missing_columns(available: Sequence[str], feature_order: Sequence[str]) -> List[str]:
+    present = set(available)
+    return [name for name in feature_order if name not in present]
+
+
+def decode_arrow(body: bytes, feature_order: Sequence[str], stream: bool = False) -> np.ndarray:
+    """
+    Lê um arquivo (ou stream) Arrow IPC / Feather v2 e copia cada coluna de
+    feature uma única vez para a matriz de saída.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise UnsupportedFormatError("Suporte a Arrow requer o pacote 'pyarrow'.")
+
+    try:
+        buffer = pa.py_buffer(body)
+        reader = pa.ipc.open_stream(buffer) if stream else pa.ipc.open_file(buffer)
+        table = reader.read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise BatchDecodeError(f"Arrow IPC inválido: {e}")
+
+    missing = _missing_columns(table.column_names, feature_order)
+    if missing:
+        raise BatchDecodeError(f"Colunas ausentes: {missing}")
+
+    columns = [table.column(name) for name in feature_order]
+    for name, column in zip(feature_order, columns):
+        if not pa.types.is_floating(column.type) and not pa.types.is_integer(column.type):
+            raise BatchDecodeError(f"Coluna '{name}' não é numérica ({column.type}).")
+
+    # float32 preservado quando todas as colunas já são float32
+    all_float32 = all(pa.types.is_float32(column.type) for column in columns)
+    X = np.empty((table.num_rows, len(feature_order)), dtype=np.float32 if all_float32 else np.float64)
+    for j, column in enumerate(columns):
+        offset = 0
+        for chunk in column.chunks:
+            # Nulos viram NaN (valor ausente), como as células vazias do CSV
+            values = chunk.to_numpy(zero_copy_only=False)
+            X[offset:offset + len(values), j] = values
+            offset += len(values)
+    return _reject_infinite(X)
+
+
+def _reject_infinite(X: np.ndarray) -> np.ndarray:
+    # Mesma regra de todos os caminhos de entrada (JSON, NDJSON, binários) e
+    # do scikit-learn: NaN é avaliado como valor ausente, ±inf é recusado
+    if overflow_mask(X).any():
+        raise BatchDecodeError("Matriz de features contém valores infinitos (ou grandes demais para float32).")
+    return X
+
+
+def decode_npy(body: bytes, n_features: int) -> np.ndarray:
+    """
+    Interpreta um arquivo `.npy` diretamente sobre o buffer recebido
+    (sem cópia), aceitando float32 ou float64 com shape (n, n_features).
+    """
+    stream = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    except ValueError as e:
+        raise BatchDecodeError(f"Arquivo .npy inválido: {e}")
+
+    if dtype.hasobject or dtype.kind != "f" or dtype.itemsize not in (4, 8):
+        raise BatchDecodeError(f"dtype '{dtype}' não suportado; use float32 ou float64.")
+    if len(shape) != 2 or shape[1] != n_features:
+        raise BatchDecodeError(f"Esperado array com shape (n, {n_features}), recebido {shape}.")
+
+    count = shape[0] * shape[1]
+    offset = stream.tell()
+    if len(body) - offset < count * dtype.itemsize:
+        raise BatchDecodeError("Arquivo .npy truncado.")
+
+    data = np.frombuffer(body, dtype=dtype, count=count, offset=offset)
+    X = data.reshape(shape[::-1]).T if fortran_order else data.reshape(shape)
+    return _reject_infinite(X)
+
+
+def decode_csv(body: bytes, feature_order: Sequence[str]) -> np.ndarray:
+    """
+    Lê um CSV no layout de `template_empresas.csv` (colunas extras como
+    `name` e `country` são ignoradas) já com dtype float64 por coluna.
+    Células vazias viram NaN (valor ausente), como no `pd.read_csv`.
+    """
+    try:
+        header = pd.read_csv(io.BytesIO(body), nrows=0).columns
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise BatchDecodeError(f"CSV inválido: {e}")
+
+    missing = _missing_columns(header, feature_order)
+    if missing:
+        raise BatchDecodeError(f"Colunas ausentes: {missing}")
+
+    try:
+        df = pd.read_csv(
+            io.BytesIO(body),
+            usecols=list(feature_order),
+            dtype={name: np.float64 for name in feature_order},
+        )
+    except (ValueError, pd.errors.ParserError) as e:
+        raise BatchDecodeError(f"CSV inválido: {e}")
+
+    return _reject_infinite(df[list(feature_order)].to_numpy())
+
+
+async def iter_line_chunks(chunks: AsyncIterator[bytes], chunk_rows: int) -> AsyncIterator[List[bytes]]:
+    """
+    Agrupa um fluxo de bytes em listas de até `chunk_rows` linhas não vazias,
+    sem nunca manter mais do que um chunk (e uma linha parcial) em memória.
+    """
+    pending = b""
+    lines: List[bytes] = []
+    async for data in chunks:
+        if not data:
+            continue
+        parts = (pending + data).split(b"\n")
+        pending = parts.pop()
+        for line in parts:
+            line = line.strip()
+            if line:
+                lines.append(line)
+                if len(lines) >= chunk_rows:
+                    yield lines
+                    lines = []
+
+    pending = pending.strip()
+    if pending:
+        lines.append(pending)
+    if lines:
+        yield lines
+
+
+# ---------------------------------------------------------
+# Respostas colunares
+# ---------------------------------------------------------
+
+def encode_columnar_json(payload: Dict[str, object]) -> bytes:
+    """
+    Serializa um dict cujos valores podem ser arrays NumPy. Com
+    `orjson`, os arrays são escritos direto do buffer (sem um objeto Python
+    por elemento); sem ele, cai no `json` da biblioteca padrão.
+    """
+    try:
+        import orjson
+    except ImportError:
+        plain = {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in payload.items()}
+        return json.dumps(plain, separators=(",", ":")).encode()
+
+    # orjson só serializa arrays contíguos
+    ready = {k: np.ascontiguousarray(v) if isinstance(v, np.ndarray) else v for k, v in payload.items()}
+    return orjson.dumps(ready, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def encode_arrow_stream(columns: Dict[str, np.ndarray], metadata: Optional[Dict[str, str]] = None) -> bytes:
+    """Arrow IPC (stream) com uma coluna por array; `metadata` vai no schema."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise UnsupportedFormatError("Suporte a Arrow requer o pacote 'pyarrow'.")
+
+    table = pa.table({name: np.ascontiguousarray(values) for name, values in columns.items()})
+    if metadata:
+        table = table.replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
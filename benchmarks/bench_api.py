@@ -0,0 +1,576 @@
+"""
+Benchmarks reproduzíveis da API de previsão.
+
+Executa a mesma grade de cenários (endpoint x tamanho do batch x
+concorrência) contra o app FastAPI em processo, via ASGI (`asgi`), e contra
+um servidor uvicorn real em localhost (`uvicorn`), com linhas sorteadas de
+`dados/data.csv` (semente fixa). Para cada cenário reporta latência
+p50/p95/p99, linhas e requisições por segundo e o pico de RSS do processo
+que atende as requisições. Também mede o tempo de `load_model`, o cold start
+completo, a avaliação direta (sem HTTP) por tamanho de batch e as curvas de
+escala da avaliação em blocos (`parallel_inference.py`) por número de
+threads.
+
+Os resultados são gravados em JSON (por padrão em `benchmarks/results/`) e
+podem ser comparados entre commits com o subcomando `compare`.
+
+Requer `httpx` (`pip install httpx`).
+
+Uso:
+    python benchmarks/bench_api.py run
+    python benchmarks/bench_api.py run --modes asgi --batch-sizes 1,100 --concurrency 1,8
+    python benchmarks/bench_api.py compare benchmarks/results/antes.json benchmarks/results/depois.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+import pandas as pd
+
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+DEFAULT_BATCH_SIZES = "1,10,100,1000"
+DEFAULT_CONCURRENCY = "1,4,16"
+DEFAULT_SCALING_ROWS = "16384,65536,262144"
+
+# Variáveis de ambiente do app registradas junto com os resultados
+_APP_ENV_VARS = (
+    "INFERENCE_ENGINE",
+    "MODEL_LOAD_MODE",
+    "MICROBATCH_ENABLED",
+    "MICROBATCH_MAX_BATCH_SIZE",
+    "MICROBATCH_MAX_WAIT_US",
+    "PREDICTION_CACHE_ENABLED",
+    "METRICS_ENABLED",
+    "STREAM_CHUNK_ROWS",
+    "INFERENCE_THREADS",
+    "INFERENCE_PARALLEL_MIN_ROWS",
+    "INFERENCE_CHUNK_ROWS",
+    "WEB_CONCURRENCY",
+)
+
+
+# ---------------------------------------------------------
+# Utilitários
+# ---------------------------------------------------------
+
+def _parse_ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _read_status_kib(pid: int, field: str) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss(pid: int) -> bool:
+    """Zera o pico de RSS (VmHWM) do processo; só Linux."""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mib(pid: int) -> Optional[float]:
+    kib = _read_status_kib(pid, "VmHWM")
+    return kib / 1024 if kib is not None else None
+
+
+def _git_revision() -> Dict[str, Optional[str]]:
+    def git(*args: str) -> Optional[str]:
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=ROOT, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def _environment() -> dict:
+    import sklearn
+
+    from parallel_inference import available_cpus
+
+    return {
+        **_git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "available_cpus": available_cpus(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scikit_learn": sklearn.__version__,
+    }
+
+
+def latency_summary(latencies_s: Sequence[float]) -> dict:
+    ms = np.asarray(latencies_s, dtype=np.float64) * 1000
+    if ms.size == 0:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "mean": float(ms.mean()), "max": float(ms.max())}
+
+
+# ---------------------------------------------------------
+# Cargas de trabalho
+# ---------------------------------------------------------
+
+def sample_rows(n: int, seed: int) -> pd.DataFrame:
+    """Sorteia `n` linhas (com reposição) de `dados/data.csv`."""
+    from app import FEATURE_ORDER
+
+    df = pd.read_csv(ROOT / "dados" / "data.csv")
+    rng = np.random.default_rng(seed)
+    return df[FEATURE_ORDER].iloc[rng.integers(0, len(df), size=n)].reset_index(drop=True)
+
+
+def build_bodies(rows: pd.DataFrame, endpoint: str, batch_size: int, n_bodies: int) -> List[bytes]:
+    """
+    Corpos JSON pré-serializados (fora da medição), cada um com um trecho
+    diferente das linhas sorteadas.
+    """
+    records = rows.to_dict("records")
+    bodies = []
+    for i in range(n_bodies):
+        start = (i * batch_size) % len(records)
+        chunk = [records[(start + j) % len(records)] for j in range(batch_size)]
+        payload = chunk[0] if endpoint == "/predict" else {"instances": chunk}
+        bodies.append(json.dumps(payload).encode())
+    return bodies
+
+
+def scenario_grid(batch_sizes: Sequence[int], concurrency: Sequence[int]) -> List[Tuple[str, int, int]]:
+    grid = []
+    for c in concurrency:
+        grid.append(("/predict", 1, c))
+        for b in batch_sizes:
+            grid.append(("/predict-batch", b, c))
+    return grid
+
+
+async def drive(
+    client: httpx.AsyncClient, endpoint: str, bodies: List[bytes], concurrency: int, warmup: int
+) -> dict:
+    """
+    Envia `bodies` com `concurrency` requisições simultâneas e mede a
+    latência de cada uma (as `warmup` primeiras não entram na medição).
+    """
+    headers = {"content-type": "application/json"}
+    for body in bodies[:warmup]:
+        await client.post(endpoint, content=body, headers=headers)
+
+    measured = bodies[warmup:]
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index, errors
+        while next_index < len(measured):
+            body = measured[next_index]
+            next_index += 1
+            start = time.perf_counter()
+            response = await client.post(endpoint, content=body, headers=headers)
+            elapsed = time.perf_counter() - start
+            if response.status_code == 200:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return {"latencies": latencies, "errors": errors, "wall_seconds": wall}
+
+
+async def run_scenarios(
+    mode: str,
+    client: httpx.AsyncClient,
+    server_pid: int,
+    rows: pd.DataFrame,
+    grid: List[Tuple[str, int, int]],
+    n_requests: int,
+    warmup: int,
+) -> List[dict]:
+    results = []
+    for endpoint, batch_size, concurrency in grid:
+        bodies = build_bodies(rows, endpoint, batch_size, n_requests + warmup)
+        rss_reset = reset_peak_rss(server_pid)
+        run = await drive(client, endpoint, bodies, concurrency, warmup)
+
+        ok = len(run["latencies"])
+        latency = latency_summary(run["latencies"])
+        result = {
+            "mode": mode,
+            "endpoint": endpoint,
+            "batch_size": batch_size,
+            "concurrency": concurrency,
+            "requests": ok + run["errors"],
+            "errors": run["errors"],
+            "latency_ms": latency,
+            "requests_per_second": ok / run["wall_seconds"],
+            "rows_per_second": ok * batch_size / run["wall_seconds"],
+            "peak_rss_mib": peak_rss_mib(server_pid),
+            "peak_rss_reset": rss_reset,
+        }
+        results.append(result)
+        print(
+            f"[bench_api] {mode:<7} {endpoint:<15} batch={batch_size:<5} conc={concurrency:<3} "
+            f"p50={latency['p50'] or 0:8.2f}ms p99={latency['p99'] or 0:8.2f}ms "
+            f"{result['rows_per_second']:>11,.0f} rows/s  rss={result['peak_rss_mib'] or 0:.0f}MiB"
+            + (f"  errors={run['errors']}" if run["errors"] else "")
+        )
+    return results
+
+
+# ---------------------------------------------------------
+# Modos de execução
+# ---------------------------------------------------------
+
+async def run_asgi(rows: pd.DataFrame, grid, n_requests: int, warmup: int) -> List[dict]:
+    """
+    App em processo via `httpx.ASGITransport`: mede a API sem rede nem
+    servidor (cliente e app compartilham o processo e o pico de RSS).
+    """
+    import app
+
+    app.load_artifacts()
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        return await run_scenarios("asgi", client, os.getpid(), rows, grid, n_requests, warmup)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(client: httpx.AsyncClient, proc: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+        try:
+            health = (await client.get("/health")).json()
+            if health.get("ready"):
+                return
+            if health.get("state") == "failed":
+                raise RuntimeError(f"API failed to load artifacts: {health.get('load_error')}")
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"API not ready after {timeout:.0f}s")
+
+
+async def run_uvicorn(rows: pd.DataFrame, grid, n_requests: int, warmup: int, env: dict) -> List[dict]:
+    """
+    Servidor uvicorn real (um worker) em localhost, com HTTP/1.1 keep-alive.
+    """
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        max_concurrency = max(c for _, _, c in grid)
+        limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+            await _wait_ready(client, proc, timeout=180)
+            return await run_scenarios("uvicorn", client, proc.pid, rows, grid, n_requests, warmup)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def run_micro(rows: pd.DataFrame, batch_sizes: Sequence[int], repeats: int, cold_starts: int, env: dict) -> dict:
+    """
+    Micro-benchmarks sem HTTP: `load_model` (já com as bibliotecas
+    importadas), cold start completo em um processo novo (importar o app e
+    carregar os artefatos) e avaliação direta por tamanho de batch.
+    """
+    import app
+
+    load_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        app.load_model()
+        load_times.append(time.perf_counter() - start)
+
+    cold = []
+    script = "import time; t = time.perf_counter(); import app; app.load_artifacts(); print(time.perf_counter() - t)"
+    for _ in range(cold_starts):
+        out = subprocess.run(
+            [sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        cold.append(float(out.strip().splitlines()[-1]))
+
+    snapshot = app.REGISTRY.active
+    if snapshot is None:
+        app.load_artifacts()
+        snapshot = app.REGISTRY.active
+    X_all = rows.to_numpy(dtype=np.float64)
+    score = []
+    for batch_size in batch_sizes:
+        X = X_all[:batch_size]
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            app._score_matrix(X, snapshot)
+            times.append(time.perf_counter() - start)
+        p50 = float(np.median(times))
+        score.append(
+            {
+                "batch_size": batch_size,
+                "inference_engine": snapshot.inference_engine,
+                "p50_ms": p50 * 1000,
+                "rows_per_second": batch_size / p50,
+            }
+        )
+
+    return {
+        "load_model_ms": latency_summary(load_times),
+        "cold_start_seconds": cold,
+        "score": score,
+    }
+
+
+def default_scaling_threads() -> str:
+    """Potências de 2 até o número de CPUs disponíveis (inclusive)."""
+    from parallel_inference import available_cpus
+
+    cpus = available_cpus()
+    threads = [1]
+    while threads[-1] * 2 < cpus:
+        threads.append(threads[-1] * 2)
+    if cpus > 1:
+        threads.append(cpus)
+    return ",".join(map(str, threads))
+
+
+def run_scaling(
+    rows: pd.DataFrame, row_counts: Sequence[int], threads: Sequence[int], chunk_rows: int, repeats: int
+) -> List[dict]:
+    """
+    Curvas de escala da avaliação em blocos: para cada tamanho de batch e
+    número de threads, mediana do tempo de `ChunkedScorer.map_rows` sobre o
+    motor ativo, linhas/s, speedup e eficiência em relação a 1 thread.
+    """
+    import app
+    from parallel_inference import ChunkedScorer
+
+    snapshot = app.REGISTRY.active
+    if snapshot is None:
+        app.load_artifacts()
+        snapshot = app.REGISTRY.active
+    score = snapshot.engine.predict_with_proba if snapshot.engine is not None else snapshot.model.predict_proba
+    X_base = rows.to_numpy(dtype=np.float64)
+
+    results = []
+    for n_rows in row_counts:
+        X = np.resize(X_base, (n_rows, X_base.shape[1]))
+        baseline = None
+        for n_threads in threads:
+            # min_rows=1: sempre em blocos, para isolar o efeito das threads
+            scorer = ChunkedScorer(n_threads, min_rows=1, chunk_rows=chunk_rows)
+            scorer.map_rows(score, X[: min(n_rows, chunk_rows)])  # cria o pool fora da medição
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                scorer.map_rows(score, X)
+                times.append(time.perf_counter() - start)
+            scorer.shutdown()
+            p50 = float(np.median(times))
+            baseline = p50 if baseline is None else baseline
+            speedup = baseline / p50
+            results.append(
+                {
+                    "rows": n_rows,
+                    "threads": n_threads,
+                    "chunks": scorer.n_chunks(n_rows),
+                    "p50_ms": p50 * 1000,
+                    "rows_per_second": n_rows / p50,
+                    "speedup": speedup,
+                    "efficiency": speedup / n_threads,
+                }
+            )
+    return results
+
+
+# ---------------------------------------------------------
+# Comparação entre execuções
+# ---------------------------------------------------------
+
+def _scenario_key(result: dict) -> Tuple[str, str, int, int]:
+    return (result["mode"], result["endpoint"], result["batch_size"], result["concurrency"])
+
+
+def compare(before: dict, after: dict, threshold: float) -> int:
+    """
+    Compara dois arquivos de resultado cenário a cenário. Retorna 1 se algum
+    cenário piorou mais que `threshold` em p99 ou em linhas/s.
+    """
+    previous = {_scenario_key(r): r for r in before.get("scenarios", [])}
+    regressions = 0
+    print(
+        f"before: {before['meta'].get('commit')}  after: {after['meta'].get('commit')}  "
+        f"(regression threshold {threshold:.0%})"
+    )
+    print(f"{'mode':<8}{'endpoint':<16}{'batch':>6}{'conc':>5}{'p50 ms':>18}{'p99 ms':>18}{'rows/s':>24}")
+    for result in after.get("scenarios", []):
+        old = previous.get(_scenario_key(result))
+        if old is None:
+            continue
+        p50_old, p50_new = old["latency_ms"]["p50"], result["latency_ms"]["p50"]
+        p99_old, p99_new = old["latency_ms"]["p99"], result["latency_ms"]["p99"]
+        rps_old, rps_new = old["rows_per_second"], result["rows_per_second"]
+        worse = (p99_new > p99_old * (1 + threshold)) or (rps_new < rps_old * (1 - threshold))
+        regressions += worse
+        print(
+            f"{result['mode']:<8}{result['endpoint']:<16}{result['batch_size']:>6}{result['concurrency']:>5}"
+            f"{p50_old:>8.2f} -> {p50_new:<7.2f}{p99_old:>8.2f} -> {p99_new:<7.2f}"
+            f"{rps_old:>11,.0f} -> {rps_new:<10,.0f}" + ("  REGRESSION" if worse else "")
+        )
+    print(f"{regressions} regression(s)")
+    return 1 if regressions else 0
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks da API de previsão.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Executa os benchmarks e grava o JSON de resultados")
+    run.add_argument("--modes", default="asgi,uvicorn", help="asgi, uvicorn ou ambos (padrão: asgi,uvicorn)")
+    run.add_argument("--batch-sizes", default=DEFAULT_BATCH_SIZES, help=f"Tamanhos de batch (padrão: {DEFAULT_BATCH_SIZES})")
+    run.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help=f"Requisições simultâneas (padrão: {DEFAULT_CONCURRENCY})")
+    run.add_argument("--requests", type=int, default=100, help="Requisições medidas por cenário (padrão: 100)")
+    run.add_argument("--warmup", type=int, default=10, help="Requisições de aquecimento por cenário (padrão: 10)")
+    run.add_argument("--seed", type=int, default=42, help="Semente do sorteio das linhas (padrão: 42)")
+    run.add_argument("--cache", action="store_true", help="Mantém o cache de previsões ligado (padrão: desligado)")
+    run.add_argument("--no-micro", action="store_true", help="Pula os micro-benchmarks sem HTTP")
+    run.add_argument("--no-scaling", action="store_true", help="Pula as curvas de escala por número de threads")
+    run.add_argument(
+        "--scaling-rows", default=DEFAULT_SCALING_ROWS, help=f"Tamanhos de batch das curvas de escala (padrão: {DEFAULT_SCALING_ROWS})"
+    )
+    run.add_argument("--scaling-threads", help="Números de threads das curvas de escala (padrão: 1, 2, 4, ... até o nº de CPUs)")
+    run.add_argument("--scaling-repeats", type=int, default=5, help="Repetições por ponto das curvas de escala (padrão: 5)")
+    run.add_argument("--cold-starts", type=int, default=1, help="Medições de cold start em processo novo (padrão: 1)")
+    run.add_argument("--output", type=Path, help="Arquivo JSON de saída (padrão: benchmarks/results/<commit>-<data>.json)")
+
+    cmp = sub.add_parser("compare", help="Compara dois arquivos de resultados")
+    cmp.add_argument("before", type=Path)
+    cmp.add_argument("after", type=Path)
+    cmp.add_argument("--threshold", type=float, default=0.10, help="Piora relativa tolerada (padrão: 0.10)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        return compare(json.loads(args.before.read_text()), json.loads(args.after.read_text()), args.threshold)
+
+    # O app usa caminhos relativos (dados/, modelos/)
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    # Sem cache, cada requisição chega ao modelo; sem o monitor de arquivos
+    os.environ["PREDICTION_CACHE_ENABLED"] = "1" if args.cache else "0"
+    os.environ["MODEL_WATCH_INTERVAL_SECONDS"] = "0"
+    env = dict(os.environ)
+
+    batch_sizes = _parse_ints(args.batch_sizes)
+    grid = scenario_grid(batch_sizes, _parse_ints(args.concurrency))
+    rows = sample_rows(max(max(batch_sizes), 1) * 4, args.seed)
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+
+    report = {
+        "meta": _environment(),
+        "config": {
+            "modes": modes,
+            "batch_sizes": batch_sizes,
+            "concurrency": _parse_ints(args.concurrency),
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "cache": args.cache,
+            "env": {k: v for k, v in env.items() if k in _APP_ENV_VARS},
+        },
+        "micro": None,
+        "scaling": None,
+        "scenarios": [],
+    }
+
+    if not args.no_micro:
+        report["micro"] = run_micro(rows, batch_sizes, repeats=20, cold_starts=args.cold_starts, env=env)
+        for item in report["micro"]["score"]:
+            print(
+                f"[bench_api] score   batch={item['batch_size']:<5} p50={item['p50_ms']:8.3f}ms "
+                f"{item['rows_per_second']:>11,.0f} rows/s ({item['inference_engine']})"
+            )
+    if not args.no_scaling:
+        import app
+
+        report["scaling"] = run_scaling(
+            rows,
+            _parse_ints(args.scaling_rows),
+            _parse_ints(args.scaling_threads or default_scaling_threads()),
+            app.INFERENCE_CHUNK_ROWS,
+            args.scaling_repeats,
+        )
+        for item in report["scaling"]:
+            print(
+                f"[bench_api] scaling rows={item['rows']:<7} threads={item['threads']:<3} p50={item['p50_ms']:9.1f}ms "
+                f"{item['rows_per_second']:>11,.0f} rows/s speedup={item['speedup']:.2f}x "
+                f"efficiency={item['efficiency']:.0%}"
+            )
+    for mode in modes:
+        if mode == "asgi":
+            report["scenarios"] += asyncio.run(run_asgi(rows, grid, args.requests, args.warmup))
+        elif mode == "uvicorn":
+            report["scenarios"] += asyncio.run(run_uvicorn(rows, grid, args.requests, args.warmup, env))
+        else:
+            parser.error(f"modo desconhecido: {mode}")
+
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"{report['meta']['commit'] or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.write_text(json.dumps(report, indent=2))
+    print(f"[bench_api] Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""
+Construção incremental do dataset de treino (`dados/data.csv`) a partir dos
+cinco rankings `dados/Companies_ranked_by_*.csv`.
+
+Os rankings são unidos pelo `Symbol` (join vetorizado, um índice por
+arquivo), os valores em libras são convertidos para dólares e as colunas
+macro do país são anexadas a partir da `MacroFeatureStore`. Mantém-se apenas
+as empresas de países presentes na tabela macro.
+
+Transformações, reproduzindo o `data.csv` original:
+- `earnings_ttm`, `marketcap`, `revenue_ttm` e `price` (GBP) x `GBP_TO_USD`;
+- `dividend_yield_ttm` = valor do ranking de dividendos / market cap em GBP;
+- `pe_ratio_ttm` sem alteração.
+
+O estado da última execução (uma linha por `Symbol`, com o hash das entradas
+de cada linha e as features já calculadas) fica em `<saida>.state.parquet`.
+Quando chega um snapshot novo dos rankings (ou muda a tabela macro ou a
+taxa de câmbio), apenas as linhas novas ou cujas entradas mudaram são
+recalculadas; as demais vêm do estado, e as que saíram dos rankings são
+removidas.
+
+O rótulo `pc_class` não é derivável dos rankings: é mantido do estado para
+empresas já conhecidas e, para as novas, buscado por (nome, país) em
+`--labels` (padrão: `dados/data.csv`); sem rótulo, fica vazio.
+
+Uso:
+    python build_dataset.py dados/data_built.csv
+    python build_dataset.py dados/data_built.csv --rankings-dir snapshots/2024-06 --full
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_cache import read_table
+from macro_store import MACRO_FEATURES, MacroFeatureStore
+
+
+# Coluna de valor -> arquivo do ranking. A ordem define de qual arquivo vêm
+# nome, preço e país (o primeiro) e a ordem das linhas na saída.
+RANKING_FILES: Dict[str, str] = {
+    "dividend_yield_ttm": "Companies_ranked_by_Dividend_Yield.csv",
+    "earnings_ttm": "Companies_ranked_by_Earnings.csv",
+    "marketcap": "Companies_ranked_by_Market_Cap.csv",
+    "pe_ratio_ttm": "Companies_ranked_by_P_E_ratio.csv",
+    "revenue_ttm": "Companies_ranked_by_Revenue.csv",
+}
+
+# Taxa usada no `data.csv` original
+GBP_TO_USD = 1.2781
+
+# Entradas de cada linha: se alguma mudar, a linha é recalculada
+INPUT_COLUMNS = ["name", "country", "price_gbp"] + list(RANKING_FILES) + MACRO_FEATURES + ["gbp_to_usd"]
+# Entradas de texto; as demais são numéricas
+TEXT_INPUT_COLUMNS = ["name", "country"]
+
+OUTPUT_COLUMNS = [
+    "name",
+    "dividend_yield_ttm",
+    "country",
+    "earnings_ttm",
+    "marketcap",
+    "pe_ratio_ttm",
+    "revenue_ttm",
+    "price",
+] + MACRO_FEATURES + ["pc_class"]
+
+
+# ---------------------------------------------------------
+# Leitura e join
+# ---------------------------------------------------------
+
+def read_rankings(directory: Path) -> pd.DataFrame:
+    """
+    Lê os cinco rankings e os une pelo `Symbol` (apenas símbolos presentes
+    em todos). Retorna um DataFrame indexado por `Symbol` com nome, país,
+    preço em GBP e os cinco valores brutos, na ordem do primeiro ranking.
+    """
+    frames = []
+    for i, (column, filename) in enumerate(RANKING_FILES.items()):
+        usecols = ["Symbol", column] + (["Name", "price (GBP)", "country"] if i == 0 else [])
+        df = read_table(directory / filename, columns=usecols)
+        df = df.drop_duplicates(subset="Symbol", keep="first").set_index("Symbol")
+        frames.append(df)
+
+    joined = pd.concat(frames, axis=1, join="inner")
+    joined = joined.rename(columns={"Name": "name", "price (GBP)": "price_gbp"})
+    return joined[["name", "country", "price_gbp"] + list(RANKING_FILES)]
+
+
+def attach_inputs(joined: pd.DataFrame, macro: MacroFeatureStore, gbp_to_usd: float) -> pd.DataFrame:
+    """
+    Adiciona as colunas macro do país (gather vetorizado) e a taxa de câmbio;
+    descarta empresas de países fora da tabela macro e com market cap zero
+    (dividend yield indefinido).
+    """
+    keep = joined["country"].isin(macro.countries).to_numpy() & (joined["marketcap"].to_numpy() != 0)
+    inputs = joined.loc[keep].copy()
+    inputs[MACRO_FEATURES] = macro.gather(inputs["country"].tolist())
+    inputs["gbp_to_usd"] = gbp_to_usd
+    return inputs
+
+
+def row_hashes(inputs: pd.DataFrame) -> pd.Series:
+    """
+    Hash (uint64) das entradas de cada linha, indexado por `Symbol`. As
+    colunas são normalizadas antes (float64 e texto), para que uma mudança
+    do tipo inferido de uma coluna em um snapshot novo (ex.: int -> float)
+    não mude o hash das linhas cujos valores são os mesmos.
+    """
+    normalized = inputs[INPUT_COLUMNS].astype(
+        {c: (str if c in TEXT_INPUT_COLUMNS else np.float64) for c in INPUT_COLUMNS}
+    )
+    return pd.util.hash_pandas_object(normalized, index=True)
+
+
+def derive_features(inputs: pd.DataFrame) -> pd.DataFrame:
+    """Calcula as features do dataset para as linhas de `inputs` (vetorizado)."""
+    rate = inputs["gbp_to_usd"].to_numpy(dtype=np.float64)
+    out = pd.DataFrame(index=inputs.index)
+    out["name"] = inputs["name"]
+    out["dividend_yield_ttm"] = inputs["dividend_yield_ttm"].to_numpy(dtype=np.float64) / inputs[
+        "marketcap"
+    ].to_numpy(dtype=np.float64)
+    out["country"] = inputs["country"]
+    for column in ("earnings_ttm", "marketcap", "revenue_ttm"):
+        out[column] = inputs[column].to_numpy(dtype=np.float64) * rate
+    out["pe_ratio_ttm"] = inputs["pe_ratio_ttm"].to_numpy(dtype=np.float64)
+    out["price"] = inputs["price_gbp"].to_numpy(dtype=np.float64) * rate
+    out[MACRO_FEATURES] = inputs[MACRO_FEATURES]
+    return out
+
+
+# ---------------------------------------------------------
+# Estado e rótulos
+# ---------------------------------------------------------
+
+def state_path_for(output: Path) -> Path:
+    return output.with_name(f"{output.name}.state.parquet")
+
+
+def load_state(path: Path) -> Optional[pd.DataFrame]:
+    if not path.exists():
+        return None
+    state = pd.read_parquet(path)
+    return state.set_index("Symbol")
+
+
+def save_state(state: pd.DataFrame, path: Path) -> None:
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    state.reset_index().to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _label_keys(df: pd.DataFrame) -> pd.MultiIndex:
+    # Alguns nomes têm quebras de linha ("\r\n" nos rankings, "\n" no data.csv)
+    names = df["name"].astype(str).str.replace(r"\s+", " ", regex=True).str.strip()
+    return pd.MultiIndex.from_arrays([names, df["country"].astype(str)])
+
+
+def lookup_labels(rows: pd.DataFrame, labels_path: Optional[Path]) -> pd.Series:
+    """`pc_class` por (nome, país) no CSV de rótulos; vazio se não houver."""
+    if labels_path is None or not labels_path.exists() or rows.empty:
+        return pd.Series(np.nan, index=rows.index)
+    labels = read_table(labels_path, columns=["name", "country", "pc_class"])
+    keys = _label_keys(labels)
+    first = ~keys.duplicated(keep="first")
+    keys, labels = keys[first], labels.loc[first]
+    codes = keys.get_indexer(_label_keys(rows))
+    values = labels["pc_class"].to_numpy(dtype=np.float64)
+    return pd.Series(np.where(codes >= 0, values[codes], np.nan), index=rows.index)
+
+
+# ---------------------------------------------------------
+# Execução
+# ---------------------------------------------------------
+
+def build_dataset(
+    rankings_dir: Path,
+    output: Path,
+    macro: MacroFeatureStore,
+    labels_path: Optional[Path] = None,
+    gbp_to_usd: float = GBP_TO_USD,
+    full: bool = False,
+) -> dict:
+    """
+    Atualiza `output` a partir dos rankings em `rankings_dir`, recalculando
+    apenas as linhas novas ou alteradas desde a última execução (ou todas,
+    com `full=True`). Retorna um resumo da execução.
+    """
+    start = time.perf_counter()
+    joined = read_rankings(rankings_dir)
+    inputs = attach_inputs(joined, macro, gbp_to_usd)
+    hashes = row_hashes(inputs)
+
+    state_path = state_path_for(output)
+    previous = None if full else load_state(state_path)
+    if previous is not None:
+        previous_hash = previous["row_hash"].reindex(inputs.index)
+        unchanged = (previous_hash.to_numpy() == hashes.to_numpy()) & previous_hash.notna().to_numpy()
+        known = inputs.index.isin(previous.index)
+    else:
+        unchanged = np.zeros(len(inputs), dtype=bool)
+        known = np.zeros(len(inputs), dtype=bool)
+
+    # Só as linhas novas ou alteradas passam pelo cálculo
+    recompute = inputs.loc[~unchanged]
+    derived = derive_features(recompute)
+    labels = lookup_labels(derived, labels_path)
+    if previous is not None:
+        # Empresas já conhecidas mantêm o rótulo do estado
+        kept = previous["pc_class"].reindex(derived.index)
+        labels = kept.where(kept.notna(), labels)
+    derived["pc_class"] = labels
+    derived["row_hash"] = hashes.loc[~unchanged]
+
+    parts = [derived]
+    if previous is not None and unchanged.any():
+        parts.append(previous.loc[inputs.index[unchanged], derived.columns])
+    # Ordem do primeiro ranking, como no `data.csv` original
+    state = pd.concat(parts).reindex(inputs.index)
+    state.index.name = "Symbol"
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_output = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+    table = state[OUTPUT_COLUMNS].copy()
+    table["pc_class"] = table["pc_class"].astype("Int64")
+    table.to_csv(tmp_output, index=False)
+    os.replace(tmp_output, output)
+    save_state(state, state_path)
+
+    removed = 0 if previous is None else int((~previous.index.isin(inputs.index)).sum())
+    return {
+        "rows": int(len(state)),
+        "joined": int(len(joined)),
+        "skipped": int(len(joined) - len(inputs)),
+        "new": int((~known).sum()),
+        "changed": int((known & ~unchanged).sum()),
+        "unchanged": int(unchanged.sum()),
+        "removed": removed,
+        "unlabeled": int(state["pc_class"].isna().sum()),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Constrói o dataset de treino a partir dos rankings de empresas.")
+    parser.add_argument("output", type=Path, help="CSV de saída (no formato do dados/data.csv)")
+    parser.add_argument("--rankings-dir", type=Path, default=Path("dados"), help="Pasta com os Companies_ranked_by_*.csv")
+    parser.add_argument(
+        "--macro-table",
+        type=Path,
+        default=None,
+        help="CSV com country + colunas macro (padrão: valores por país do dados/data.csv)",
+    )
+    parser.add_argument(
+        "--labels",
+        type=Path,
+        default=Path("dados") / "data.csv",
+        help="CSV com name, country e pc_class para rotular empresas novas (padrão: dados/data.csv)",
+    )
+    parser.add_argument("--gbp-usd", type=float, default=GBP_TO_USD, help=f"Taxa GBP -> USD (padrão: {GBP_TO_USD})")
+    parser.add_argument("--full", action="store_true", help="Ignora o estado anterior e recalcula todas as linhas")
+    args = parser.parse_args(argv)
+
+    if args.macro_table is not None:
+        macro = MacroFeatureStore.from_csv(args.macro_table)
+    else:
+        macro = MacroFeatureStore.from_dataframe(read_table(Path("dados") / "data.csv"), source="dados/data.csv")
+
+    summary = build_dataset(args.rankings_dir, args.output, macro, args.labels, args.gbp_usd, args.full)
+    print(
+        f"[build_dataset] {summary['rows']:,} rows written to {args.output} in {summary['seconds']:.2f}s "
+        f"(new {summary['new']:,}, changed {summary['changed']:,}, unchanged {summary['unchanged']:,}, "
+        f"removed {summary['removed']:,}; {summary['skipped']:,} skipped (country outside the macro table or zero market cap), "
+        f"{summary['unlabeled']:,} without pc_class)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+Pontuação em massa (fora da API) de arquivos CSV ou Parquet.
+
+Lê o arquivo de entrada em blocos, distribui os blocos para um pool de
+processos (cada worker carrega o modelo uma única vez, via `load_model` do
+`app.py`) e grava classe e probabilidades em CSV ou Parquet, na mesma ordem
+da entrada. O número de blocos em processamento é limitado, então a memória
+não depende do tamanho do arquivo.
+
+Uso:
+    python bulk_score.py entrada.csv saida.csv
+    python bulk_score.py entrada.parquet saida.parquet --workers 8 --chunk-rows 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app import FEATURE_ORDER, build_inference_engine, load_example_data, load_model
+from forest_engine import overflow_mask
+from parallel_inference import limit_native_threads
+
+
+POTENTIAL_LABELS = np.array(["Low", "Medium", "High"])
+
+# Colunas de identificação copiadas para a saída quando presentes na entrada
+DEFAULT_KEEP_COLUMNS = ["name", "country"]
+
+
+# ---------------------------------------------------------
+# Worker
+# ---------------------------------------------------------
+
+_WORKER_MODEL = None
+
+
+def _init_worker(use_engine: bool) -> None:
+    """
+    Carrega o modelo uma vez por processo worker e, se o processo principal
+    já verificou o motor compilado contra o scikit-learn (`use_engine`),
+    apenas o compila.
+    """
+    global _WORKER_MODEL
+
+    # Um thread BLAS/OpenMP por worker: o paralelismo vem do pool de
+    # processos. As bibliotecas já estão carregadas aqui, então o limite é
+    # aplicado em tempo de execução (threadpoolctl), não por variável de ambiente.
+    limit_native_threads(1)
+
+    model = load_model()
+    if model is None:
+        raise RuntimeError("Could not load model")
+    engine = build_inference_engine(model, None) if use_engine else None
+    if engine is not None:
+        _WORKER_MODEL = engine
+    else:
+        if hasattr(model, "n_jobs"):
+            model.n_jobs = 1
+        _WORKER_MODEL = model
+
+
+def _engine_verified() -> bool:
+    """
+    Confere uma única vez, no processo principal, se o motor compilado
+    reproduz o scikit-learn (a mesma verificação feita pela API).
+    """
+    model = load_model()
+    if model is None:
+        raise RuntimeError("Could not load model")
+    return build_inference_engine(model, load_example_data()) is not None
+
+
+def _score_chunk(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    if hasattr(_WORKER_MODEL, "predict_with_proba"):
+        return _WORKER_MODEL.predict_with_proba(X)
+    return _WORKER_MODEL.predict(X), _WORKER_MODEL.predict_proba(X)
+
+
+# ---------------------------------------------------------
+# Leitura e escrita em blocos
+# ---------------------------------------------------------
+
+def _is_parquet(path: Path) -> bool:
+    return path.suffix.lower() in (".parquet", ".pq")
+
+
+def iter_input_chunks(path: Path, chunk_rows: int, columns: List[str]) -> Iterator[pd.DataFrame]:
+    """
+    Itera sobre o arquivo de entrada em DataFrames de até `chunk_rows`
+    linhas, lendo apenas as colunas necessárias.
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        available = set(parquet.schema_arrow.names)
+        selected = [c for c in columns if c in available]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=selected):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=lambda c: c in columns)
+
+
+def _input_columns(path: Path) -> List[str]:
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+class ResultWriter:
+    """Grava os blocos de resultado em CSV ou Parquet, de forma incremental."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._parquet_writer = None
+        self._wrote_header = False
+
+    def write(self, df: pd.DataFrame) -> None:
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode="a" if self._wrote_header else "w", header=not self._wrote_header, index=False)
+            self._wrote_header = True
+
+    def close(self) -> None:
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def _build_output(keep: pd.DataFrame, preds: np.ndarray, probas: np.ndarray) -> pd.DataFrame:
+    out = keep.reset_index(drop=True).copy()
+    out["predicted_class"] = preds.astype(np.int64)
+    out["predicted_potential"] = POTENTIAL_LABELS[preds.astype(np.int64)]
+    out["confidence"] = probas[np.arange(len(preds)), preds.astype(np.int64)]
+    out["prob_low"] = probas[:, 0]
+    out["prob_medium"] = probas[:, 1]
+    out["prob_high"] = probas[:, 2]
+    return out
+
+
+# ---------------------------------------------------------
+# Execução
+# ---------------------------------------------------------
+
+def score_file(
+    input_path: Path,
+    output_path: Path,
+    workers: int,
+    chunk_rows: int,
+    keep_columns: Optional[List[str]] = None,
+    max_pending: Optional[int] = None,
+) -> dict:
+    """
+    Pontua `input_path` e grava o resultado em `output_path`.
+    Retorna um resumo com número de linhas, tempo e linhas por segundo.
+    """
+    available = _input_columns(input_path)
+    missing = [c for c in FEATURE_ORDER if c not in available]
+    if missing:
+        raise ValueError(f"Missing feature columns in {input_path}: {missing}")
+
+    keep = [c for c in (keep_columns if keep_columns is not None else DEFAULT_KEEP_COLUMNS) if c in available]
+    columns = keep + FEATURE_ORDER
+    max_pending = max_pending or 2 * workers
+
+    writer = ResultWriter(output_path)
+    pending: deque = deque()
+    n_rows = 0
+    n_read = 0
+    start = time.perf_counter()
+
+    def drain_one() -> None:
+        nonlocal n_rows
+        keep_df, future = pending.popleft()
+        preds, probas = future.result()
+        writer.write(_build_output(keep_df, preds, probas))
+        n_rows += len(preds)
+        elapsed = time.perf_counter() - start
+        print(f"\r[bulk_score] {n_rows:,} rows, {n_rows / elapsed:,.0f} rows/s", end="", file=sys.stderr)
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(_engine_verified(),)
+        ) as pool:
+            for chunk in iter_input_chunks(input_path, chunk_rows, columns):
+                X = chunk[FEATURE_ORDER].to_numpy(dtype=np.float64)
+                # Células vazias viram NaN e são avaliadas como valor ausente,
+                # como no scikit-learn; ±inf é recusado pelos dois motores
+                invalid = np.flatnonzero(overflow_mask(X).any(axis=1))
+                if invalid.size:
+                    rows = (invalid[:10] + n_read).tolist()
+                    raise ValueError(
+                        f"{invalid.size} row(s) with infinite feature values in {input_path} "
+                        f"(0-based data rows, first ones: {rows})"
+                    )
+                n_read += len(X)
+                pending.append((chunk[keep], pool.submit(_score_chunk, X)))
+                # Limita os blocos em voo: memória constante
+                while len(pending) >= max_pending:
+                    drain_one()
+            while pending:
+                drain_one()
+    finally:
+        writer.close()
+        print(file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows": n_rows,
+        "seconds": elapsed,
+        "rows_per_second": n_rows / elapsed if elapsed > 0 else 0.0,
+        "workers": workers,
+        "chunk_rows": chunk_rows,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pontuação em massa de CSV/Parquet com o modelo Random Forest.")
+    parser.add_argument("input", type=Path, help="Arquivo de entrada (.csv ou .parquet)")
+    parser.add_argument("output", type=Path, help="Arquivo de saída (.csv ou .parquet)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Número de processos (padrão: nº de CPUs)")
+    parser.add_argument("--chunk-rows", type=int, default=20000, help="Linhas por bloco (padrão: 20000)")
+    parser.add_argument(
+        "--keep",
+        default=",".join(DEFAULT_KEEP_COLUMNS),
+        help="Colunas da entrada copiadas para a saída, separadas por vírgula (padrão: name,country)",
+    )
+    args = parser.parse_args(argv)
+
+    keep = [c.strip() for c in args.keep.split(",") if c.strip()]
+    summary = score_file(args.input, args.output, args.workers, args.chunk_rows, keep)
+    print(
+        f"[bulk_score] Scored {summary['rows']:,} rows in {summary['seconds']:.2f}s "
+        f"({summary['rows_per_second']:,.0f} rows/s, {summary['workers']} workers)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
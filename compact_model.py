@@ -0,0 +1,363 @@
+"""
+Formato compacto do modelo: um único arquivo `.npz` com o scaler, a ordem
+das features e as árvores da floresta.
+
+Comparado ao joblib do scikit-learn, o artefato guarda apenas o necessário
+para a inferência, em tipos pequenos:
+- feature de cada nó em `uint8` e limiar em `float32`, arredondado para
+  baixo (`x <= float32_para_baixo(t)` equivale a `x <= t` para qualquer `x`
+  float32, que é o que o scikit-learn compara), então a travessia das
+  árvores é idêntica à do modelo original;
+- só o filho direito de cada nó (`uint16`, índice local da árvore): os nós
+  estão em ordem de profundidade, e o filho esquerdo é sempre o nó seguinte;
+- distribuição de classes apenas das folhas, quantizada em `uint8` (ou
+  `uint16`) com soma exata por folha. É a única aproximação do formato; o
+  efeito nas previsões é medido por `python compact_model.py report`.
+
+Na carga, os arrays são expandidos para um `CompiledForest` e o scaler é
+aplicado antes da travessia, então treino e API usam sempre o mesmo
+pré-processamento. O arquivo não contém pickle.
+
+Uso:
+    python compact_model.py export modelos/Random_Forest_model.joblib modelos/Random_Forest_model.npz
+    python compact_model.py report modelos/Random_Forest_model.joblib modelos/Random_Forest_model.npz
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from forest_engine import CompiledForest
+
+
+# Identificador do formato salvo por `save_compact_model`
+COMPACT_FORMAT = "compact_forest/1"
+
+COMPACT_SUFFIX = ".npz"
+
+# Bits por probabilidade de classe nas folhas (8 ou 16)
+DEFAULT_LEAF_BITS = 8
+
+
+def is_compact_artifact(path: Union[str, Path]) -> bool:
+    return Path(path).suffix.lower() == COMPACT_SUFFIX
+
+
+def round_down_float32(values: np.ndarray) -> np.ndarray:
+    """Maior float32 <= cada valor (limiares das árvores)."""
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def quantize_distributions(values: np.ndarray, bits: int = DEFAULT_LEAF_BITS) -> np.ndarray:
+    """
+    Quantiza distribuições de classes (linhas somando 1) em inteiros que
+    somam exatamente `2**bits - 1` por linha (método do maior resto).
+    """
+    levels = (1 << bits) - 1
+    dtype = np.uint8 if bits <= 8 else np.uint16
+    totals = values.sum(axis=1, keepdims=True)
+    scaled = values / np.where(totals > 0, totals, 1.0) * levels
+    quantized = np.floor(scaled).astype(np.int64)
+    remainder = scaled - quantized
+    missing = levels - quantized.sum(axis=1)
+    # Distribui as unidades que faltam para as classes com maior resto
+    order = np.argsort(-remainder, axis=1, kind="stable")
+    rank = np.argsort(order, axis=1, kind="stable")
+    quantized += rank < missing[:, None]
+    return quantized.astype(dtype)
+
+
+class CompactForestModel:
+    """
+    Modelo carregado do formato compacto: scaler + floresta compilada.
+    Expõe a mesma interface de inferência do `CompiledForest`.
+    """
+
+    def __init__(
+        self,
+        forest: CompiledForest,
+        feature_names: Sequence[str],
+        scaler_mean: Optional[np.ndarray] = None,
+        scaler_scale: Optional[np.ndarray] = None,
+        meta: Optional[dict] = None,
+    ) -> None:
+        self.forest = forest
+        self.feature_names_in_ = np.asarray(list(feature_names), dtype=object)
+        self.scaler_mean = scaler_mean
+        self.scaler_scale = scaler_scale
+        self.meta = dict(meta or {})
+        self.model_type = forest.model_type
+        self.version = self.fingerprint()
+
+    @property
+    def classes_(self) -> np.ndarray:
+        return self.forest.classes_
+
+    @property
+    def n_features_in_(self) -> int:
+        return self.forest.n_features_in_
+
+    def fingerprint(self) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.forest.fingerprint().encode())
+        h.update(json.dumps(list(self.feature_names_in_)).encode())
+        for array in (self.scaler_mean, self.scaler_scale):
+            if array is not None:
+                h.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        return h.hexdigest()[:12]
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """Aplica o scaler do treino (mesmas operações do `StandardScaler`)."""
+        X = np.asarray(X, dtype=np.float64)
+        if self.scaler_mean is None:
+            return X
+        X = X - self.scaler_mean
+        X /= self.scaler_scale
+        return X
+
+    def predict_with_proba(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self.forest.predict_with_proba(self.transform(X))
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.predict_with_proba(X)[1]
+
+    def get_params(self, deep: bool = True) -> dict:
+        return self.forest.get_params()
+
+
+# ---------------------------------------------------------
+# Gravação e leitura
+# ---------------------------------------------------------
+
+def save_compact_model(
+    model,
+    path: Union[str, Path],
+    scaler=None,
+    feature_names: Optional[Sequence[str]] = None,
+    leaf_bits: int = DEFAULT_LEAF_BITS,
+) -> dict:
+    """
+    Grava `model` (RandomForestClassifier ou ensemble de árvores de
+    classificação) no formato compacto, com o `StandardScaler` ajustado no
+    treino, se houver. Escrita atômica. Retorna os metadados gravados.
+    """
+    if leaf_bits not in (8, 16):
+        raise ValueError("leaf_bits deve ser 8 ou 16.")
+    if feature_names is None:
+        feature_names = getattr(model, "feature_names_in_", None)
+    if feature_names is None:
+        raise ValueError("Informe feature_names: o modelo não guarda os nomes das features.")
+    feature_names = [str(name) for name in feature_names]
+    if len(feature_names) != model.n_features_in_:
+        raise ValueError(f"{len(feature_names)} nomes de features para um modelo com {model.n_features_in_}.")
+    if model.n_features_in_ > 256:
+        raise ValueError("O formato compacto suporta até 256 features.")
+
+    n_classes = int(model.n_classes_)
+    node_counts, features, thresholds, rights, missing, leaf_values = [], [], [], [], [], []
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        if n > np.iinfo(np.uint16).max:
+            raise ValueError(f"Árvore com {n} nós: o formato compacto suporta até 65535 por árvore.")
+        is_leaf = tree.children_left == -1
+        internal = np.flatnonzero(~is_leaf)
+        if not np.array_equal(tree.children_left[internal], internal + 1):
+            raise ValueError("Árvore fora da ordem de profundidade (filho esquerdo != nó seguinte).")
+
+        node_counts.append(n)
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.uint8))
+        thresholds.append(round_down_float32(np.where(is_leaf, np.inf, tree.threshold)))
+        # 0 marca folha (a raiz nunca é filho de outro nó)
+        rights.append(np.where(is_leaf, 0, tree.children_right).astype(np.uint16))
+        if hasattr(tree, "missing_go_to_left"):
+            missing.append(np.asarray(tree.missing_go_to_left, dtype=bool))
+        else:
+            missing.append(np.zeros(n, dtype=bool))
+        leaf_values.append(np.asarray(tree.value[is_leaf, 0, :n_classes], dtype=np.float64))
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    params = model.get_params() if hasattr(model, "get_params") else {}
+    meta = {
+        "format": COMPACT_FORMAT,
+        "model_type": model.__class__.__name__,
+        "feature_names": feature_names,
+        "n_features": int(model.n_features_in_),
+        "max_depth": max_depth,
+        "leaf_bits": leaf_bits,
+        "params": json.loads(json.dumps(params, default=repr)),
+    }
+    arrays = {
+        "node_counts": np.asarray(node_counts, dtype=np.uint32),
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "right": np.concatenate(rights),
+        "missing_left": np.packbits(np.concatenate(missing)),
+        "leaf_value": quantize_distributions(np.concatenate(leaf_values), leaf_bits),
+        "classes": np.asarray(model.classes_),
+        "meta": np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+    }
+    if scaler is not None:
+        arrays["scaler_mean"] = np.asarray(scaler.mean_, dtype=np.float64)
+        arrays["scaler_scale"] = np.asarray(scaler.scale_, dtype=np.float64)
+
+    path = Path(path)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(buffer.getvalue())
+    os.replace(tmp_path, path)
+    return meta
+
+
+def load_compact_model(path: Union[str, Path]) -> CompactForestModel:
+    """Lê um artefato gravado por `save_compact_model`."""
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    meta = json.loads(arrays["meta"].tobytes().decode())
+    if meta.get("format") != COMPACT_FORMAT:
+        raise ValueError(f"{path} não é um artefato {COMPACT_FORMAT}.")
+
+    node_counts = arrays["node_counts"].astype(np.intp)
+    n_nodes = int(node_counts.sum())
+    offsets = np.concatenate(([0], np.cumsum(node_counts)[:-1]))
+    tree_offset = np.repeat(offsets, node_counts)
+    node = np.arange(n_nodes, dtype=np.intp)
+    right = arrays["right"].astype(np.intp)
+    is_leaf = right == 0
+
+    # Folhas apontam para si mesmas, como no `CompiledForest.from_sklearn`
+    children = np.empty(2 * n_nodes, dtype=np.intp)
+    children[0::2] = np.where(is_leaf, node, node + 1)
+    children[1::2] = np.where(is_leaf, node, right + tree_offset)
+
+    levels = (1 << int(meta["leaf_bits"])) - 1
+    value = np.zeros((n_nodes, len(arrays["classes"])), dtype=np.float64)
+    value[is_leaf] = arrays["leaf_value"].astype(np.float64) / levels
+
+    forest = CompiledForest(
+        feature=arrays["feature"].astype(np.intp),
+        threshold=arrays["threshold"].astype(np.float64),
+        children=children,
+        missing_left=np.unpackbits(arrays["missing_left"], count=n_nodes).astype(bool),
+        value=value,
+        roots=offsets.astype(np.intp),
+        max_depth=meta["max_depth"],
+        classes=arrays["classes"],
+        n_features=meta["n_features"],
+        params=meta["params"],
+        model_type=meta["model_type"],
+    )
+    model = CompactForestModel(
+        forest,
+        meta["feature_names"],
+        arrays.get("scaler_mean"),
+        arrays.get("scaler_scale"),
+        meta,
+    )
+    forest.version = model.version
+    return model
+
+
+# ---------------------------------------------------------
+# Linha de comando: exportação e relatório
+# ---------------------------------------------------------
+
+def compare_with_joblib(joblib_path: Path, compact_path: Path, data_path: Path, repeat: int = 5) -> dict:
+    """
+    Compara o artefato compacto com o joblib de origem: tamanho em disco,
+    tempo de carga (mediana de `repeat` cargas) e previsões em `data_path`.
+    """
+    import joblib
+
+    from data_cache import read_table
+
+    def timed_load(load) -> Tuple[object, float]:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            model = load()
+            times.append(time.perf_counter() - start)
+        return model, float(np.median(times))
+
+    original, joblib_seconds = timed_load(lambda: joblib.load(joblib_path))
+    compact, compact_seconds = timed_load(lambda: load_compact_model(compact_path))
+
+    df = read_table(data_path)
+    X = df[list(compact.feature_names_in_)]
+    expected_pred = original.predict(X)
+    expected_proba = original.predict_proba(X)
+    preds, probas = compact.predict_with_proba(X.to_numpy(dtype=np.float64))
+
+    summary = {
+        "rows": int(len(df)),
+        "joblib_bytes": joblib_path.stat().st_size,
+        "compact_bytes": compact_path.stat().st_size,
+        "joblib_load_ms": joblib_seconds * 1000,
+        "compact_load_ms": compact_seconds * 1000,
+        "prediction_agreement": float(np.mean(preds == expected_pred)),
+        "max_abs_proba_diff": float(np.max(np.abs(probas - expected_proba))),
+    }
+    if "pc_class" in df.columns:
+        y = df["pc_class"].to_numpy()
+        summary["joblib_accuracy"] = float(np.mean(expected_pred == y))
+        summary["compact_accuracy"] = float(np.mean(preds == y))
+        summary["accuracy_delta"] = summary["compact_accuracy"] - summary["joblib_accuracy"]
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Exporta e compara o formato compacto do modelo.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="Converte um joblib do scikit-learn para o formato compacto")
+    export.add_argument("source", type=Path, help="Modelo .joblib (RandomForestClassifier)")
+    export.add_argument("output", type=Path, help="Artefato de saída (.npz)")
+    export.add_argument("--scaler", type=Path, help="StandardScaler ajustado no treino (.joblib), se houver")
+    export.add_argument("--leaf-bits", type=int, choices=(8, 16), default=DEFAULT_LEAF_BITS)
+
+    report = sub.add_parser("report", help="Compara tamanho, tempo de carga e previsões com o joblib")
+    report.add_argument("source", type=Path, help="Modelo .joblib de origem")
+    report.add_argument("compact", type=Path, help="Artefato compacto (.npz)")
+    report.add_argument("--data", type=Path, default=Path("dados") / "data.csv")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        import joblib
+
+        model = joblib.load(args.source)
+        scaler = joblib.load(args.scaler) if args.scaler else None
+        save_compact_model(model, args.output, scaler=scaler, leaf_bits=args.leaf_bits)
+        print(
+            f"[compact_model] Wrote {args.output} ({args.output.stat().st_size:,} bytes, "
+            f"source {args.source.stat().st_size:,} bytes)"
+        )
+        return 0
+
+    summary = compare_with_joblib(args.source, args.compact, args.data)
+    for key, value in summary.items():
+        print(f"{key:<24}{value:,.6g}" if isinstance(value, float) else f"{key:<24}{value:,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
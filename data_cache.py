@@ -0,0 +1,236 @@
+"""
+Cache colunar tipado dos CSVs de `dados/`.
+
+Na primeira leitura, cada CSV é convertido uma única vez em um Parquet em
+`<pasta do CSV>/.cache/<nome>.parquet`, com os tipos já inferidos. Leituras
+seguintes abrem o Parquet (sem parsing de texto nem inferência de tipos) e
+podem projetar só as colunas pedidas. O cache guarda a assinatura (mtime,
+tamanho) do CSV de origem e é refeito quando o CSV muda.
+
+Por padrão, `read_table` devolve exatamente os mesmos valores e tipos de
+`pd.read_csv`. Com `compact=True`, aplica os tipos compactos calculados na
+criação do cache, que usam menos memória sem perder informação:
+- float64 -> float32 quando todos os valores voltam exatamente do float32
+  pela representação decimal (ex.: 2.6, 4.875, 76.0);
+- inteiros -> o menor tipo inteiro que comporta os valores;
+- textos com poucos valores distintos (ex.: `country`) -> category.
+
+Uso:
+    python data_cache.py build            # converte todos os dados/*.csv
+    python data_cache.py bench            # tempo de carga e memória: CSV x cache
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_FORMAT = "data_cache/1"
+CACHE_DIR_NAME = ".cache"
+METADATA_KEY = b"data_cache"
+
+# Textos com até esta fração de valores distintos viram category
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def cache_path(source: Union[str, Path]) -> Path:
+    source = Path(source)
+    return source.parent / CACHE_DIR_NAME / f"{source.stem}.parquet"
+
+
+def _signature(path: Path) -> Tuple[int, int]:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+# ---------------------------------------------------------
+# Tipos compactos
+# ---------------------------------------------------------
+
+def _float32_safe(values: np.ndarray) -> bool:
+    """Todos os valores voltam exatamente do float32 pela forma decimal."""
+    as32 = values.astype(np.float32)
+    return bool(np.array_equal(as32.astype(str).astype(np.float64), values, equal_nan=True))
+
+
+def compact_dtypes(df: pd.DataFrame) -> Dict[str, str]:
+    """
+    Tipo compacto de cada coluna que pode ser reduzida sem perder
+    informação (colunas ausentes ficam como estão).
+    """
+    plan: Dict[str, str] = {}
+    for column in df.columns:
+        series = df[column]
+        if series.dtype == np.float64:
+            if _float32_safe(series.to_numpy()):
+                plan[column] = "float32"
+        elif series.dtype == np.int64:
+            downcast = pd.to_numeric(series, downcast="integer")
+            if downcast.dtype != series.dtype:
+                plan[column] = str(downcast.dtype)
+        elif pd.api.types.is_string_dtype(series.dtype):
+            if len(series) and series.nunique(dropna=True) <= CATEGORY_MAX_UNIQUE_RATIO * len(series):
+                plan[column] = "category"
+    return plan
+
+
+# ---------------------------------------------------------
+# Leitura com cache
+# ---------------------------------------------------------
+
+def _read_metadata(path: Path) -> Optional[dict]:
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_schema(path).metadata or {}
+    raw = metadata.get(METADATA_KEY)
+    return json.loads(raw) if raw else None
+
+
+def build_cache(source: Union[str, Path]) -> Path:
+    """Converte `source` para Parquet (escrita atômica)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    source = Path(source)
+    signature = _signature(source)
+    df = pd.read_csv(source)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = {
+        "format": CACHE_FORMAT,
+        "source": source.name,
+        "source_signature": list(signature),
+        "compact_dtypes": compact_dtypes(df),
+    }
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: json.dumps(meta)})
+
+    target = cache_path(source)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, target)
+    return target
+
+
+def read_table(
+    source: Union[str, Path],
+    columns: Optional[Sequence[str]] = None,
+    compact: bool = False,
+    enabled: bool = True,
+) -> pd.DataFrame:
+    """
+    Lê um CSV pelo cache colunar, criando ou refazendo o cache quando ele
+    não existir ou for mais antigo que o CSV. `columns` projeta apenas as
+    colunas pedidas (na ordem pedida). Sem pyarrow, ou com `enabled=False`,
+    lê o CSV diretamente.
+    """
+    source = Path(source)
+    if not enabled:
+        return _read_csv(source, columns)
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return _read_csv(source, columns)
+
+    target = cache_path(source)
+    meta = None
+    try:
+        if target.exists():
+            meta = _read_metadata(target)
+            if meta is None or meta.get("format") != CACHE_FORMAT or tuple(meta["source_signature"]) != _signature(source):
+                meta = None
+        if meta is None:
+            print(f"[data_cache] Building columnar cache for {source}")
+            build_cache(source)
+            meta = _read_metadata(target)
+
+        plan = meta["compact_dtypes"] if compact else {}
+        wanted = list(columns) if columns is not None else None
+        # Colunas category saem do Parquet já como dicionário (sem passar por texto)
+        dictionary = [c for c, dtype in plan.items() if dtype == "category" and (wanted is None or c in wanted)]
+        table = pq.read_table(target, columns=wanted, read_dictionary=dictionary or None)
+    except (OSError, ValueError, KeyError) as e:
+        # Cache ilegível ou pasta sem permissão de escrita: segue com o CSV
+        print(f"[data_cache] Cache unavailable for {source} ({e}), reading CSV")
+        return _read_csv(source, columns)
+
+    df = table.to_pandas()
+    casts = {c: dtype for c, dtype in plan.items() if dtype != "category" and c in df.columns}
+    return df.astype(casts) if casts else df
+
+
+def _read_csv(source: Path, columns: Optional[Sequence[str]]) -> pd.DataFrame:
+    if columns is None:
+        return pd.read_csv(source)
+    return pd.read_csv(source, usecols=list(columns))[list(columns)]
+
+
+# ---------------------------------------------------------
+# Linha de comando
+# ---------------------------------------------------------
+
+def _median_seconds(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def _memory_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def benchmark(sources: List[Path], repeat: int = 5) -> List[dict]:
+    """Tempo de carga (mediana) e memória: CSV x cache exato x cache compacto."""
+    rows = []
+    for source in sources:
+        read_table(source)  # garante o cache
+        csv_df = pd.read_csv(source)
+        compact_df = read_table(source, compact=True)
+        two_columns = list(csv_df.columns[:2])
+        rows.append({
+            "file": source.name,
+            "csv_mb": source.stat().st_size / 1e6,
+            "parquet_mb": cache_path(source).stat().st_size / 1e6,
+            "csv_ms": _median_seconds(lambda: pd.read_csv(source), repeat) * 1000,
+            "cache_ms": _median_seconds(lambda: read_table(source), repeat) * 1000,
+            "cache_compact_ms": _median_seconds(lambda: read_table(source, compact=True), repeat) * 1000,
+            "cache_2_columns_ms": _median_seconds(lambda: read_table(source, two_columns, compact=True), repeat) * 1000,
+            "memory_csv_mb": _memory_mb(csv_df),
+            "memory_compact_mb": _memory_mb(compact_df),
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cache colunar tipado dos CSVs de dados/.")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("--data-dir", type=Path, default=Path("dados"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    sources = sorted(args.data_dir.glob("*.csv"))
+    if args.command == "build":
+        for source in sources:
+            target = build_cache(source)
+            print(f"[data_cache] {source} -> {target} ({target.stat().st_size:,} bytes)")
+        return 0
+
+    results = pd.DataFrame(benchmark(sources, args.repeat))
+    print(results.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
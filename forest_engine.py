@@ -0,0 +1,319 @@
+"""
+Motor de inferência compilado para o Random Forest do projeto.
+
+A floresta do scikit-learn é achatada uma única vez (na inicialização) em
+arrays NumPy contíguos com todos os nós de todas as árvores. A travessia é
+vetorizada: um batch inteiro desce todas as árvores ao mesmo tempo, nível a
+nível, e a classe e as probabilidades saem juntas de uma única passada.
+
+O resultado é bit a bit idêntico ao `predict` / `predict_proba` do
+scikit-learn (mesma conversão para float32, mesmas comparações em float64 e
+mesma ordem de acumulação das árvores) — ver `verify_against_sklearn`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import joblib
+import numpy as np
+
+
+# Número de linhas processadas por vez na travessia (limita a memória do
+# array intermediário de shape (linhas, árvores, classes))
+DEFAULT_CHUNK_ROWS = 1024
+
+# Abaixo deste número de linhas a soma das árvores é feita de uma vez com
+# `cumsum` (menos overhead por chamada); acima, árvore a árvore.
+SMALL_BATCH_ROWS = 32
+
+# Identificador do formato salvo por `CompiledForest.save`
+ARTIFACT_FORMAT = "compiled_forest/1"
+
+# Menor valor absoluto (float64) que vira ±inf na conversão para float32 (o
+# máximo de float32 mais meio ulp). O scikit-learn recusa a entrada com esses
+# valores (e com ±inf) em vez de avaliá-la.
+FLOAT32_OVERFLOW = 2.0 ** 128 - 2.0 ** 103
+
+_ARRAY_FIELDS = ("feature", "threshold", "children", "missing_left", "value", "roots", "classes_")
+
+
+class CompiledForest:
+    """
+    Floresta de decisão representada por arrays planos de nós.
+
+    Os nós de todas as árvores são concatenados; `roots` guarda o índice
+    global da raiz de cada árvore. Folhas apontam para si mesmas, de modo que
+    `max_depth` iterações levam qualquer linha até a sua folha.
+    """
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children: np.ndarray,
+        missing_left: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        classes: np.ndarray,
+        n_features: int,
+        params: Optional[dict] = None,
+        model_type: str = "RandomForestClassifier",
+        version: Optional[str] = None,
+    ) -> None:
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+        self.params = dict(params or {})
+        self.model_type = model_type
+        # Versão do modelo de origem (quando conhecida)
+        self.version = version
+
+    @property
+    def n_trees(self) -> int:
+        return int(self.roots.shape[0])
+
+    @property
+    def n_nodes(self) -> int:
+        return int(self.feature.shape[0])
+
+    @classmethod
+    def from_sklearn(cls, model) -> "CompiledForest":
+        """
+        Achata um `RandomForestClassifier` (ou qualquer ensemble de
+        `DecisionTreeClassifier` com uma única saída) em arrays contíguos.
+        """
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Apenas modelos com uma única saída são suportados.")
+
+        n_classes = int(model.n_classes_)
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            local = np.arange(n, dtype=np.intp)
+
+            # Folhas: apontam para si mesmas e comparam contra +inf
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+            lefts.append(np.where(is_leaf, local, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, local, tree.children_right) + offset)
+            if hasattr(tree, "missing_go_to_left"):
+                missing.append(np.asarray(tree.missing_go_to_left, dtype=bool))
+            else:
+                missing.append(np.zeros(n, dtype=bool))
+            values.append(np.asarray(tree.value[:, 0, :n_classes], dtype=np.float64))
+            roots.append(offset)
+
+            offset += n
+            max_depth = max(max_depth, int(tree.max_depth))
+
+        # children[2 * nó] = filho esquerdo, children[2 * nó + 1] = filho direito
+        children = np.empty(2 * offset, dtype=np.intp)
+        children[0::2] = np.concatenate(lefts)
+        children[1::2] = np.concatenate(rights)
+
+        params = model.get_params() if hasattr(model, "get_params") else {}
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            children=children,
+            missing_left=np.ascontiguousarray(np.concatenate(missing)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=np.asarray(model.classes_),
+            n_features=int(model.n_features_in_),
+            params=params,
+            model_type=model.__class__.__name__,
+        )
+
+    def fingerprint(self) -> str:
+        """
+        Hash estável do conteúdo da floresta (estrutura, limiares e valores),
+        independente do formato em que ela foi carregada.
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for name in _ARRAY_FIELDS:
+            array = np.ascontiguousarray(getattr(self, name))
+            h.update(name.encode())
+            h.update(str(array.dtype).encode())
+            h.update(array.tobytes())
+        return h.hexdigest()[:12]
+
+    # -----------------------------------------------------
+    # Persistência (compatível com memory-mapping)
+    # -----------------------------------------------------
+
+    def save(self, path: Union[str, Path]) -> None:
+        """
+        Salva os arrays da floresta sem compressão, para que `load` possa
+        abri-los com `mmap_mode`. A escrita é atômica (arquivo temporário +
+        rename), então processos concorrentes nunca leem um arquivo parcial.
+        """
+        path = Path(path)
+        payload = {
+            "format": ARTIFACT_FORMAT,
+            "arrays": {name: np.ascontiguousarray(getattr(self, name)) for name in _ARRAY_FIELDS},
+            "meta": {
+                "max_depth": self.max_depth,
+                "n_features": self.n_features_in_,
+                "params": self.params,
+                "model_type": self.model_type,
+                "version": self.version,
+            },
+        }
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        joblib.dump(payload, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap_mode: Optional[str] = "r") -> "CompiledForest":
+        """
+        Carrega uma floresta salva por `save`. Com `mmap_mode="r"` os arrays
+        ficam mapeados do arquivo: processos que abrem o mesmo arquivo
+        compartilham as mesmas páginas físicas (page cache).
+        """
+        payload = joblib.load(path, mmap_mode=mmap_mode)
+        if not isinstance(payload, dict) or payload.get("format") != ARTIFACT_FORMAT:
+            raise ValueError(f"{path} não é um artefato {ARTIFACT_FORMAT}.")
+
+        arrays, meta = payload["arrays"], payload["meta"]
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            children=arrays["children"],
+            missing_left=arrays["missing_left"],
+            value=arrays["value"],
+            roots=arrays["roots"],
+            max_depth=meta["max_depth"],
+            classes=arrays["classes_"],
+            n_features=meta["n_features"],
+            params=meta["params"],
+            model_type=meta["model_type"],
+            version=meta["version"],
+        )
+
+    # -----------------------------------------------------
+    # Inferência
+    # -----------------------------------------------------
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """
+        Retorna o índice global da folha alcançada por cada linha em cada
+        árvore, com shape (n_linhas, n_árvores).
+        """
+        # Mesmo dtype usado pelo scikit-learn na predição (DTYPE = float32);
+        # a comparação com os limiares é feita em float64, como no Cython.
+        with np.errstate(over="ignore"):
+            X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"Esperado array com shape (n, {self.n_features_in_}), recebido {X.shape}."
+            )
+        # Como o `check_array` do scikit-learn: NaN segue o ramo `missing_left`,
+        # mas ±inf (inclusive o estouro da conversão) é recusado
+        if np.isinf(X).any():
+            raise ValueError("Entrada contém valores infinitos ou grandes demais para float32.")
+
+        n_rows, n_features = X.shape
+        node = np.repeat(self.roots[None, :], n_rows, axis=0)
+        # Índice da linha no array achatado, somado ao índice da feature
+        row_base = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        X_flat = X.ravel()
+        check_nan = bool(np.isnan(X_flat).any())
+
+        for _ in range(self.max_depth):
+            x = np.take(X_flat, row_base + np.take(self.feature, node))
+            go_right = ~(x <= np.take(self.threshold, node))
+            if check_nan:
+                is_nan = np.isnan(x)
+                go_right[is_nan] = ~self.missing_left[node[is_nan]]
+            node = np.take(self.children, 2 * node + go_right)
+
+        return node
+
+    def predict_with_proba(
+        self, X: np.ndarray, chunk_rows: int = DEFAULT_CHUNK_ROWS
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retorna `(classes, probabilidades)` em uma única passada pela floresta.
+        """
+        X = np.asarray(X)
+        n_rows = X.shape[0]
+        proba = np.empty((n_rows, self.value.shape[1]), dtype=np.float64)
+
+        for start in range(0, n_rows, chunk_rows):
+            stop = min(start + chunk_rows, n_rows)
+            self.leaf_value_sum(self.apply(X[start:stop]), out=proba[start:stop])
+
+        proba /= self.n_trees
+        preds = self.classes_.take(np.argmax(proba, axis=1), axis=0)
+        return preds, proba
+
+    def leaf_value_sum(self, leaves: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Soma, sobre as árvores, dos valores das folhas retornadas por `apply`
+        (dividir por `n_trees` dá as probabilidades).
+        """
+        if out is None:
+            out = np.empty((leaves.shape[0], self.value.shape[1]), dtype=np.float64)
+        # Soma sequencial árvore a árvore, na mesma ordem do `+=` do
+        # scikit-learn, garantindo o mesmo arredondamento.
+        if leaves.shape[0] <= SMALL_BATCH_ROWS:
+            acc = np.cumsum(np.take(self.value, leaves, axis=0), axis=1)
+            out[:] = acc[:, -1, :]
+        else:
+            out.fill(0.0)
+            for tree_leaves in np.ascontiguousarray(leaves.T):
+                out += np.take(self.value, tree_leaves, axis=0)
+        return out
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.predict_with_proba(X)[1]
+
+    def get_params(self, deep: bool = True) -> dict:
+        return dict(self.params)
+
+
+def overflow_mask(X: np.ndarray) -> np.ndarray:
+    """
+    Máscara dos valores que o modelo recusa: ±inf e os que viram ±inf na
+    conversão para float32. NaN não entra (é avaliado como valor ausente).
+    """
+    return np.abs(np.asarray(X, dtype=np.float64)) >= FLOAT32_OVERFLOW
+
+
+def verify_against_sklearn(engine: CompiledForest, model, X) -> bool:
+    """
+    Confere se o motor compilado reproduz bit a bit as classes e
+    probabilidades do modelo scikit-learn original para a matriz `X`
+    (DataFrame com os nomes das features ou array).
+    """
+    X_array = np.asarray(X)
+    expected_proba = model.predict_proba(X)
+    expected_pred = model.predict(X)
+
+    preds, proba = engine.predict_with_proba(X_array)
+    return bool(
+        np.array_equal(preds, expected_pred)
+        and proba.dtype == expected_proba.dtype
+        and np.array_equal(proba.view(np.uint64), expected_proba.view(np.uint64))
+    )
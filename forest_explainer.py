@@ -0,0 +1,156 @@
+"""
+Contribuições por feature das previsões do Random Forest (tree interpreter).
+
+Em cada árvore, a distribuição de classes da folha é a distribuição da raiz
+mais as variações ao longo do caminho até a folha; cada variação (filho -
+pai) é atribuída à feature usada na divisão do pai. Com a média sobre as
+árvores, cada previsão se decompõe exatamente em:
+
+    probabilidades = bias + soma das contribuições das 15 features
+
+onde `bias` é a média das distribuições das raízes (a mesma para todas as
+linhas).
+
+Como o caminho até cada folha é fixo, a soma por feature do caminho de
+cada folha é calculada uma única vez na carga (`leaf_contributions`, shape
+(folhas, features, classes)). Explicar um batch é então uma travessia
+vetorizada (`CompiledForest.apply`) seguida da soma das linhas dessa tabela
+para as folhas alcançadas.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from forest_engine import DEFAULT_CHUNK_ROWS, SMALL_BATCH_ROWS, CompiledForest
+
+
+class ForestExplainer:
+    """
+    Decomposição das previsões de um `CompiledForest` por feature.
+
+    `leaf_index[nó]` é a linha do nó em `leaf_contributions` (-1 para nós
+    internos). `transform`, se informado, é aplicado às features antes da
+    floresta (ex.: o scaler do artefato compacto).
+    """
+
+    def __init__(
+        self,
+        forest: CompiledForest,
+        leaf_index: np.ndarray,
+        leaf_contributions: np.ndarray,
+        bias: np.ndarray,
+        transform: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    ) -> None:
+        self.forest = forest
+        self.leaf_index = leaf_index
+        self.leaf_contributions = leaf_contributions
+        self.bias = bias
+        self.transform = transform
+
+    @property
+    def n_leaves(self) -> int:
+        return int(self.leaf_contributions.shape[0])
+
+    @classmethod
+    def from_forest(
+        cls, forest: CompiledForest, transform: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    ) -> "ForestExplainer":
+        """
+        Pré-calcula as contribuições acumuladas do caminho de cada folha.
+        Exige as distribuições de classes de todos os nós (o artefato
+        compacto guarda apenas as das folhas).
+        """
+        n_nodes = forest.n_nodes
+        n_features = forest.n_features_in_
+        node = np.arange(n_nodes, dtype=np.intp)
+        left = np.asarray(forest.children[0::2])
+        right = np.asarray(forest.children[1::2])
+        # Folhas apontam para si mesmas
+        internal = left != node
+        value = np.asarray(forest.value, dtype=np.float64)
+        if internal.any() and not np.all(value[internal].sum(axis=1) > 0):
+            raise ValueError("A floresta não guarda as distribuições dos nós internos.")
+        feature = np.asarray(forest.feature)
+
+        # Contribuição acumulada da raiz até cada nó, descendo nível a nível
+        path = np.zeros((n_nodes, n_features, value.shape[1]), dtype=np.float64)
+        frontier = np.asarray(forest.roots, dtype=np.intp)
+        while True:
+            parents = frontier[internal[frontier]]
+            if parents.size == 0:
+                break
+            children = np.concatenate((left[parents], right[parents]))
+            parents = np.concatenate((parents, parents))
+            path[children] = path[parents]
+            path[children, feature[parents]] += value[children] - value[parents]
+            frontier = children
+
+        leaves = np.flatnonzero(~internal)
+        leaf_index = np.full(n_nodes, -1, dtype=np.intp)
+        leaf_index[leaves] = np.arange(leaves.size, dtype=np.intp)
+        bias = value[np.asarray(forest.roots)].mean(axis=0)
+
+        return cls(forest, leaf_index, np.ascontiguousarray(path[leaves]), bias, transform)
+
+    def explain(
+        self, X: np.ndarray, chunk_rows: int = DEFAULT_CHUNK_ROWS
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Retorna `(classes, probabilidades, contribuições)` em uma única
+        travessia da floresta; as contribuições têm shape
+        (n_linhas, n_features, n_classes). Classes e probabilidades são as
+        mesmas de `CompiledForest.predict_with_proba`.
+        """
+        X = np.asarray(X) if self.transform is None else self.transform(X)
+        n_rows = X.shape[0]
+        n_trees = self.forest.n_trees
+        proba = np.empty((n_rows, self.bias.shape[0]), dtype=np.float64)
+        contributions = np.empty((n_rows,) + self.leaf_contributions.shape[1:], dtype=np.float64)
+
+        for start in range(0, n_rows, chunk_rows):
+            stop = min(start + chunk_rows, n_rows)
+            leaves = self.forest.apply(X[start:stop])
+            self.forest.leaf_value_sum(leaves, out=proba[start:stop])
+
+            rows = np.take(self.leaf_index, leaves)
+            out = contributions[start:stop]
+            if stop - start <= SMALL_BATCH_ROWS:
+                np.sum(np.take(self.leaf_contributions, rows, axis=0), axis=1, out=out)
+            else:
+                out.fill(0.0)
+                for tree_rows in np.ascontiguousarray(rows.T):
+                    out += np.take(self.leaf_contributions, tree_rows, axis=0)
+
+        proba /= n_trees
+        contributions /= n_trees
+        preds = self.forest.classes_.take(np.argmax(proba, axis=1), axis=0)
+        return preds, proba, contributions
+
+    def check_additivity(self, X: np.ndarray, atol: float = 1e-9) -> bool:
+        """Confere `bias + soma das contribuições == probabilidades` em `X`."""
+        _, proba, contributions = self.explain(X)
+        return bool(np.allclose(self.bias + contributions.sum(axis=1), proba, rtol=0.0, atol=atol))
+
+
+def build_explainer(model: Optional[object], engine: Optional[object] = None) -> Optional[ForestExplainer]:
+    """
+    Monta o `ForestExplainer` do modelo carregado (reaproveitando o motor
+    compilado, se houver). Retorna None para modelos sem suporte.
+    """
+    if model is None:
+        return None
+    try:
+        if isinstance(engine, CompiledForest):
+            return ForestExplainer.from_forest(engine)
+        if isinstance(model, CompiledForest):
+            return ForestExplainer.from_forest(model)
+        if isinstance(getattr(model, "forest", None), CompiledForest):
+            # Artefato compacto: scaler + floresta
+            return ForestExplainer.from_forest(model.forest, model.transform)
+        return ForestExplainer.from_forest(CompiledForest.from_sklearn(model))
+    except Exception as e:
+        print(f"[build_explainer] Feature contributions unavailable for this model: {e}")
+        return None
@@ -0,0 +1,556 @@
+"""
+Jobs assíncronos de pontuação em massa.
+
+Batches grandes enviados a `/jobs` não seguram a conexão HTTP nem um worker
+do threadpool da API: a matriz de features é gravada em disco (`.npy`) e a
+requisição responde na hora com o id do job. Os blocos são avaliados por um
+pool de processos separado, com prioridade de CPU reduzida (`nice`), de
+modo que o tráfego interativo (`/predict`) continua sendo atendido primeiro.
+
+Cada worker abre a matriz com memory-mapping (só os índices do bloco passam
+pelo pool), avalia o bloco e grava classes e probabilidades no SQLite
+(`jobs.sqlite3`, modo WAL), em uma linha por bloco. O progresso é a contagem
+de blocos gravados; jobs interrompidos (reinício do processo) são retomados
+a partir dos blocos que faltam.
+
+Vários processos da API (`WEB_CONCURRENCY` > 1, ou um worker reciclado)
+dividem o mesmo SQLite. Cada job tem um dono (o `JobManager` que o está
+avaliando) e um prazo (`lease_expires_at`), renovado periodicamente pelo
+dono. Um processo só retoma jobs sem dono ou com o prazo vencido (o dono
+morreu), e os workers só avaliam e gravam blocos de jobs que ainda existem
+e ainda são do seu processo: um `DELETE` atendido por outro processo (ou a
+retomada por outro dono) interrompe o job no processo original.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    n_rows INTEGER NOT NULL,
+    n_classes INTEGER NOT NULL,
+    chunk_rows INTEGER NOT NULL,
+    model_source TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    inference_engine TEXT NOT NULL DEFAULT 'sklearn',
+    owner TEXT,
+    lease_expires_at REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS job_chunks (
+    job_id TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    n_rows INTEGER NOT NULL,
+    preds BLOB NOT NULL,
+    proba BLOB NOT NULL,
+    PRIMARY KEY (job_id, chunk)
+);
+"""
+
+# Colunas criadas depois da primeira versão do schema (bancos já existentes
+# ganham a coluna com o valor padrão)
+_ADDED_COLUMNS = {
+    "inference_engine": "TEXT NOT NULL DEFAULT 'sklearn'",
+    "owner": "TEXT",
+    "lease_expires_at": "REAL",
+}
+
+_UNFINISHED = "status IN ('queued', 'running')"
+
+
+class JobNotFoundError(KeyError):
+    """Job inexistente (ou já removido)."""
+
+    def __str__(self) -> str:
+        return f"Job não encontrado: {self.args[0]}"
+
+
+class JobStore:
+    """
+    Estado dos jobs e resultados por bloco em SQLite. Cada operação abre a
+    própria conexão, então a mesma instância pode ser usada de qualquer
+    thread (e cada processo worker cria a sua).
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Conexão curta: commit (ou rollback) e fechamento ao sair do bloco."""
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(
+        self,
+        job_id: str,
+        n_rows: int,
+        n_classes: int,
+        chunk_rows: int,
+        model_source: str,
+        model_version: str,
+        inference_engine: str,
+        owner: str,
+        lease_expires_at: float,
+    ) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, n_rows, n_classes, chunk_rows, model_source, model_version, "
+                "inference_engine, owner, lease_expires_at, created_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id, n_rows, n_classes, chunk_rows, model_source, model_version,
+                    inference_engine, owner, lease_expires_at, time.time(),
+                ),
+            )
+
+    def get(self, job_id: str) -> dict:
+        """Estado do job com o progresso (blocos e linhas já gravados)."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                raise JobNotFoundError(job_id)
+            chunks_done, rows_done = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(n_rows), 0) FROM job_chunks WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        job = dict(row)
+        job["chunks_total"] = -(-job["n_rows"] // job["chunk_rows"])
+        job["chunks_done"] = int(chunks_done)
+        job["rows_done"] = int(rows_done)
+        return job
+
+    def mark_started(self, job_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+
+    def finish(self, job_id: str, owner: str, status: str, error: Optional[str] = None) -> bool:
+        """Encerra o job se ele ainda for de `owner`; False se foi removido ou retomado por outro."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, owner = NULL, lease_expires_at = NULL "
+                "WHERE id = ? AND owner = ?",
+                (status, time.time(), error, job_id, owner),
+            )
+        return cursor.rowcount > 0
+
+    def owns(self, job_id: str, owner: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM jobs WHERE id = ? AND owner = ?", (job_id, owner)).fetchone()
+        return row is not None
+
+    def renew(self, owner: str, lease_expires_at: float) -> set:
+        """Estende o prazo dos jobs de `owner` ainda em andamento; retorna os ids."""
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET lease_expires_at = ? WHERE owner = ? AND {_UNFINISHED}",
+                (lease_expires_at, owner),
+            )
+            rows = conn.execute(f"SELECT id FROM jobs WHERE owner = ? AND {_UNFINISHED}", (owner,)).fetchall()
+        return {row[0] for row in rows}
+
+    def claim_expired(self, owner: str, lease_expires_at: float) -> List[str]:
+        """
+        Toma para `owner` os jobs em andamento sem dono ou com o prazo
+        vencido. A transação `IMMEDIATE` garante que dois processos não
+        retomem o mesmo job.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                f"SELECT id FROM jobs WHERE {_UNFINISHED} "
+                "AND (owner IS NULL OR lease_expires_at IS NULL OR lease_expires_at < ?) ORDER BY created_at",
+                (time.time(),),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET owner = ?, lease_expires_at = ? WHERE id = ?",
+                [(owner, lease_expires_at, row[0]) for row in rows],
+            )
+        return [row[0] for row in rows]
+
+    def release(self, owner: str) -> None:
+        """Libera os jobs em andamento de `owner` (encerramento limpo) para outro processo retomar."""
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET owner = NULL, lease_expires_at = NULL WHERE owner = ? AND {_UNFINISHED}",
+                (owner,),
+            )
+
+    def done_chunks(self, job_id: str) -> set:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT chunk FROM job_chunks WHERE job_id = ?", (job_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def store_chunk(self, job_id: str, owner: str, chunk: int, preds: np.ndarray, proba: np.ndarray) -> None:
+        # Só grava se o job ainda existir e ainda for deste dono (pode ter
+        # sido cancelado, ou retomado por outro processo, durante o bloco)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_chunks (job_id, chunk, n_rows, preds, proba) "
+                "SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM jobs WHERE id = ? AND owner = ?)",
+                (
+                    job_id,
+                    chunk,
+                    len(preds),
+                    np.ascontiguousarray(preds, dtype=np.int64).tobytes(),
+                    np.ascontiguousarray(proba, dtype=np.float64).tobytes(),
+                    job_id,
+                    owner,
+                ),
+            )
+
+    def results(self, job_id: str, offset: int, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Classes e probabilidades das linhas `[offset, offset + limit)`."""
+        job = self.get(job_id)
+        chunk_rows, n_classes = job["chunk_rows"], job["n_classes"]
+        stop = min(offset + limit, job["n_rows"])
+        if offset >= stop:
+            return np.empty(0, dtype=np.int64), np.empty((0, n_classes), dtype=np.float64)
+
+        first, last = offset // chunk_rows, (stop - 1) // chunk_rows
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT chunk, preds, proba FROM job_chunks WHERE job_id = ? AND chunk BETWEEN ? AND ? ORDER BY chunk",
+                (job_id, first, last),
+            ).fetchall()
+        if len(rows) != last - first + 1:
+            raise ValueError(f"Job {job_id} ainda não tem resultados para as linhas {offset}-{stop - 1}.")
+
+        preds = np.concatenate([np.frombuffer(p, dtype=np.int64) for _, p, _ in rows])
+        proba = np.concatenate([np.frombuffer(p, dtype=np.float64).reshape(-1, n_classes) for _, _, p in rows])
+        start = offset - first * chunk_rows
+        return preds[start:start + stop - offset], proba[start:start + stop - offset]
+
+    def delete(self, job_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM job_chunks WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+
+# ---------------------------------------------------------
+# Worker
+# ---------------------------------------------------------
+
+_WORKER_STORE: Optional[JobStore] = None
+# Caminho do modelo -> (versão, modelo), carregado uma vez por processo
+_WORKER_MODELS: Dict[str, Tuple[str, object]] = {}
+
+
+def _init_worker(db_path: str, nice: int) -> None:
+    global _WORKER_STORE
+
+    from parallel_inference import limit_native_threads
+
+    # Um thread BLAS/OpenMP por worker. As bibliotecas já estão carregadas
+    # aqui, então o limite é aplicado em tempo de execução (threadpoolctl).
+    limit_native_threads(1)
+    # O worker importa o `app` só pelos loaders do modelo: sem a carga
+    # síncrona de dataset, explainer e universo de ranking na importação
+    os.environ["PRELOAD_ARTIFACTS"] = "0"
+    if nice > 0 and hasattr(os, "nice"):
+        # Prioridade menor que a da API: a CPU vai primeiro para `/predict`
+        os.nice(nice)
+    _WORKER_STORE = JobStore(db_path)
+
+
+def _worker_model(source: str, version: str, inference_engine: str) -> object:
+    """
+    Modelo de `source` na versão pedida pelo job (recarrega se o arquivo
+    mudou). O motor compilado já foi verificado contra o scikit-learn pela
+    API ao montar a versão (`inference_engine == "compiled"`), então aqui a
+    floresta só é compilada, uma vez, e a versão sai do próprio motor.
+    """
+    from app import build_inference_engine, compute_model_version, load_model
+
+    cached = _WORKER_MODELS.get(source)
+    if cached is None or cached[0] != version:
+        model = load_model(Path(source))
+        if model is None:
+            raise RuntimeError(f"Não foi possível carregar o modelo de {source}.")
+        engine = build_inference_engine(model, None) if inference_engine == "compiled" else None
+        if engine is None and hasattr(model, "n_jobs"):
+            model.n_jobs = 1
+        loaded = engine if engine is not None else model
+        loaded_version = compute_model_version(loaded)
+        if loaded_version != version:
+            raise RuntimeError(
+                f"O modelo em {source} mudou (versão {loaded_version}, o job pediu {version}); reenvie o job."
+            )
+        cached = _WORKER_MODELS[source] = (version, loaded)
+    return cached[1]
+
+
+def _score_job_chunk(
+    job_id: str,
+    input_path: str,
+    chunk: int,
+    start: int,
+    stop: int,
+    model_source: str,
+    model_version: str,
+    inference_engine: str,
+    owner: str,
+) -> int:
+    if not _WORKER_STORE.owns(job_id, owner):
+        # Cancelado (ou retomado por outro processo) enquanto o bloco esperava na fila
+        return 0
+    _WORKER_STORE.mark_started(job_id)
+    model = _worker_model(model_source, model_version, inference_engine)
+    X = np.load(input_path, mmap_mode="r")[start:stop]
+    if hasattr(model, "predict_with_proba"):
+        preds, proba = model.predict_with_proba(X)
+    else:
+        preds, proba = model.predict(X), model.predict_proba(X)
+    _WORKER_STORE.store_chunk(job_id, owner, chunk, preds, proba)
+    return stop - start
+
+
+# ---------------------------------------------------------
+# Coordenação (processo da API)
+# ---------------------------------------------------------
+
+class JobManager:
+    """
+    Recebe jobs, envia os blocos ao pool de processos e atualiza o estado
+    quando todos terminam. O pool é criado no primeiro job.
+
+    Os jobs enviados ou retomados por esta instância são dela (`owner`)
+    enquanto ela renovar o prazo, a cada `lease_seconds / 3` (`start`).
+    """
+
+    def __init__(
+        self, directory: Union[str, Path], workers: int, chunk_rows: int, nice: int = 10, lease_seconds: float = 30.0
+    ) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.store = JobStore(self.directory / "jobs.sqlite3")
+        self.workers = max(1, int(workers))
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.nice = int(nice)
+        self.lease_seconds = max(1.0, float(lease_seconds))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Job -> futures dos blocos ainda não concluídos
+        self._pending: Dict[str, List[Future]] = {}
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def input_path(self, job_id: str) -> Path:
+        return self.directory / f"{job_id}.npy"
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # "spawn": o processo da API tem threads (loader, monitor do
+            # modelo, threadpool), que não combinam com fork
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(str(self.store.path), self.nice),
+            )
+        return self._pool
+
+    def submit(
+        self, X: np.ndarray, n_classes: int, model_source: str, model_version: str, inference_engine: str
+    ) -> dict:
+        """Grava a matriz de features e enfileira os blocos; retorna o estado do job."""
+        job_id = uuid.uuid4().hex
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        tmp_path = self.directory / f".{job_id}.npy.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, X)
+        os.replace(tmp_path, self.input_path(job_id))
+
+        self.store.create(
+            job_id, int(X.shape[0]), n_classes, self.chunk_rows, model_source, model_version, inference_engine,
+            self.owner, self._lease_deadline(),
+        )
+        self._enqueue(job_id)
+        return self.store.get(job_id)
+
+    def _enqueue(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        done = self.store.done_chunks(job_id)
+        n_rows, chunk_rows = job["n_rows"], job["chunk_rows"]
+        input_path = str(self.input_path(job_id))
+
+        with self._lock:
+            pool = self._executor()
+            futures = []
+            for chunk, start in enumerate(range(0, n_rows, chunk_rows)):
+                if chunk in done:
+                    continue
+                futures.append(
+                    pool.submit(
+                        _score_job_chunk,
+                        job_id,
+                        input_path,
+                        chunk,
+                        start,
+                        min(start + chunk_rows, n_rows),
+                        job["model_source"],
+                        job["model_version"],
+                        job["inference_engine"],
+                        self.owner,
+                    )
+                )
+            self._pending[job_id] = futures
+        if not futures:
+            self._finish(job_id, None)
+        for future in futures:
+            future.add_done_callback(lambda f, job_id=job_id: self._on_chunk_done(job_id, f))
+
+    def _on_chunk_done(self, job_id: str, future: Future) -> None:
+        if future.cancelled():
+            return
+        error = future.exception()
+        with self._lock:
+            futures = self._pending.get(job_id)
+            if futures is None:
+                return
+            if isinstance(error, BrokenProcessPool):
+                # Um worker morreu: o executor falha todos os blocos sozinho;
+                # o próximo job cria um pool novo
+                self._pool = None
+            elif error is not None:
+                # Um bloco falhou: o job inteiro falha e os blocos restantes saem da fila
+                for other in futures:
+                    other.cancel()
+            elif not all(f.done() for f in futures):
+                return
+            elif any(f.cancelled() for f in futures):
+                # Blocos tirados da fila no encerramento (`shutdown`): o job
+                # fica para o processo que o retomar
+                del self._pending[job_id]
+                return
+            del self._pending[job_id]
+        self._finish(job_id, f"{type(error).__name__}: {error}" if error is not None else None)
+
+    def _finish(self, job_id: str, error: Optional[str]) -> None:
+        if not self.store.finish(job_id, self.owner, "failed" if error else "done", error):
+            # Removido por um `DELETE` em outro processo, ou retomado por
+            # outro dono (que ainda precisa da matriz de entrada)
+            print(f"[JobManager] Job {job_id} is no longer owned by this process, dropping it")
+            return
+        # Os resultados ficam no SQLite; a matriz de entrada não é mais necessária
+        self.input_path(job_id).unlink(missing_ok=True)
+        print(f"[JobManager] Job {job_id} {'failed: ' + error if error else 'done'}")
+
+    def status(self, job_id: str) -> dict:
+        return self.store.get(job_id)
+
+    def results(self, job_id: str, offset: int, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.store.results(job_id, offset, limit)
+
+    def cancel(self, job_id: str) -> dict:
+        """Cancela os blocos ainda na fila e remove os resultados do job."""
+        job = self.store.get(job_id)
+        with self._lock:
+            for future in self._pending.pop(job_id, []):
+                future.cancel()
+        if job["status"] not in FINISHED_STATUSES:
+            job["status"] = "cancelled"
+        self.store.delete(job_id)
+        self.input_path(job_id).unlink(missing_ok=True)
+        return job
+
+    def _lease_deadline(self) -> float:
+        return time.time() + self.lease_seconds
+
+    def recover(self) -> int:
+        """
+        Retoma os jobs interrompidos: sem dono ou com o prazo do dono
+        vencido (processo encerrado ou morto). Retorna quantos.
+        """
+        recovered = 0
+        for job_id in self.store.claim_expired(self.owner, self._lease_deadline()):
+            with self._lock:
+                if job_id in self._pending:
+                    # Prazo deste próprio processo venceu (heartbeat atrasado)
+                    continue
+            if not self.input_path(job_id).exists():
+                self.store.finish(job_id, self.owner, "failed", "Matriz de entrada perdida antes do fim do job.")
+                continue
+            self._enqueue(job_id)
+            recovered += 1
+        if recovered:
+            print(f"[JobManager] Resumed {recovered} unfinished job(s)")
+        return recovered
+
+    def start(self) -> threading.Thread:
+        """
+        Retoma os jobs interrompidos e inicia o heartbeat: renova o prazo dos
+        jobs deste processo, abandona os que foram removidos ou retomados por
+        outro processo e retoma os de donos que pararam de renovar.
+        """
+        self.recover()
+        with self._lock:
+            if self._heartbeat is None or not self._heartbeat.is_alive():
+                self._stop.clear()
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="jobs-heartbeat", daemon=True)
+                self._heartbeat.start()
+            return self._heartbeat
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                owned = self.store.renew(self.owner, self._lease_deadline())
+                with self._lock:
+                    lost = [job_id for job_id in self._pending if job_id not in owned]
+                    for job_id in lost:
+                        for future in self._pending.pop(job_id):
+                            future.cancel()
+                for job_id in lost:
+                    print(f"[JobManager] Job {job_id} was cancelled or taken over elsewhere, dropping it")
+                self.recover()
+            except Exception as e:
+                print(f"[JobManager] Heartbeat error: {e}")
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            # Blocos na fila ficam para a próxima inicialização (`recover`)
+            pool.shutdown(wait=False, cancel_futures=True)
+        # Sem esperar o prazo vencer: outro processo (ou o próximo) retoma já
+        self.store.release(self.owner)
@@ -0,0 +1,142 @@
+"""
+Tabela de features macroeconômicas por país.
+
+Nove das 15 features do modelo são dados macro do país da empresa e são
+idênticas para todas as empresas de um mesmo país em `dados/data.csv`. A
+`MacroFeatureStore` indexa esses valores por país, permitindo que o cliente
+envie apenas `country` e as seis features da empresa: as colunas macro são
+preenchidas no servidor com um gather vetorizado.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+
+FIRM_FEATURES = [
+    "dividend_yield_ttm",
+    "earnings_ttm",
+    "marketcap",
+    "pe_ratio_ttm",
+    "revenue_ttm",
+    "price",
+]
+
+MACRO_FEATURES = [
+    "gdp_per_capita_usd",
+    "gdp_growth_percent",
+    "inflation_percent",
+    "interest_rate_percent",
+    "unemployment_rate_percent",
+    "exchange_rate_to_usd",
+    "inflation",
+    "interest_rate",
+    "unemployment",
+]
+
+# Colunas espelhadas: o dataset guarda três taxas também com o sinal
+# invertido (ex.: `interest_rate = -interest_rate_percent`)
+MIRRORED_FEATURES = {
+    "inflation": "inflation_percent",
+    "interest_rate": "interest_rate_percent",
+    "unemployment": "unemployment_rate_percent",
+}
+
+
+def mirrored_feature(feature: str) -> Optional[str]:
+    """A outra coluna do par espelhado de `feature` (mesmo valor com o sinal invertido), se houver."""
+    if feature in MIRRORED_FEATURES:
+        return MIRRORED_FEATURES[feature]
+    for derived, source in MIRRORED_FEATURES.items():
+        if source == feature:
+            return derived
+    return None
+
+
+class UnknownCountryError(KeyError):
+    """Um ou mais países não existem na tabela macro."""
+
+    def __init__(self, countries: List[str]) -> None:
+        super().__init__(countries)
+        self.countries = countries
+
+    def __str__(self) -> str:
+        return f"Países sem dados macro: {self.countries}"
+
+
+class MacroFeatureStore:
+    """
+    Índice país -> vetor de features macro (na ordem de `MACRO_FEATURES`).
+    """
+
+    def __init__(self, countries: Sequence[str], values: np.ndarray, source: str = "") -> None:
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        if values.shape != (len(countries), len(MACRO_FEATURES)):
+            raise ValueError(
+                f"Esperado array com shape ({len(countries)}, {len(MACRO_FEATURES)}), recebido {values.shape}."
+            )
+        self.countries = list(countries)
+        self.values = values
+        self.source = source
+        self._index = pd.Index(self.countries)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, source: str = "dataframe") -> "MacroFeatureStore":
+        """
+        Constrói a tabela a partir de um DataFrame com `country` e as colunas
+        macro (ex.: `dados/data.csv`). Se um país tiver valores divergentes,
+        usa a primeira ocorrência e avisa no log.
+        """
+        missing = [c for c in ["country"] + MACRO_FEATURES if c not in df.columns]
+        if missing:
+            raise ValueError(f"Colunas ausentes na tabela macro: {missing}")
+
+        macro = df[["country"] + MACRO_FEATURES].dropna(subset=["country"])
+        inconsistent = macro.groupby("country")[MACRO_FEATURES].nunique().gt(1).any(axis=1)
+        if inconsistent.any():
+            print(
+                "[MacroFeatureStore] Inconsistent macro values for "
+                f"{sorted(inconsistent[inconsistent].index)}, using first occurrence"
+            )
+
+        table = macro.drop_duplicates(subset="country", keep="first").sort_values("country")
+        return cls(table["country"].tolist(), table[MACRO_FEATURES].to_numpy(dtype=np.float64), source)
+
+    @classmethod
+    def from_csv(cls, path: Union[str, Path]) -> "MacroFeatureStore":
+        return cls.from_dataframe(pd.read_csv(path), source=str(path))
+
+    def __len__(self) -> int:
+        return len(self.countries)
+
+    def gather(self, countries: Sequence[str]) -> np.ndarray:
+        """
+        Retorna a matriz (n, 9) de features macro para a lista de países.
+        """
+        codes = self._index.get_indexer(pd.Index(countries))
+        unknown = codes < 0
+        if unknown.any():
+            raise UnknownCountryError(sorted(set(np.asarray(countries, dtype=object)[unknown].tolist())))
+        return self.values[codes]
+
+    def assemble(self, firm: np.ndarray, countries: Sequence[str], feature_order: Sequence[str]) -> np.ndarray:
+        """
+        Monta a matriz completa de features (n, len(feature_order)) a partir
+        das features da empresa (n, 6, na ordem de `FIRM_FEATURES`) e do país.
+        """
+        firm = np.asarray(firm, dtype=np.float64)
+        X = np.empty((firm.shape[0], len(feature_order)), dtype=np.float64)
+        position = {name: i for i, name in enumerate(feature_order)}
+        X[:, [position[name] for name in FIRM_FEATURES]] = firm
+        X[:, [position[name] for name in MACRO_FEATURES]] = self.gather(countries)
+        return X
+
+    def to_records(self) -> List[dict]:
+        return [
+            {"country": country, **dict(zip(MACRO_FEATURES, row.tolist()))}
+            for country, row in zip(self.countries, self.values)
+        ]
@@ -0,0 +1,256 @@
+"""
+Métricas da API no formato de texto do Prometheus (`/metrics`).
+
+Implementação mínima, sem dependências: contadores, gauges e histogramas
+com labels, protegidos por um lock e renderizados sob demanda. Os
+histogramas são cumulativos no estilo Prometheus (`_bucket{le=...}`,
+`_sum`, `_count`), então podem ser agregados entre workers com
+`histogram_quantile`.
+
+`StageTimer` mede cada etapa do caminho de previsão (validação, conversão
+para array, cache, modelo, montagem da resposta) com rótulos de endpoint e
+versão do modelo; `MetricsMiddleware` (ASGI puro, compatível com streaming)
+mede a latência total e as requisições em andamento por endpoint.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Buckets (s) das etapas: de 25 µs a 10 s
+STAGE_BUCKETS = (
+    0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Buckets (s) da latência total das requisições
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Buckets do número de linhas por requisição/bloco
+BATCH_ROWS_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)
+# Buckets da vazão (linhas/s) de cada requisição
+ROWS_PER_SECOND_BUCKETS = (10, 100, 1e3, 5e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...] = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple[str, ...] = (), amount: float = 1.0) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, labels: Tuple[str, ...], value: float) -> None:
+        with self._lock:
+            self._values[labels] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = STAGE_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [contagens por bucket (não cumulativas) + overflow, soma]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        # Busca linear: poucos buckets, mais barato que bisect + chamadas
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        lines = self._header()
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Conjunto de métricas renderizadas juntas em `/metrics`."""
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer: "StageTimer", name: str) -> None:
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self) -> "_Stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.timer.observe(self.name, time.perf_counter() - self.start)
+
+
+class StageTimer:
+    """
+    Cronômetro das etapas de uma requisição, com os rótulos de endpoint e
+    versão do modelo já resolvidos:
+
+        timer = StageTimer(STAGE_SECONDS, "/predict-batch", snapshot.version)
+        with timer.stage("validate"):
+            ...
+
+    Com `histogram=None` não mede nada (métricas desativadas).
+    """
+
+    __slots__ = ("histogram", "endpoint", "model_version")
+
+    def __init__(self, histogram: Optional[Histogram], endpoint: str, model_version: str) -> None:
+        self.histogram = histogram
+        self.endpoint = endpoint
+        self.model_version = model_version
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def observe(self, name: str, seconds: float) -> None:
+        if self.histogram is not None:
+            self.histogram.observe((self.endpoint, self.model_version, name), seconds)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mede a duração total e conta as requisições em
+    andamento por endpoint (o template da rota, ex. `/predict-batch`; paths
+    sem rota viram `other`, para não criar séries ilimitadas). A versão do
+    modelo vem do cabeçalho `X-Model-Version` da resposta, quando presente.
+    """
+
+    def __init__(self, app, router, duration: Histogram, in_flight: Gauge) -> None:
+        self.app = app
+        self.router = router
+        self.duration = duration
+        self.in_flight = in_flight
+
+    def _endpoint(self, scope) -> str:
+        for route in self.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "other")
+        return "other"
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        endpoint = self._endpoint(scope)
+        response = {"status": "500", "version": ""}
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = str(message["status"])
+                for key, value in message.get("headers", ()):
+                    if key.lower() == b"x-model-version":
+                        response["version"] = value.decode("latin-1")
+                        break
+            await send(message)
+
+        self.in_flight.inc((endpoint,))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight.dec((endpoint,))
+            self.duration.observe(
+                (endpoint, response["version"], response["status"]), time.perf_counter() - start
+            )
@@ -0,0 +1,171 @@
+"""
+Despachante de micro-batches para previsões individuais.
+
+Requisições concorrentes de `/predict` são enfileiradas e avaliadas juntas:
+a fila é descarregada como uma única matriz quando atinge `max_batch_size`
+linhas ou quando a requisição mais antiga espera `max_wait_us`
+microssegundos, o que vier primeiro. Cada chamador recebe de volta apenas a
+sua linha de resultado, junto com a versão do modelo que avaliou o batch.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+ScoreFn = Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray, str]]
+
+# Limites superiores (em microssegundos) dos buckets do histograma de espera
+QUEUE_WAIT_BUCKETS_US = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+
+
+class MicroBatchDispatcher:
+    """
+    Agrupa linhas individuais em batches e as envia a `score_fn`
+    (que recebe uma matriz (n, n_features) e retorna `(classes, probas,
+    versão do modelo)`).
+
+    A avaliação roda no executor padrão do event loop, de modo que novas
+    requisições continuam sendo enfileiradas enquanto um batch é avaliado.
+    """
+
+    def __init__(self, score_fn: ScoreFn, max_batch_size: int = 64, max_wait_us: int = 500) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size deve ser >= 1")
+        self.score_fn = score_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_us = int(max_wait_us)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # Métricas
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._batch_size_counts: Dict[int, int] = {}
+        self._wait_count = 0
+        self._wait_sum_us = 0.0
+        self._wait_max_us = 0.0
+        self._wait_buckets = [0] * (len(QUEUE_WAIT_BUCKETS_US) + 1)
+
+    # -----------------------------------------------------
+    # API pública
+    # -----------------------------------------------------
+
+    async def submit(self, row: np.ndarray) -> Tuple[int, np.ndarray, str]:
+        """
+        Enfileira uma linha de features e aguarda `(classe, probabilidades,
+        versão do modelo)`. A versão é a usada no flush do batch, que pode
+        ser mais nova que a ativa quando a linha foi enfileirada.
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((row, future, time.perf_counter()))
+        return await future
+
+    def stats(self) -> dict:
+        """
+        Retorna um snapshot das métricas de preenchimento dos batches e do
+        tempo de espera na fila.
+        """
+        with self._lock:
+            batches = self._batches
+            rows = self._rows
+            wait_count = self._wait_count
+            histogram = {str(size): count for size, count in sorted(self._batch_size_counts.items())}
+            # Histograma cumulativo (estilo Prometheus)
+            cumulative = np.cumsum(self._wait_buckets).tolist()
+            wait_hist = {f"le_{bound}": count for bound, count in zip(QUEUE_WAIT_BUCKETS_US, cumulative)}
+            wait_hist["le_inf"] = cumulative[-1]
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_us": self.max_wait_us,
+                "batches": batches,
+                "rows": rows,
+                "avg_batch_size": rows / batches if batches else 0.0,
+                "avg_batch_fill": rows / (batches * self.max_batch_size) if batches else 0.0,
+                "batch_size_histogram": histogram,
+                "queue_wait_us": {
+                    "avg": self._wait_sum_us / wait_count if wait_count else 0.0,
+                    "max": self._wait_max_us,
+                    "histogram": wait_hist,
+                },
+            }
+
+    # -----------------------------------------------------
+    # Internos
+    # -----------------------------------------------------
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # Primeiro uso (ou novo event loop): cria fila e worker neste loop
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _collect(self) -> List[tuple]:
+        queue = self._queue
+        batch = [await queue.get()]
+        deadline = batch[0][2] + self.max_wait_us / 1e6
+
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            flushed_at = time.perf_counter()
+            self._record(batch, flushed_at)
+
+            X = np.vstack([item[0] for item in batch])
+            try:
+                preds, probas, version = await loop.run_in_executor(None, self.score_fn, X)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for i, (_, future, _) in enumerate(batch):
+                # O chamador pode ter desistido (ex.: cliente desconectou)
+                if not future.done():
+                    future.set_result((int(preds[i]), probas[i], version))
+
+    def _record(self, batch: List[tuple], flushed_at: float) -> None:
+        with self._lock:
+            size = len(batch)
+            self._batches += 1
+            self._rows += size
+            self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+            for _, _, enqueued_at in batch:
+                wait_us = (flushed_at - enqueued_at) * 1e6
+                self._wait_count += 1
+                self._wait_sum_us += wait_us
+                self._wait_max_us = max(self._wait_max_us, wait_us)
+                for i, bound in enumerate(QUEUE_WAIT_BUCKETS_US):
+                    if wait_us <= bound:
+                        self._wait_buckets[i] += 1
+                        break
+                else:
+                    self._wait_buckets[-1] += 1
@@ -0,0 +1,252 @@
+"""
+Registro de versões do modelo com troca atômica (hot-swap).
+
+Cada versão carregada é um `ModelSnapshot` imutável (modelo, motor
+compilado, explicador, universo pontuado, versão e arquivo de origem). As requisições leem o snapshot
+ativo uma única vez e o usam do início ao fim, então uma troca nunca mistura
+duas versões na mesma resposta. Versões novas são carregadas e aquecidas
+fora do caminho das requisições (thread de monitoramento ou chamada
+administrativa) e publicadas com uma única atribuição; as anteriores ficam
+guardadas para rollback.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+
+FileSignature = Tuple[int, int, int]
+
+
+def file_signature(path: Union[str, Path]) -> Optional[FileSignature]:
+    """
+    Assinatura `(mtime_ns, tamanho, inode)` do arquivo, ou None se ele não
+    existir. Muda tanto em reescritas no lugar quanto em `os.replace`.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ModelReloadError(RuntimeError):
+    """Falha ao carregar, validar ou trocar uma versão do modelo."""
+
+
+class ModelSnapshot:
+    """
+    Uma versão carregada do modelo. Não deve ser alterada após publicada.
+    """
+
+    def __init__(
+        self,
+        model: object,
+        engine: Optional[object],
+        version: str,
+        source: str,
+        signature: Optional[FileSignature] = None,
+        explainer: Optional[object] = None,
+    ) -> None:
+        self.model = model
+        self.engine = engine
+        # Contribuições por feature pré-calculadas (`/explain`)
+        self.explainer = explainer
+        # Universo de referência pontuado por esta versão (`/rankings`),
+        # preenchido no aquecimento, antes da publicação
+        self.rankings: Optional[object] = None
+        self.version = version
+        self.source = source
+        self.signature = signature
+        self.loaded_at = time.time()
+
+    @property
+    def inference_engine(self) -> str:
+        return "compiled" if self.engine is not None else "sklearn"
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "inference_engine": self.inference_engine,
+            "explainer": self.explainer is not None,
+            "ranking_rows": len(self.rankings) if self.rankings is not None else None,
+        }
+
+
+BuildFn = Callable[[Path], ModelSnapshot]
+
+
+class ModelRegistry:
+    """
+    Mantém o snapshot ativo e as versões anteriores.
+
+    `build_fn(caminho)` carrega, valida e aquece uma versão e levanta
+    `ModelReloadError` se ela não puder ser usada; nesse caso o snapshot
+    ativo não muda. Cargas são serializadas, leituras de `active` não usam lock.
+    """
+
+    def __init__(self, build_fn: BuildFn, history_size: int = 1) -> None:
+        if history_size < 1:
+            raise ValueError("history_size deve ser >= 1")
+        self.build_fn = build_fn
+        self._active: Optional[ModelSnapshot] = None
+        self._history: "deque[ModelSnapshot]" = deque(maxlen=int(history_size))
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        # Última assinatura vista em disco por arquivo (ver `_poll`)
+        self._seen: Dict[str, FileSignature] = {}
+        self.swaps = 0
+        self.failed_reloads = 0
+        self.last_error: Optional[str] = None
+
+    # -----------------------------------------------------
+    # Leitura
+    # -----------------------------------------------------
+
+    @property
+    def active(self) -> Optional[ModelSnapshot]:
+        return self._active
+
+    @property
+    def history(self) -> List[ModelSnapshot]:
+        """Versões anteriores, da mais recente para a mais antiga."""
+        return list(reversed(self._history))
+
+    def stats(self) -> dict:
+        active = self._active
+        return {
+            "active": active.to_dict() if active is not None else None,
+            "previous": [snapshot.to_dict() for snapshot in self.history],
+            "swaps": self.swaps,
+            "failed_reloads": self.failed_reloads,
+            "last_error": self.last_error,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+        }
+
+    # -----------------------------------------------------
+    # Carga, troca e rollback
+    # -----------------------------------------------------
+
+    def load(self, source: Union[str, Path]) -> Tuple[ModelSnapshot, bool]:
+        """
+        Carrega `source` e, se for uma versão diferente da ativa, a publica.
+        Retorna `(snapshot ativo, houve_troca)`.
+        """
+        source = Path(source)
+        with self._reload_lock:
+            try:
+                snapshot = self.build_fn(source)
+            except ModelReloadError as e:
+                self._record_failure(str(e))
+                raise
+            except Exception as e:
+                self._record_failure(f"Erro ao carregar {source}: {e}")
+                raise ModelReloadError(self.last_error) from e
+
+            if snapshot.signature is not None:
+                self._seen[str(source)] = snapshot.signature
+            return self._swap(snapshot)
+
+    def reload(self) -> Tuple[ModelSnapshot, bool]:
+        """Recarrega o arquivo de origem da versão ativa."""
+        active = self._active
+        if active is None:
+            raise ModelReloadError("Nenhum modelo ativo para recarregar.")
+        return self.load(active.source)
+
+    def rollback(self) -> ModelSnapshot:
+        """
+        Volta para a versão anterior. A versão substituída passa a ser a
+        anterior, então dois rollbacks seguidos desfazem um ao outro.
+        """
+        with self._reload_lock:
+            if not self._history or self._active is None:
+                raise ModelReloadError("Nenhuma versão anterior disponível para rollback.")
+            previous = self._history.pop()
+            self._history.append(self._active)
+            self._active = previous
+            self.swaps += 1
+            print(f"[ModelRegistry] Rolled back to model {previous.version} ({previous.source})")
+            return previous
+
+    def _swap(self, snapshot: ModelSnapshot) -> Tuple[ModelSnapshot, bool]:
+        current = self._active
+        if current is not None and current.version == snapshot.version:
+            print(f"[ModelRegistry] Model {snapshot.version} already active, nothing to swap")
+            return current, False
+
+        if current is not None:
+            self._history.append(current)
+        # Publicação atômica: uma única atribuição de referência
+        self._active = snapshot
+        self.swaps += 1
+        self.last_error = None
+        previous = current.version if current is not None else None
+        print(f"[ModelRegistry] Active model {previous} -> {snapshot.version} ({snapshot.source})")
+        return snapshot, True
+
+    def _record_failure(self, message: str) -> None:
+        self.failed_reloads += 1
+        self.last_error = message
+        print(f"[ModelRegistry] Reload failed, keeping active model: {message}")
+
+    # -----------------------------------------------------
+    # Monitoramento do arquivo do modelo ativo
+    # -----------------------------------------------------
+
+    def start_watching(self, interval_seconds: float) -> Optional[threading.Thread]:
+        """
+        Verifica a cada `interval_seconds` se o arquivo da versão ativa mudou
+        em disco e, em caso afirmativo, carrega a nova versão. Uma thread por
+        processo (servidores com fork devem chamar isto após o fork).
+        """
+        if interval_seconds <= 0:
+            return None
+        with self._reload_lock:
+            if self._watcher is not None and self._watcher.is_alive():
+                return self._watcher
+            self._watcher = threading.Thread(
+                target=self._watch_loop, args=(float(interval_seconds),), name="model-watcher", daemon=True
+            )
+            self._watcher.start()
+            return self._watcher
+
+    def _watch_loop(self, interval: float) -> None:
+        pending: Optional[FileSignature] = None
+        while True:
+            time.sleep(interval)
+            try:
+                pending = self._poll(pending)
+            except Exception as e:
+                print(f"[ModelRegistry] Watcher error: {e}")
+
+    def _poll(self, pending: Optional[FileSignature]) -> Optional[FileSignature]:
+        """
+        Compara a assinatura atual do arquivo ativo com a última vista. Só
+        recarrega quando a nova assinatura se mantém estável por um ciclo,
+        para não ler um arquivo ainda sendo copiado. Retorna a assinatura
+        pendente para o próximo ciclo.
+        """
+        active = self._active
+        if active is None:
+            return None
+        source = active.source
+        signature = file_signature(source)
+        if signature is None or signature == self._seen.get(source):
+            return None
+        if signature != pending:
+            return signature
+
+        self._seen[source] = signature
+        try:
+            self.load(source)
+        except ModelReloadError:
+            pass
+        return None
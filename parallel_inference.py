@@ -0,0 +1,123 @@
+"""
+Paralelismo dentro de uma requisição para batches grandes.
+
+Batches com pelo menos `min_rows` linhas são divididos em blocos de
+`chunk_rows` linhas, avaliados em um pool de threads do processo, e os
+resultados são concatenados na ordem original. Threads (e não processos)
+porque a travessia do motor compilado e a do scikit-learn passam quase todo
+o tempo em operações NumPy/Cython que liberam o GIL, e porque assim o
+batch não precisa ser copiado para outro processo.
+
+O pool é único por processo e limitado ao orçamento de núcleos do worker:
+requisições simultâneas dividem os mesmos `threads` em vez de cada uma
+abrir os seus. Por padrão o orçamento é o número de CPUs disponíveis ao
+processo dividido pelo número de workers do servidor (`WEB_CONCURRENCY`,
+a mesma variável usada pelo uvicorn e pelo gunicorn), de modo que N
+workers juntos não passam do número de núcleos da máquina.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, Union
+
+import numpy as np
+
+
+ArrayOrTuple = Union[np.ndarray, Tuple[np.ndarray, ...]]
+
+
+def available_cpus() -> int:
+    """CPUs que este processo pode usar (afinidade/cgroup cpuset, se houver)."""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def server_workers() -> int:
+    """Número de processos do servidor declarado em `WEB_CONCURRENCY` (padrão 1)."""
+    try:
+        return max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+
+def worker_core_budget(workers: Optional[int] = None) -> int:
+    """Núcleos por processo do servidor: CPUs disponíveis / workers (mínimo 1)."""
+    return max(1, available_cpus() // (workers or server_workers()))
+
+
+def limit_native_threads(threads: int) -> bool:
+    """
+    Limita os pools nativos (BLAS/OpenMP) do processo a `threads`, para que
+    eles também respeitem o orçamento do worker. Requer `threadpoolctl`
+    (dependência do scikit-learn); sem ele, não faz nada.
+    """
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return False
+    threadpool_limits(limits=threads)
+    return True
+
+
+class ChunkedScorer:
+    """
+    Avalia uma função de pontuação por blocos de linhas em um pool de
+    threads limitado. `fn(X)` deve retornar um array ou uma tupla de arrays
+    com uma linha por linha de `X`.
+    """
+
+    def __init__(self, threads: int, min_rows: int, chunk_rows: int) -> None:
+        self.threads = max(1, int(threads))
+        self.min_rows = max(1, int(min_rows))
+        self.chunk_rows = max(1, int(chunk_rows))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threads > 1
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="score")
+            return self._pool
+
+    def n_chunks(self, n_rows: int) -> int:
+        """Número de blocos em que um batch de `n_rows` linhas é dividido."""
+        if not self.enabled or n_rows < self.min_rows:
+            return 1
+        # Ao menos um bloco por thread, para que todas trabalhem
+        return max(self.threads, -(-n_rows // self.chunk_rows))
+
+    def map_rows(self, fn: Callable[[np.ndarray], ArrayOrTuple], X: np.ndarray) -> ArrayOrTuple:
+        """`fn(X)`, dividido em blocos avaliados em paralelo quando o batch é grande."""
+        n_rows = len(X)
+        n_chunks = self.n_chunks(n_rows)
+        if n_chunks == 1:
+            return fn(X)
+
+        bounds = np.linspace(0, n_rows, n_chunks + 1).astype(np.intp)
+        parts = list(self._executor().map(fn, [X[a:b] for a, b in zip(bounds[:-1], bounds[1:])]))
+        if isinstance(parts[0], tuple):
+            return tuple(np.concatenate(columns) for columns in zip(*parts))
+        return np.concatenate(parts)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def to_dict(self) -> dict:
+        return {
+            "threads": self.threads,
+            "min_rows": self.min_rows,
+            "chunk_rows": self.chunk_rows,
+            "available_cpus": available_cpus(),
+            "server_workers": server_workers(),
+        }
@@ -1,9 +1,18 @@
+import argparse
+import functools
+import os
+import sys
+import time
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingRandomSearchCV)
 from sklearn.model_selection import train_test_split, cross_val_score, GridSearchCV
+from sklearn.model_selection import HalvingRandomSearchCV, ParameterGrid, RandomizedSearchCV, StratifiedKFold
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, roc_curve, auc, roc_auc_score
 from sklearn.metrics import precision_score, recall_score, f1_score
@@ -22,9 +31,252 @@ import xgboost as XGBClassifier
 # Import the outlier removal function
 from outlier import remove_outliers_iqr
 
+# On-disk cache of the expensive stages (see stage_cache.py)
+from stage_cache import StageCache, file_digest
+
+# The compact model format lives at the repository root, next to app.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from compact_model import load_compact_model, save_compact_model
+from data_cache import read_table
+
+RANDOM_STATE = 42
+TEST_SIZE = 0.2
+CLASS_WEIGHTS = {0: 2.5, 1: 1, 2: 1}
+# Classifiers trained with sample weights instead of class_weight
+SAMPLE_WEIGHTED = ['Gradient Boosting', 'XGBoost']
+GRID_SEARCH_CV = 3
+# Hyperparameter search: 'halving' (successive halving over sampled
+# candidates), 'random' or 'grid' (exhaustive)
+SEARCH_MODES = ['halving', 'random', 'grid']
+SEARCH_CANDIDATES = 27
+HALVING_FACTOR = 3
+# Compact artifact read by the API (MODEL_PATH=modelos/Random_Forest_model.npz),
+# written to the repository's modelos/ directory whatever the working directory
+COMPACT_MODEL_PATH = Path(__file__).resolve().parent.parent / 'modelos' / 'Random_Forest_model.npz'
+
+RF_PARAM_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [10, 20, 30, None],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4],
+    'bootstrap': [True, False]
+}
+
+
+# ---------------------------------------------------------
+# Stages
+# Each stage is a plain function of its inputs; the flow below runs them
+# through StageCache, so unchanged stages are loaded from disk.
+# ---------------------------------------------------------
+
+def build_classifiers():
+    """Classifiers to evaluate - using a reduced set for efficiency."""
+    return {
+        'Logistic Regression': LogisticRegression(max_iter=1000, random_state=RANDOM_STATE, class_weight=CLASS_WEIGHTS),
+        'Random Forest': RandomForestClassifier(n_estimators=100, random_state=RANDOM_STATE, class_weight=CLASS_WEIGHTS),
+        'Gradient Boosting': GradientBoostingClassifier(n_estimators=100, random_state=RANDOM_STATE),
+        'XGBoost': XGBClassifier.XGBClassifier(n_estimators=100, random_state=RANDOM_STATE, learning_rate=0.1, use_label_encoder=False, eval_metric='mlogloss'),
+        'Naive Bayes': GaussianNB()
+    }
+
+
+def tuning_space(name):
+    """Base estimator and parameter grid used to fine-tune each classifier."""
+    if name == 'Logistic Regression':
+        param_grid = {
+            'C': [0.01, 0.1, 1, 10, 100],
+            'solver': ['liblinear', 'lbfgs', 'saga'],
+            'penalty': ['l1', 'l2', 'elasticnet', None],
+            'max_iter': [1000, 2000]
+        }
+        return LogisticRegression(random_state=RANDOM_STATE, class_weight=CLASS_WEIGHTS), param_grid
+    if name == 'Random Forest':
+        return RandomForestClassifier(random_state=RANDOM_STATE, class_weight=CLASS_WEIGHTS), RF_PARAM_GRID
+    if name == 'Gradient Boosting':
+        param_grid = {
+            'n_estimators': [50, 100, 200],
+            'learning_rate': [0.01, 0.05, 0.1, 0.2],
+            'max_depth': [3, 5, 7],
+            'min_samples_split': [2, 5],
+            'subsample': [0.8, 1.0]
+        }
+        return GradientBoostingClassifier(random_state=RANDOM_STATE), param_grid
+    if name == 'XGBoost':
+        param_grid = {
+            'n_estimators': [50, 100, 200],
+            'learning_rate': [0.01, 0.05, 0.1, 0.2],
+            'max_depth': [3, 5, 7],
+            'min_child_weight': [1, 3, 5],
+            'subsample': [0.8, 1.0],
+            'colsample_bytree': [0.8, 1.0],
+            'gamma': [0, 0.1, 0.2]
+        }
+        return XGBClassifier.XGBClassifier(random_state=RANDOM_STATE, use_label_encoder=False, eval_metric='mlogloss'), param_grid
+    if name == 'Naive Bayes':
+        param_grid = {
+            'var_smoothing': [1e-11, 1e-10, 1e-9, 1e-8, 1e-7, 1e-6]
+        }
+        return GaussianNB(), param_grid
+    raise ValueError(f"Unknown classifier: {name}")
+
+
+def sample_weights_for(y):
+    """Sample weights based on class weights for Gradient Boosting and XGBoost."""
+    return np.array([CLASS_WEIGHTS[label] for label in y])
+
+
+def fit_classifier(name, clf, X, y):
+    if name in SAMPLE_WEIGHTED:
+        clf.fit(X, y, sample_weight=sample_weights_for(y))
+    else:
+        clf.fit(X, y)
+    return clf
+
+
+def evaluate(y_true, y_pred):
+    return {
+        'Accuracy': accuracy_score(y_true, y_pred),
+        'Precision': precision_score(y_true, y_pred, average='weighted'),
+        'Recall': recall_score(y_true, y_pred, average='weighted'),
+        'F1 Score': f1_score(y_true, y_pred, average='weighted')
+    }
+
+
+def stage_load(path):
+    # Typed columnar cache: same frame as pd.read_csv, without re-parsing the CSV
+    return read_table(path)
+
+
+def stage_split(X, y, test_size, random_state):
+    return train_test_split(X, y, test_size=test_size, random_state=random_state, stratify=y)
+
+
+def stage_outliers(X_train):
+    return remove_outliers_iqr(X_train)
+
+
+def stage_scale(X_train_no_outliers, X_test):
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train_no_outliers)
+    X_test_scaled = scaler.transform(X_test)
+    return scaler, X_train_scaled, X_test_scaled
+
+
+def stage_smote(X_train_scaled, y_train, random_state):
+    smote = SMOTE(random_state=random_state)
+    return smote.fit_resample(X_train_scaled, y_train)
+
+
+def stage_train(name, clf, X_train, y_train, X_test, y_test):
+    clf = fit_classifier(name, clf, X_train, y_train)
+    y_pred = clf.predict(X_test)
+    return {
+        'model': clf,
+        'y_pred': y_pred,
+        'metrics': evaluate(y_test, y_pred),
+        'report': classification_report(y_test, y_pred),
+    }
+
+
+def stage_search(name, estimator, param_grid, X_train, y_train, cv, mode, n_candidates, random_state, n_jobs=-1):
+    # Note: X_train and y_train already have SMOTE applied
+    n_candidates = min(n_candidates, len(ParameterGrid(param_grid)))
+    common = {'cv': cv, 'scoring': 'accuracy', 'n_jobs': n_jobs, 'verbose': 1}
+    if mode == 'grid':
+        search = GridSearchCV(estimator, param_grid, **common)
+    elif mode == 'random':
+        search = RandomizedSearchCV(estimator, param_grid, n_iter=n_candidates, random_state=random_state, **common)
+    elif mode == 'halving':
+        # Candidates start on a small sample of the training set; each round
+        # keeps the best 1/HALVING_FACTOR and multiplies their sample size,
+        # the last round using (almost) the whole set
+        search = HalvingRandomSearchCV(
+            estimator, param_grid, n_candidates=n_candidates, factor=HALVING_FACTOR,
+            min_resources='exhaust', random_state=random_state, **common
+        )
+    else:
+        raise ValueError(f"Unknown search mode: {mode}")
+
+    print(f"Starting {mode} search for {name}...")
+    start = time.perf_counter()
+    if name in SAMPLE_WEIGHTED:
+        search.fit(X_train, y_train, sample_weight=sample_weights_for(y_train))
+    else:
+        search.fit(X_train, y_train)
+    seconds = time.perf_counter() - start
+
+    if mode == 'halving':
+        n_fits = sum(search.n_candidates_) * search.n_splits_
+    else:
+        n_fits = len(search.cv_results_['params']) * search.n_splits_
+    return {
+        'mode': mode,
+        'best_params': search.best_params_,
+        'best_estimator': search.best_estimator_,
+        'best_score': search.best_score_,
+        'cv_results': search.cv_results_,
+        'n_fits': n_fits,
+        'seconds': seconds,
+    }
+
+
+def stage_final(name, best_estimator, X_train, y_train, X_test, y_test):
+    # Train the model with the best parameters
+    best_model = fit_classifier(name, best_estimator, X_train, y_train)
+    y_pred = best_model.predict(X_test)
+    return {'model': best_model, 'y_pred': y_pred, 'metrics': evaluate(y_test, y_pred)}
+
+
+def _estimator_params(estimator):
+    return {'class': type(estimator).__name__, 'params': estimator.get_params()}
+
+
+# ---------------------------------------------------------
+# Command line
+# ---------------------------------------------------------
+
+parser = argparse.ArgumentParser(description="Train and evaluate the growth potential classifiers.")
+parser.add_argument("--data", default="data.csv", help="Input CSV (default: data.csv)")
+parser.add_argument("--cache-dir", default=".pipeline_cache", help="Stage cache directory (default: .pipeline_cache)")
+parser.add_argument("--no-cache", action="store_true", help="Recompute every stage without reading or writing the cache")
+parser.add_argument(
+    "--force",
+    action="append",
+    default=[],
+    help="Recompute a stage even if cached (repeatable; e.g. 'search', 'train', 'all')",
+)
+parser.add_argument("--prune", action="store_true", help="Delete cached results not used by this run")
+parser.add_argument(
+    "--search",
+    choices=SEARCH_MODES,
+    default='halving',
+    help="Hyperparameter search mode (default: halving)",
+)
+parser.add_argument(
+    "--n-candidates",
+    type=int,
+    default=SEARCH_CANDIDATES,
+    help=f"Parameter combinations sampled by the halving and random searches (default: {SEARCH_CANDIDATES})",
+)
+parser.add_argument(
+    "--compare-exhaustive",
+    action="store_true",
+    help="Also run the exhaustive grid search for the best classifier and report the gap",
+)
+parser.add_argument(
+    "--jobs",
+    type=int,
+    default=-1,
+    help="Core budget for training and hyperparameter search (default: -1, all cores)",
+)
+args = parser.parse_args()
+
+cache = StageCache(args.cache_dir, enabled=not args.no_cache, force=args.force)
+
 # Load the data
 print("Loading data...")
-data = pd.read_csv('data.csv')
+data_stage = cache.run("load", functools.partial(stage_load, args.data), deps=[file_digest(args.data)])
+data = data_stage.value
 
 # Display basic information about the dataset
 print("\nDataset Information:")
@@ -39,74 +291,76 @@ X = data.drop(['name', 'country', 'pc_class'], axis=1)
 y = data['pc_class']
 
 # Split the data into training and testing sets
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+split_params = {'test_size': TEST_SIZE, 'random_state': RANDOM_STATE}
+split_stage = cache.run("split", functools.partial(stage_split, X, y, **split_params), params=split_params, deps=[data_stage])
+X_train, X_test, y_train, y_test = split_stage.value
 
 print(f"\nTraining set shape: {X_train.shape}")
 print(f"Testing set shape: {X_test.shape}")
 
 # Apply outlier removal to X_train
 print("\nRemoving outliers from training data...")
-X_train_no_outliers = remove_outliers_iqr(X_train)
+outlier_stage = cache.run(
+    "outliers", functools.partial(stage_outliers, X_train), deps=[split_stage], code=[remove_outliers_iqr]
+)
+X_train_no_outliers = outlier_stage.value
 
 # Standardize the features
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train_no_outliers)
-X_test_scaled = scaler.transform(X_test)
+scale_stage = cache.run(
+    "scale", functools.partial(stage_scale, X_train_no_outliers, X_test), deps=[outlier_stage, split_stage]
+)
+scaler, X_train_scaled, X_test_scaled = scale_stage.value
 
 # Apply SMOTE for oversampling the minority classes
 print("\nApplying SMOTE to balance the classes...")
-smote = SMOTE(random_state=42)
-X_train_scaled, y_train = smote.fit_resample(X_train_scaled, y_train)
+smote_params = {'random_state': RANDOM_STATE}
+smote_stage = cache.run(
+    "smote",
+    functools.partial(stage_smote, X_train_scaled, y_train, **smote_params),
+    params=smote_params,
+    deps=[scale_stage, split_stage],
+)
+X_train_scaled, y_train = smote_stage.value
 print(f"After SMOTE - Training data shape: {X_train_scaled.shape}")
 print(f"After SMOTE - Target distribution:\n{pd.Series(y_train).value_counts()}")
 
 # Define classifiers to evaluate - using a reduced set for efficiency
-classifiers = {
-    'Logistic Regression': LogisticRegression(max_iter=1000, random_state=42, class_weight={0: 2.5, 1: 1, 2: 1}),
-    'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42, class_weight={0: 2.5, 1: 1, 2: 1}),
-    'Gradient Boosting': GradientBoostingClassifier(n_estimators=100, random_state=42),
-    'XGBoost': XGBClassifier.XGBClassifier(n_estimators=100, random_state=42, learning_rate=0.1, use_label_encoder=False, eval_metric='mlogloss'),
-    'Naive Bayes': GaussianNB()
-}
+classifiers = build_classifiers()
 
-# Train and evaluate each classifier
+# Train and evaluate the classifiers concurrently within the core budget (one
+# cached stage per classifier, so an interrupted run resumes where it stopped).
+# Results are reported in the original order once all of them are done.
 results = {}
 metrics_results = {}
 print("\nTraining and evaluating classifiers...")
 
-for name, clf in classifiers.items():
-    print(f"\nTraining {name}...")
-
-    # Train the classifier
-    if name in ['Gradient Boosting', 'XGBoost']:
-        # Create sample weights based on class weights for Gradient Boosting and XGBoost
-        class_weights = {0: 2.5, 1: 1, 2: 1}
-        sample_weights = np.array([class_weights[y] for y in y_train])
-        clf.fit(X_train_scaled, y_train, sample_weight=sample_weights)
-    else:
-        clf.fit(X_train_scaled, y_train)
-
-    # Make predictions
-    y_pred = clf.predict(X_test_scaled)
+train_stages = cache.run_many(
+    [
+        {
+            'name': f"train-{name.replace(' ', '_')}",
+            'fn': functools.partial(stage_train, name, clf, X_train_scaled, y_train, X_test_scaled, y_test),
+            'params': {'name': name, 'estimator': _estimator_params(clf), 'class_weights': CLASS_WEIGHTS},
+            'deps': [smote_stage, scale_stage, split_stage],
+            'code': [fit_classifier, evaluate, sample_weights_for],
+        }
+        for name, clf in classifiers.items()
+    ],
+    n_jobs=args.jobs,
+)
 
-    # Calculate metrics
-    accuracy = accuracy_score(y_test, y_pred)
-    precision = precision_score(y_test, y_pred, average='weighted')
-    recall = recall_score(y_test, y_pred, average='weighted')
-    f1 = f1_score(y_test, y_pred, average='weighted')
+for name, train_stage in zip(list(classifiers), train_stages):
+    print(f"\nTraining {name}...")
+    trained = train_stage.value
+    classifiers[name] = trained['model']
+    metrics = trained['metrics']
 
     # Store all metrics
-    results[name] = accuracy
-    metrics_results[name] = {
-        'Accuracy': accuracy,
-        'Precision': precision,
-        'Recall': recall,
-        'F1 Score': f1
-    }
+    results[name] = metrics['Accuracy']
+    metrics_results[name] = metrics
 
     # Print results
-    print(f"{name} Accuracy: {accuracy:.4f}, Precision: {precision:.4f}, Recall: {recall:.4f}, F1 Score: {f1:.4f}")
-    print(f"Classification Report:\n{classification_report(y_test, y_pred)}")
+    print(f"{name} Accuracy: {metrics['Accuracy']:.4f}, Precision: {metrics['Precision']:.4f}, Recall: {metrics['Recall']:.4f}, F1 Score: {metrics['F1 Score']:.4f}")
+    print(f"Classification Report:\n{trained['report']}")
 
     # We'll only generate visualizations for the best model later
 
@@ -116,66 +370,72 @@ print(f"\nBest classifier: {best_classifier} with accuracy: {results[best_classi
 
 # Fine-tune the best classifier with more extensive parameter grids
 print(f"\nFine-tuning {best_classifier}...")
+best_clf, param_grid = tuning_space(best_classifier)
 
-if best_classifier == 'Logistic Regression':
-    param_grid = {
-        'C': [0.01, 0.1, 1, 10, 100],
-        'solver': ['liblinear', 'lbfgs', 'saga'],
-        'penalty': ['l1', 'l2', 'elasticnet', None],
-        'max_iter': [1000, 2000]
-    }
-    best_clf = LogisticRegression(random_state=42, class_weight={0: 2.5, 1: 1, 2: 1})
-elif best_classifier == 'Random Forest':
-    param_grid = {
-        'n_estimators': [50, 100, 200],
-        'max_depth': [10, 20, 30, None],
-        'min_samples_split': [2, 5, 10],
-        'min_samples_leaf': [1, 2, 4],
-        'bootstrap': [True, False]
-    }
-    best_clf = RandomForestClassifier(random_state=42, class_weight={0: 2.5, 1: 1, 2: 1})
-elif best_classifier == 'Gradient Boosting':
-    param_grid = {
-        'n_estimators': [50, 100, 200],
-        'learning_rate': [0.01, 0.05, 0.1, 0.2],
-        'max_depth': [3, 5, 7],
-        'min_samples_split': [2, 5],
-        'subsample': [0.8, 1.0]
-    }
-    best_clf = GradientBoostingClassifier(random_state=42)
-elif best_classifier == 'XGBoost':
-    param_grid = {
-        'n_estimators': [50, 100, 200],
-        'learning_rate': [0.01, 0.05, 0.1, 0.2],
-        'max_depth': [3, 5, 7],
-        'min_child_weight': [1, 3, 5],
-        'subsample': [0.8, 1.0],
-        'colsample_bytree': [0.8, 1.0],
-        'gamma': [0, 0.1, 0.2]
-    }
-    best_clf = XGBClassifier.XGBClassifier(random_state=42, use_label_encoder=False, eval_metric='mlogloss')
-elif best_classifier == 'Naive Bayes':
-    param_grid = {
-        'var_smoothing': [1e-11, 1e-10, 1e-9, 1e-8, 1e-7, 1e-6]
+
+# The same fold splits (and the cached SMOTE output) are used by every search
+# of the run, so scores are comparable across classifiers and search modes
+cv_folds = StratifiedKFold(n_splits=GRID_SEARCH_CV)
+
+
+def run_search(name, estimator, grid, mode=args.search):
+    search_params = {
+        'mode': mode,
+        'n_candidates': args.n_candidates if mode != 'grid' else None,
+        'random_state': RANDOM_STATE if mode != 'grid' else None,
     }
-    best_clf = GaussianNB()
-
-# Perform grid search with reduced CV folds and parallel processing
-# Note: X_train_scaled and y_train already have SMOTE applied
-grid_search = GridSearchCV(best_clf, param_grid, cv=3, scoring='accuracy', n_jobs=-1, verbose=1)
-print(f"Starting grid search for {best_classifier}...")
-
-# Apply sample weights for Gradient Boosting and XGBoost
-if best_classifier in ['Gradient Boosting', 'XGBoost']:
-    # Create sample weights based on class weights
-    class_weights = {0: 2.5, 1: 1, 2: 1}
-    sample_weights = np.array([class_weights[y] for y in y_train])
-    grid_search.fit(X_train_scaled, y_train, sample_weight=sample_weights)
-else:
-    grid_search.fit(X_train_scaled, y_train)
+    return cache.run(
+        f"search-{mode}-{name.replace(' ', '_')}",
+        functools.partial(
+            stage_search, name, estimator, grid, X_train_scaled, y_train, cv_folds,
+            mode, args.n_candidates, RANDOM_STATE, n_jobs=args.jobs
+        ),
+        params={
+            'name': name,
+            'estimator': _estimator_params(estimator),
+            'param_grid': grid,
+            'cv': repr(cv_folds),
+            'class_weights': CLASS_WEIGHTS,
+            **search_params,
+        },
+        deps=[smote_stage],
+        code=[sample_weights_for],
+    ).value
+
+
+search = run_search(best_classifier, best_clf, param_grid)
+print(
+    f"{args.search.capitalize()} search: best CV accuracy {search['best_score']:.4f} "
+    f"({search['n_fits']} fits, {search['seconds']:.1f}s)"
+)
+
+if args.compare_exhaustive and args.search != 'grid':
+    # How close the budgeted search gets to the exhaustive grid (cached like
+    # any other stage, so the reference is only computed once)
+    print(f"\nRunning exhaustive grid search for {best_classifier} as reference...")
+    exhaustive = run_search(best_classifier, best_clf, param_grid, mode='grid')
+    comparison = pd.DataFrame([
+        {
+            'search': result['mode'],
+            'best_cv_accuracy': result['best_score'],
+            'test_accuracy': accuracy_score(y_test, result['best_estimator'].predict(X_test_scaled)),
+            'fits': result['n_fits'],
+            'seconds': result['seconds'],
+            'best_params': result['best_params'],
+        }
+        for result in (search, exhaustive)
+    ])
+    print(f"\nSearch comparison ({best_classifier}):\n{comparison.drop(columns='best_params').to_string(index=False)}")
+    print(
+        f"CV accuracy gap: {exhaustive['best_score'] - search['best_score']:+.4f}, "
+        f"speedup: {exhaustive['seconds'] / max(search['seconds'], 1e-9):.1f}x "
+        f"({exhaustive['n_fits'] / search['n_fits']:.1f}x fewer fits)"
+    )
+    comparison.to_csv('search_comparison.csv', index=False)
+    print("Search comparison saved to 'search_comparison.csv'")
 
 # Get the best parameters
-best_params = grid_search.best_params_
+best_params = search['best_params']
 print(f"Best parameters: {best_params}")
 
 # Save the hyperparameters to a CSV file
@@ -188,19 +448,11 @@ if best_classifier == 'Random Forest':
     params_df.to_csv('random_forest_hyperparameters.csv', index=False)
     print("\nRandom Forest hyperparameters saved to 'random_forest_hyperparameters.csv'")
 else:
-    # If Random Forest is not the best classifier, perform a separate grid search for Random Forest
-    print("\nPerforming grid search for Random Forest to save its hyperparameters...")
-    rf_param_grid = {
-        'n_estimators': [50, 100, 200],
-        'max_depth': [10, 20, 30, None],
-        'min_samples_split': [2, 5, 10],
-        'min_samples_leaf': [1, 2, 4],
-        'bootstrap': [True, False]
-    }
-    rf_clf = RandomForestClassifier(random_state=42, class_weight={0: 2.5, 1: 1, 2: 1})
-    rf_grid_search = GridSearchCV(rf_clf, rf_param_grid, cv=3, scoring='accuracy', n_jobs=-1, verbose=1)
-    rf_grid_search.fit(X_train_scaled, y_train)
-    rf_best_params = rf_grid_search.best_params_
+    # If Random Forest is not the best classifier, perform a separate search for Random Forest
+    print(f"\nPerforming {args.search} search for Random Forest to save its hyperparameters...")
+    rf_clf, rf_param_grid = tuning_space('Random Forest')
+    rf_search = run_search('Random Forest', rf_clf, rf_param_grid)
+    rf_best_params = rf_search['best_params']
     print(f"Random Forest best parameters: {rf_best_params}")
     # Convert the best parameters to a DataFrame
     params_df = pd.DataFrame([rf_best_params])
@@ -209,23 +461,21 @@ else:
     print("\nRandom Forest hyperparameters saved to 'random_forest_hyperparameters.csv'")
 
 # Train the model with the best parameters
-best_model = grid_search.best_estimator_
-
-# Apply sample weights for Gradient Boosting and XGBoost
-if best_classifier in ['Gradient Boosting', 'XGBoost']:
-    # Create sample weights based on class weights
-    class_weights = {0: 2.5, 1: 1, 2: 1}
-    sample_weights = np.array([class_weights[y] for y in y_train])
-    best_model.fit(X_train_scaled, y_train, sample_weight=sample_weights)
-else:
-    best_model.fit(X_train_scaled, y_train)
+final_stage = cache.run(
+    f"final-{best_classifier.replace(' ', '_')}",
+    functools.partial(stage_final, best_classifier, search['best_estimator'], X_train_scaled, y_train, X_test_scaled, y_test),
+    params={'name': best_classifier, 'best_params': best_params, 'class_weights': CLASS_WEIGHTS},
+    deps=[smote_stage, scale_stage, split_stage],
+    code=[fit_classifier, evaluate, sample_weights_for],
+)
+best_model = final_stage.value['model']
 
 # Evaluate the fine-tuned model with multiple metrics
-y_pred = best_model.predict(X_test_scaled)
-accuracy = accuracy_score(y_test, y_pred)
-precision = precision_score(y_test, y_pred, average='weighted')
-recall = recall_score(y_test, y_pred, average='weighted')
-f1 = f1_score(y_test, y_pred, average='weighted')
+y_pred = final_stage.value['y_pred']
+accuracy = final_stage.value['metrics']['Accuracy']
+precision = final_stage.value['metrics']['Precision']
+recall = final_stage.value['metrics']['Recall']
+f1 = final_stage.value['metrics']['F1 Score']
 
 print(f"\nFine-tuned {best_classifier} Metrics:")
 print(f"Accuracy: {accuracy:.4f}")
@@ -234,6 +484,23 @@ print(f"Recall: {recall:.4f}")
 print(f"F1 Score: {f1:.4f}")
 print(f"Classification Report:\n{classification_report(y_test, y_pred)}")
 
+# Export the Random Forest served by the API as one compact artifact: fitted
+# scaler, feature order and trees (float32 thresholds, quantized leaf values),
+# so serving always applies the same preprocessing as training
+rf_model = best_model if best_classifier == 'Random Forest' else rf_search['best_estimator']
+COMPACT_MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
+save_compact_model(rf_model, COMPACT_MODEL_PATH, scaler=scaler, feature_names=X.columns)
+compact_model = load_compact_model(COMPACT_MODEL_PATH)
+# The compact model takes raw features and applies the scaler itself
+compact_pred = compact_model.predict(X_test[list(compact_model.feature_names_in_)].to_numpy(dtype=np.float64))
+rf_pred = rf_model.predict(X_test_scaled)
+compact_delta = accuracy_score(y_test, compact_pred) - accuracy_score(y_test, rf_pred)
+print(
+    f"\nCompact Random Forest saved to '{COMPACT_MODEL_PATH}' "
+    f"({os.path.getsize(COMPACT_MODEL_PATH):,} bytes, prediction agreement "
+    f"{np.mean(compact_pred == rf_pred):.4f}, accuracy delta {compact_delta:+.4f})"
+)
+
 # Save predictions to CSV file
 # Get the indices of the test set
 test_indices = X_test.index
@@ -669,4 +936,9 @@ print("\nRequired libraries for these visualizations:")
 for lib in required_libraries:
     print(f"- {lib}")
 
+print("\nStage summary:")
+print(cache.summary())
+if args.prune and cache.enabled:
+    print(f"Pruned {cache.prune()} unused cached result(s)")
+
 print("\nClassification pipeline completed successfully!")
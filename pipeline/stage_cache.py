@@ -0,0 +1,231 @@
+"""
+On-disk cache for the stages of the classification pipeline.
+
+Each stage result is stored under a key derived from:
+- the stage name
+- the source code of the stage function (plus any helper functions given)
+- the stage parameters, serialized canonically
+- the keys of the stages it depends on (or the hash of the input data file)
+
+Changing the CSV, a parameter or the code of a stage therefore invalidates
+that stage and everything downstream, while unchanged stages load straight
+from disk. Results are written atomically (temporary file + rename), so an
+interrupted run resumes from the last finished stage.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple, Union
+
+import joblib
+from joblib import Parallel, delayed, effective_n_jobs, parallel_config
+
+
+KEY_SIZE = 16
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    """Content hash of a file (e.g. the input CSV)."""
+    h = hashlib.blake2b(digest_size=KEY_SIZE)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def code_digest(*functions: Callable) -> str:
+    """Hash of the source code of the given functions."""
+    h = hashlib.blake2b(digest_size=KEY_SIZE)
+    for fn in functions:
+        while isinstance(fn, functools.partial):
+            fn = fn.func
+        try:
+            source = inspect.getsource(fn)
+        except (OSError, TypeError):
+            source = f"{getattr(fn, '__module__', '')}.{getattr(fn, '__qualname__', repr(fn))}"
+        h.update(source.encode())
+    return h.hexdigest()
+
+
+def _canonical(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, default=repr)
+
+
+# Sentinel for "not in the cache" (None is a valid stage result)
+_MISSING = object()
+
+
+def _timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+class StageResult:
+    """Value of a stage plus the key downstream stages depend on."""
+
+    def __init__(self, name: str, key: str, value: Any, cached: bool, seconds: float) -> None:
+        self.name = name
+        self.key = key
+        self.value = value
+        self.cached = cached
+        self.seconds = seconds
+
+
+class StageCache:
+    """
+    Runs pipeline stages, reusing results stored in `directory`.
+
+    `force` lists stage names (or prefixes, e.g. "train") to recompute even
+    when cached; "all" recomputes everything. With `enabled=False` nothing
+    is read or written.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = ".pipeline_cache",
+        enabled: bool = True,
+        force: Iterable[str] = (),
+    ) -> None:
+        self.directory = Path(directory)
+        self.enabled = enabled
+        self.force = set(force)
+        self.results: list = []
+
+    def key(self, name: str, params: Optional[dict], deps: Sequence[Union[str, StageResult]], code: str) -> str:
+        h = hashlib.blake2b(digest_size=KEY_SIZE)
+        h.update(name.encode())
+        h.update(code.encode())
+        h.update(_canonical(params or {}).encode())
+        for dep in deps:
+            h.update((dep.key if isinstance(dep, StageResult) else str(dep)).encode())
+        return h.hexdigest()
+
+    def path(self, name: str, key: str) -> Path:
+        return self.directory / f"{name}-{key}.joblib"
+
+    def _forced(self, name: str) -> bool:
+        return "all" in self.force or any(name == f or name.startswith(f + "-") for f in self.force)
+
+    def run(
+        self,
+        name: str,
+        fn: Callable[[], Any],
+        params: Optional[dict] = None,
+        deps: Sequence[Union[str, StageResult]] = (),
+        code: Sequence[Callable] = (),
+    ) -> StageResult:
+        """
+        Returns the result of `fn()` for this stage, from the cache when the
+        key matches. `params` only feed the key: bind them into `fn` (e.g.
+        with `functools.partial`).
+        """
+        key = self.key(name, params, deps, code_digest(fn, *code))
+        start = time.perf_counter()
+        cached = self._load(name, key)
+        if cached is not _MISSING:
+            return self._record(name, key, cached, True, time.perf_counter() - start)
+
+        value, seconds = _timed(fn)
+        self._store(name, key, value)
+        return self._record(name, key, value, False, seconds)
+
+    def run_many(
+        self,
+        stages: Sequence[dict],
+        n_jobs: int = -1,
+        max_nbytes: Optional[str] = "1M",
+    ) -> List[StageResult]:
+        """
+        Runs independent stages concurrently in a pool of `n_jobs` processes
+        (-1: all cores). Each item of `stages` holds the keyword arguments of
+        `run` (name, fn, params, deps, code). Cached stages are loaded in this
+        process; only the missing ones go to the pool.
+
+        Numpy arrays bigger than `max_nbytes` are dumped once to a memory
+        mapped file and shared read-only with every worker instead of being
+        pickled into each task. BLAS/OpenMP threads inside the workers are
+        limited so the pool as a whole stays within `n_jobs` cores.
+
+        Results come back in the order of `stages`.
+        """
+        budget = effective_n_jobs(n_jobs)
+        outcomes: List[Optional[tuple]] = [None] * len(stages)
+        missing = []
+        for i, stage in enumerate(stages):
+            name, fn = stage["name"], stage["fn"]
+            key = self.key(name, stage.get("params"), stage.get("deps", ()), code_digest(fn, *stage.get("code", ())))
+            start = time.perf_counter()
+            cached = self._load(name, key)
+            if cached is _MISSING:
+                missing.append((i, name, key, fn))
+            else:
+                outcomes[i] = (name, key, cached, True, time.perf_counter() - start)
+
+        if missing:
+            workers = min(budget, len(missing))
+            print(f"[StageCache] Computing {len(missing)} stage(s) on {workers} worker(s) ({budget} core budget)")
+            if workers == 1:
+                outputs = [_timed(fn) for _, _, _, fn in missing]
+            else:
+                with parallel_config(backend="loky", inner_max_num_threads=max(1, budget // workers)):
+                    outputs = Parallel(n_jobs=workers, max_nbytes=max_nbytes, mmap_mode="r")(
+                        delayed(_timed)(fn) for _, _, _, fn in missing
+                    )
+            for (i, name, key, _), (value, seconds) in zip(missing, outputs):
+                self._store(name, key, value)
+                outcomes[i] = (name, key, value, False, seconds)
+
+        # Logged in input order, like sequential runs
+        return [self._record(*outcome) for outcome in outcomes]
+
+    def _load(self, name: str, key: str) -> Any:
+        path = self.path(name, key)
+        if not self.enabled or self._forced(name) or not path.exists():
+            return _MISSING
+        try:
+            return joblib.load(path)
+        except Exception as e:
+            print(f"[{name}] Cached result unreadable ({e}), recomputing")
+            return _MISSING
+
+    def _store(self, name: str, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        path = self.path(name, key)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        joblib.dump(value, tmp_path)
+        os.replace(tmp_path, path)
+
+    def _record(self, name: str, key: str, value: Any, cached: bool, seconds: float) -> StageResult:
+        result = StageResult(name, key, value, cached, seconds)
+        if cached:
+            print(f"[{name}] Loaded from cache in {seconds:.2f}s ({key[:8]})")
+        else:
+            print(f"[{name}] Computed in {seconds:.2f}s ({key[:8]})")
+        self.results.append(result)
+        return result
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<36}{'source':<10}{'seconds':>10}"]
+        for result in self.results:
+            lines.append(f"{result.name:<36}{'cache' if result.cached else 'computed':<10}{result.seconds:>10.2f}")
+        return "\n".join(lines)
+
+    def prune(self) -> int:
+        """Removes cached results not used by this run; returns how many."""
+        used = {self.path(r.name, r.key) for r in self.results}
+        removed = 0
+        for path in self.directory.glob("*.joblib"):
+            if path not in used:
+                path.unlink()
+                removed += 1
+        return removed
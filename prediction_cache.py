@@ -0,0 +1,102 @@
+"""
+Cache em processo de previsões por vetor de features.
+
+A chave é um hash do vetor de 15 features (em float64) combinado com a
+versão do modelo, de modo que trocar o modelo invalida naturalmente as
+entradas antigas. A capacidade é limitada (LRU) e cada entrada expira após
+`ttl_seconds`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+CachedPrediction = Tuple[int, np.ndarray]
+
+
+def row_keys(X: np.ndarray, model_version: str) -> List[bytes]:
+    """
+    Calcula a chave de cache de cada linha de `X` para a versão de modelo dada.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    prefix = hashlib.blake2b(model_version.encode(), digest_size=16)
+    keys = []
+    for row in X:
+        h = prefix.copy()
+        h.update(row.tobytes())
+        keys.append(h.digest())
+    return keys
+
+
+class PredictionCache:
+    """
+    Cache LRU com expiração por TTL, seguro para uso entre threads.
+    """
+
+    def __init__(self, max_entries: int = 100_000, ttl_seconds: float = 3600.0) -> None:
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = float(ttl_seconds)
+        self._entries: "OrderedDict[bytes, Tuple[float, int, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[CachedPrediction]]:
+        """
+        Retorna `(classe, probabilidades)` para cada chave presente e válida,
+        ou None para as ausentes/expiradas.
+        """
+        now = time.monotonic()
+        results: List[Optional[CachedPrediction]] = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] < now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    results.append((entry[1], entry[2]))
+        return results
+
+    def put_many(self, keys: Sequence[bytes], preds: np.ndarray, probas: np.ndarray) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, pred, proba in zip(keys, preds, probas):
+                self._entries[key] = (expires_at, int(pred), np.array(proba, copy=True))
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,217 @@
+"""
+Universo de referência pontuado e índices ordenados para consultas de ranking.
+
+O universo (por padrão `dados/data.csv`) é avaliado uma única vez por versão
+do modelo. Para cada classe, as linhas ficam ordenadas por probabilidade
+decrescente, no universo inteiro e dentro de cada país, junto com as colunas
+usadas nos filtros (`marketcap`, `revenue_ttm`) já na mesma ordem. Uma
+consulta top-K é então um recorte do índice certo, com no máximo uma máscara
+vetorizada para os intervalos, sem ordenar nada no momento da requisição.
+
+O índice também guarda a matriz de features do universo (quando informada)
+e as linhas de cada país, usadas pelos cenários de choque macro
+(`scenarios.py`) como linha de base já pontuada.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from macro_store import UnknownCountryError
+
+
+# Colunas do universo guardadas no índice (além das probabilidades)
+UNIVERSE_COLUMNS = ["name", "country", "marketcap", "revenue_ttm"]
+
+_Range = Tuple[Optional[float], Optional[float]]
+
+
+class _SortedGroup:
+    """Linhas de um grupo (país ou universo) em ordem decrescente de probabilidade."""
+
+    __slots__ = ("rows", "proba", "marketcap", "revenue")
+
+    def __init__(self, rows: np.ndarray, proba: np.ndarray, marketcap: np.ndarray, revenue: np.ndarray) -> None:
+        self.rows = rows
+        self.proba = proba
+        self.marketcap = marketcap
+        self.revenue = revenue
+
+
+def _in_range(values: np.ndarray, bounds: _Range, mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    low, high = bounds
+    if low is not None:
+        mask = values >= low if mask is None else mask & (values >= low)
+    if high is not None:
+        mask = values <= high if mask is None else mask & (values <= high)
+    return mask
+
+
+class RankingIndex:
+    """
+    Probabilidades do universo de referência com índices ordenados por
+    classe, para o universo inteiro e para cada país.
+    """
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        countries: Sequence[str],
+        marketcap: np.ndarray,
+        revenue: np.ndarray,
+        proba: np.ndarray,
+        labels: Sequence[str],
+        version: str = "",
+        features: Optional[np.ndarray] = None,
+    ) -> None:
+        self.names = np.asarray(names, dtype=object)
+        self.country_of = np.asarray(countries, dtype=object)
+        self.marketcap = np.asarray(marketcap, dtype=np.float64)
+        self.revenue = np.asarray(revenue, dtype=np.float64)
+        self.proba = np.ascontiguousarray(proba, dtype=np.float64)
+        self.labels = list(labels)
+        self.version = version
+        self.predicted = np.argmax(self.proba, axis=1)
+        self.countries = sorted(set(self.country_of.tolist()))
+        self.features = None if features is None else np.ascontiguousarray(features, dtype=np.float64)
+        self.rows_by_country = {country: np.flatnonzero(self.country_of == country) for country in self.countries}
+
+        # (país ou None, classe) -> grupo ordenado
+        self._groups: Dict[Tuple[Optional[str], int], _SortedGroup] = {}
+        for c in range(len(self.labels)):
+            # Ordenação estável: empates mantêm a ordem do universo
+            order = np.argsort(-self.proba[:, c], kind="stable")
+            self._groups[(None, c)] = self._group(order, c)
+            country_sorted = self.country_of[order]
+            for country in self.countries:
+                self._groups[(country, c)] = self._group(order[country_sorted == country], c)
+
+    def _group(self, rows: np.ndarray, c: int) -> _SortedGroup:
+        return _SortedGroup(
+            rows,
+            np.ascontiguousarray(self.proba[rows, c]),
+            np.ascontiguousarray(self.marketcap[rows]),
+            np.ascontiguousarray(self.revenue[rows]),
+        )
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        proba: np.ndarray,
+        labels: Sequence[str],
+        version: str = "",
+        feature_order: Optional[Sequence[str]] = None,
+    ) -> "RankingIndex":
+        """
+        Índice a partir do universo (`UNIVERSE_COLUMNS`) e das probabilidades
+        de cada linha; com `feature_order`, guarda também a matriz de features.
+        """
+        missing = [c for c in UNIVERSE_COLUMNS if c not in df.columns]
+        if missing:
+            raise ValueError(f"Colunas ausentes no universo de ranking: {missing}")
+        return cls(
+            df["name"].astype(str).to_numpy(),
+            df["country"].astype(str).to_numpy(),
+            df["marketcap"].to_numpy(dtype=np.float64),
+            df["revenue_ttm"].to_numpy(dtype=np.float64),
+            proba,
+            labels,
+            version,
+            None if feature_order is None else df[list(feature_order)].to_numpy(dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        return int(self.proba.shape[0])
+
+    # -----------------------------------------------------
+    # Consultas
+    # -----------------------------------------------------
+
+    def _select(
+        self, potential: str, country: Optional[str], marketcap: _Range, revenue: _Range
+    ) -> Tuple[int, np.ndarray, np.ndarray]:
+        """Classe, linhas e probabilidades (decrescentes) do grupo filtrado."""
+        c = self.labels.index(potential)
+        group = self._groups.get((country, c))
+        if group is None:
+            raise UnknownCountryError([country])
+        mask = _in_range(group.marketcap, marketcap, None)
+        mask = _in_range(group.revenue, revenue, mask)
+        if mask is None:
+            return c, group.rows, group.proba
+        return c, group.rows[mask], group.proba[mask]
+
+    def top(
+        self,
+        potential: str,
+        k: int,
+        country: Optional[str] = None,
+        marketcap: _Range = (None, None),
+        revenue: _Range = (None, None),
+        min_percentile: Optional[float] = None,
+    ) -> Tuple[int, List[dict]]:
+        """
+        As `k` empresas com maior probabilidade de `potential` no grupo
+        filtrado, e o tamanho do grupo. `percentile` de cada item é a fração
+        do grupo com probabilidade menor ou igual (100 = a maior);
+        `min_percentile` descarta os itens abaixo desse percentil.
+        """
+        c, rows, proba = self._select(potential, country, marketcap, revenue)
+        n = len(rows)
+        head_rows = rows[:k]
+        # Probabilidades decrescentes: posição na ordem crescente por busca binária
+        ascending = proba[::-1]
+        percentiles = 100.0 * np.searchsorted(ascending, proba[:k], side="right") / max(n, 1)
+        if min_percentile is not None:
+            keep = int(np.count_nonzero(percentiles >= min_percentile))
+            head_rows, percentiles = head_rows[:keep], percentiles[:keep]
+
+        items = []
+        for rank, (row, percentile) in enumerate(zip(head_rows.tolist(), percentiles.tolist()), start=1):
+            probs = self.proba[row]
+            items.append({
+                "rank": rank,
+                "name": self.names[row],
+                "country": self.country_of[row],
+                "marketcap": float(self.marketcap[row]),
+                "revenue_ttm": float(self.revenue[row]),
+                "predicted_potential": self.labels[int(self.predicted[row])],
+                "probability": float(probs[c]),
+                "percentile": percentile,
+                **{f"prob_{label.lower()}": float(p) for label, p in zip(self.labels, probs.tolist())},
+            })
+        return n, items
+
+    def percentile(
+        self,
+        potential: str,
+        prob: Optional[float] = None,
+        q: Optional[float] = None,
+        country: Optional[str] = None,
+        marketcap: _Range = (None, None),
+        revenue: _Range = (None, None),
+    ) -> dict:
+        """
+        No grupo filtrado: percentil de uma probabilidade `prob` (fração do
+        grupo com probabilidade menor ou igual) e/ou a probabilidade no
+        percentil `q` (interpolação linear, como `np.percentile`).
+        """
+        _, _, proba = self._select(potential, country, marketcap, revenue)
+        n = len(proba)
+        result = {"count": n, "prob": prob, "percentile": None, "q": q, "prob_at_q": None}
+        if n == 0:
+            return result
+        ascending = proba[::-1]
+        if prob is not None:
+            result["percentile"] = 100.0 * int(np.searchsorted(ascending, prob, side="right")) / n
+        if q is not None:
+            # Já ordenado: interpolação linear direta, sem o sort do `np.percentile`
+            position = q / 100.0 * (n - 1)
+            low = int(np.floor(position))
+            high = min(low + 1, n - 1)
+            result["prob_at_q"] = float(ascending[low] + (ascending[high] - ascending[low]) * (position - low))
+        return result
@@ -0,0 +1,180 @@
+"""
+Cenários de choque macro por país sobre o universo de referência.
+
+Um cenário é uma lista de choques `(país, feature macro, delta ou valor)`,
+ex.: "juros do Brasil +3 p.p.". As colunas macro são as mesmas para todas
+as empresas de um país, então um choque só altera as linhas desse país:
+apenas elas são reavaliadas, e as demais reaproveitam as probabilidades já
+calculadas para o universo na carga do modelo (`RankingIndex`). Choques em
+uma taxa também atualizam a coluna espelhada (ex.: `interest_rate =
+-interest_rate_percent`), como no dataset de treino.
+
+O resultado traz, por país afetado, a matriz de migração entre classes
+(linha de base -> cenário) e a variação média das probabilidades; por
+empresa, as probabilidades do cenário e a variação em relação à base.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from macro_store import MACRO_FEATURES, UnknownCountryError, mirrored_feature
+from rankings import RankingIndex
+
+
+ScoreFn = Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+
+class ScenarioError(ValueError):
+    """Cenário inválido (feature não macro, choque duplicado ou ambíguo)."""
+
+
+class MacroShock:
+    """Choque em uma feature macro de um país: soma `delta` ou fixa `value`."""
+
+    __slots__ = ("country", "feature", "delta", "value")
+
+    def __init__(self, country: str, feature: str, delta: Optional[float] = None, value: Optional[float] = None) -> None:
+        if (delta is None) == (value is None):
+            raise ScenarioError(f"Choque em {country}/{feature}: informe exatamente um de `delta` ou `value`.")
+        self.country = country
+        self.feature = feature
+        self.delta = delta
+        self.value = value
+
+    def apply(self, column: np.ndarray) -> np.ndarray:
+        if self.value is not None:
+            return np.full_like(column, self.value)
+        return column + self.delta
+
+
+def scenario_matrix(
+    index: RankingIndex, feature_order: Sequence[str], shocks: Sequence[MacroShock], link_mirrored: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Linhas do universo alteradas pelo cenário e as suas features depois dos
+    choques. Linhas de países chocados cujas features não mudam (ex.: delta
+    zero) ficam de fora.
+    """
+    if index.features is None:
+        raise ScenarioError("O universo de referência não guarda as features.")
+    unknown = sorted({shock.country for shock in shocks if shock.country not in index.rows_by_country})
+    if unknown:
+        raise UnknownCountryError(unknown)
+
+    by_country: Dict[str, List[MacroShock]] = {}
+    for shock in shocks:
+        if shock.feature not in MACRO_FEATURES:
+            raise ScenarioError(f"`{shock.feature}` não é uma feature macro. Use uma de {MACRO_FEATURES}.")
+        by_country.setdefault(shock.country, []).append(shock)
+
+    rows, blocks = [], []
+    for country, country_shocks in by_country.items():
+        country_rows = index.rows_by_country[country]
+        baseline = index.features[country_rows]
+        block = baseline.copy()
+        written = set()
+        for shock in country_shocks:
+            column = feature_order.index(shock.feature)
+            mirror = mirrored_feature(shock.feature) if link_mirrored else None
+            columns = [column] + ([feature_order.index(mirror)] if mirror in feature_order else [])
+            if written & set(columns):
+                raise ScenarioError(
+                    f"Mais de um choque em {country}/{shock.feature} (colunas espelhadas variam juntas com `link_mirrored`)."
+                )
+            written.update(columns)
+            block[:, column] = shock.apply(block[:, column])
+            if len(columns) > 1:
+                block[:, columns[1]] = -block[:, column]
+        changed = np.any(block != baseline, axis=1)
+        rows.append(country_rows[changed])
+        blocks.append(block[changed])
+
+    if not rows:
+        return np.empty(0, dtype=np.intp), np.empty((0, len(feature_order)), dtype=np.float64)
+    return np.concatenate(rows), np.concatenate(blocks)
+
+
+class ScenarioResult:
+    """Probabilidades de base e do cenário para as linhas alteradas do universo."""
+
+    def __init__(self, index: RankingIndex, rows: np.ndarray, proba: np.ndarray) -> None:
+        self.index = index
+        self.rows = rows
+        self.baseline_proba = index.proba[rows]
+        self.proba = np.asarray(proba, dtype=np.float64)
+        self.baseline_class = index.predicted[rows]
+        self.scenario_class = np.argmax(self.proba, axis=1) if len(rows) else np.empty(0, dtype=np.intp)
+        self.delta = self.proba - self.baseline_proba
+
+    @property
+    def rescored_rows(self) -> int:
+        return int(len(self.rows))
+
+    @property
+    def reused_rows(self) -> int:
+        return len(self.index) - self.rescored_rows
+
+    def migrations(self) -> List[dict]:
+        """Por país alterado: matriz de migração entre classes e variação média."""
+        labels = self.index.labels
+        k = len(labels)
+        countries = self.index.country_of[self.rows]
+        result = []
+        for country in sorted(set(countries.tolist())):
+            mask = countries == country
+            counts = np.bincount(
+                self.baseline_class[mask] * k + self.scenario_class[mask], minlength=k * k
+            ).reshape(k, k)
+            result.append({
+                "country": country,
+                "rows": int(mask.sum()),
+                "changed": int(counts.sum() - np.trace(counts)),
+                "transitions": {
+                    labels[i]: {labels[j]: int(counts[i, j]) for j in range(k)} for i in range(k)
+                },
+                "mean_delta": dict(zip(labels, self.delta[mask].mean(axis=0).tolist())),
+            })
+        return result
+
+    def companies(self, limit: int, changed_only: bool = False) -> Tuple[int, List[dict]]:
+        """
+        As `limit` empresas com maior variação absoluta de probabilidade (em
+        qualquer classe) e o total de empresas consideradas.
+        """
+        candidates = np.arange(len(self.rows))
+        if changed_only:
+            candidates = candidates[self.baseline_class != self.scenario_class]
+        magnitude = np.abs(self.delta[candidates]).max(axis=1) if len(candidates) else np.empty(0)
+        order = candidates[np.argsort(-magnitude, kind="stable")[:limit]]
+
+        labels = self.index.labels
+        items = []
+        for i in order.tolist():
+            row = int(self.rows[i])
+            items.append({
+                "name": self.index.names[row],
+                "country": self.index.country_of[row],
+                "baseline_potential": labels[int(self.baseline_class[i])],
+                "scenario_potential": labels[int(self.scenario_class[i])],
+                **{f"prob_{label.lower()}": float(p) for label, p in zip(labels, self.proba[i].tolist())},
+                **{f"delta_{label.lower()}": float(d) for label, d in zip(labels, self.delta[i].tolist())},
+            })
+        return len(candidates), items
+
+
+def run_scenario(
+    index: RankingIndex,
+    feature_order: Sequence[str],
+    shocks: Sequence[MacroShock],
+    score: ScoreFn,
+    link_mirrored: bool = True,
+) -> ScenarioResult:
+    """Aplica os choques e reavalia apenas as linhas alteradas do universo."""
+    rows, X = scenario_matrix(index, feature_order, shocks, link_mirrored)
+    if len(rows) == 0:
+        return ScenarioResult(index, rows, np.empty((0, len(index.labels))))
+    _, proba = score(X)
+    return ScenarioResult(index, rows, proba)